@@ -0,0 +1,189 @@
+"""Headless batch OCR and classification over directories of PDFs.
+
+Usage::
+
+    python batch.py INPUT --output results/ [--workers 4] [--classify]
+
+``INPUT`` is either a directory, where every ``*.pdf`` is one application, or
+a JSON-lines manifest with one ``{"id": ..., "files": [...]}`` object per
+application. Results are written to ``<output>/<id>.json`` as each
+application finishes; applications whose result file already exists are
+skipped, so an interrupted run can simply be started again.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import replace
+from typing import Any, Dict, List, Optional
+
+import classification
+from clients import ClientRegistry
+from ocr import TokenBucket
+from page_filter import PageHashIndex
+from pipeline import (
+    adaptive_concurrency,
+    classify_text,
+    combine_documents,
+    export_metrics,
+    ocr_pdf,
+    open_classification_cache,
+    open_ocr_cache,
+)
+from settings import Settings, load_settings
+
+# Per-process state, set up once by `_init_worker`
+_worker: Dict[str, Any] = {}
+
+
+def load_jobs(input_path: str) -> List[Dict[str, Any]]:
+    """Read the applications to process from a directory or a JSON-lines manifest."""
+    if os.path.isdir(input_path):
+        return [
+            {"id": os.path.splitext(name)[0], "files": [os.path.join(input_path, name)]}
+            for name in sorted(os.listdir(input_path))
+            if name.lower().endswith(".pdf")
+        ]
+
+    jobs = []
+    base_dir = os.path.dirname(os.path.abspath(input_path))
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            files = [path if os.path.isabs(path) else os.path.join(base_dir, path) for path in entry["files"]]
+            jobs.append({"id": str(entry["id"]), "files": files})
+    return jobs
+
+
+def result_path(output_dir: str, job_id: str) -> str:
+    return os.path.join(output_dir, f"{job_id}.json")
+
+
+def write_result(path: str, result: Dict[str, Any]) -> None:
+    """Write a result atomically so a crash never leaves a half-written file behind."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _init_worker(settings: Settings, mistral_api_key: str, rate_limit: float) -> None:
+    from mistralai import Mistral
+
+    if settings.metrics_file:
+        # One metrics file per worker process, e.g. for a textfile collector directory
+        root, ext = os.path.splitext(settings.metrics_file)
+        settings = replace(settings, metrics_file=f"{root}-{os.getpid()}{ext or '.prom'}")
+    _worker["settings"] = settings
+    _worker["client"] = Mistral(api_key=mistral_api_key)
+    _worker["rate_limiter"] = TokenBucket(rate_limit, settings.ocr_burst)
+    _worker["cache"] = open_ocr_cache(settings)
+    _worker["classification_cache"] = open_classification_cache(settings)
+    _worker["concurrency"] = adaptive_concurrency(settings)
+    # Classification requests of this process share one pooled client per key
+    _worker["classifier"] = ClientRegistry(settings).with_client(classification.classify_with_o1_model, "openai")
+
+
+def run_job(job: Dict[str, Any], output_dir: str, openai_api_key: Optional[str]) -> str:
+    """OCR (and optionally classify) one application and write its result file."""
+    documents = []
+    # Repeated pages (ID copies, terms pages) are OCR'd once per application
+    page_index = PageHashIndex(_worker["settings"].page_dedupe)
+    for path in job["files"]:
+        with open(path, "rb") as f:
+            pdf_bytes = f.read()
+        documents.append(ocr_pdf(
+            pdf_bytes,
+            os.path.basename(path),
+            _worker["client"],
+            _worker["settings"],
+            rate_limiter=_worker["rate_limiter"],
+            cache=_worker["cache"],
+            concurrency=_worker["concurrency"],
+            page_index=page_index,
+        ))
+
+    result: Dict[str, Any] = {
+        "id": job["id"],
+        "files": job["files"],
+        "documents": [document.as_dict() for document in documents],
+    }
+    failed = {document.name: document.failed_pages for document in documents if document.failed_pages}
+    if failed:
+        # Leave no result file behind so a restarted run picks the application up again
+        raise RuntimeError(f"OCR failed for pages {failed}")
+    if openai_api_key:
+        result["classification"] = classify_text(
+            combine_documents(documents),
+            openai_api_key,
+            classifier=_worker["classifier"],
+            settings=_worker["settings"],
+            cache=_worker["classification_cache"],
+        )
+
+    path = result_path(output_dir, job["id"])
+    write_result(path, result)
+    export_metrics(_worker["settings"])
+    return path
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Batch OCR and classification of loan application PDFs.")
+    parser.add_argument("input", help="Directory of PDFs or JSON-lines manifest")
+    parser.add_argument("--output", required=True, help="Directory for per-application result files")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Applications processed in parallel, one process each")
+    parser.add_argument("--max-in-flight", type=int, default=None,
+                        help="Concurrent OCR requests across all workers, split evenly between them "
+                             "(default: OCR_GLOBAL_IN_FLIGHT, else OCR_MAX_IN_FLIGHT)")
+    parser.add_argument("--classify", action="store_true", help="Also run classification on each application")
+    parser.add_argument("--force", action="store_true", help="Reprocess applications that already have results")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(processName)s %(levelname)s %(message)s")
+
+    mistral_api_key = os.environ.get("MISTRAL_API_KEY", "")
+    openai_api_key = os.environ.get("OPENAI_API_KEY", "") if args.classify else None
+    if not mistral_api_key or (args.classify and not openai_api_key):
+        parser.error("MISTRAL_API_KEY (and OPENAI_API_KEY with --classify) must be set")
+
+    settings = load_settings()
+    if args.max_in_flight:
+        settings = replace(settings, ocr_max_in_flight=args.max_in_flight)
+    workers = max(1, args.workers)
+    # Split the process-wide request rate and in-flight cap evenly between worker processes,
+    # each of which has its own limiters
+    rate_limit = settings.ocr_rate_limit / workers
+    in_flight = args.max_in_flight or settings.ocr_global_in_flight or settings.ocr_max_in_flight
+    settings = replace(settings, ocr_global_in_flight=max(1, in_flight // workers))
+
+    os.makedirs(args.output, exist_ok=True)
+    jobs = load_jobs(args.input)
+    pending = [job for job in jobs if args.force or not os.path.exists(result_path(args.output, job["id"]))]
+    logging.info("%d applications, %d already done, %d to process", len(jobs), len(jobs) - len(pending), len(pending))
+
+    failures = 0
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(settings, mistral_api_key, rate_limit),
+    ) as pool:
+        futures = {pool.submit(run_job, job, args.output, openai_api_key): job for job in pending}
+        for done, future in enumerate(as_completed(futures), start=1):
+            job = futures[future]
+            try:
+                logging.info("[%d/%d] %s -> %s", done, len(pending), job["id"], future.result())
+            except Exception:
+                failures += 1
+                logging.exception("[%d/%d] %s failed", done, len(pending), job["id"])
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
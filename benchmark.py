@@ -0,0 +1,272 @@
+"""Offline throughput benchmark for the OCR and classification pipeline.
+
+Generates synthetic multi-page PDFs and drives them through
+``pipeline.ocr_pdf`` and ``pipeline.classify_text`` exactly as ``main.py``
+does, with local stand-ins for the Mistral OCR and classification APIs.
+No network access or API keys are needed. Documents run concurrently on
+the job manager, smallest first, as uploads do in the app. Blank and
+duplicate page filtering is off unless ``--page-filter`` is given, so every
+page is OCR'd; the report lists how many pages were skipped either way.
+
+Usage::
+
+    python benchmark.py --documents 20 --pages 5,20,60 --dpi 100,200 \\
+        --ocr-latency 0.8 --ocr-jitter 0.3 --output bench.json --compare previous.json
+
+Pipeline settings come from the usual ``OCR_*`` environment variables, so
+the same flags can be compared across configurations. For example, to
+compare the pdftoppm renderer against pdf2image::
+
+    python benchmark.py --renderer pdf2image --output pdf2image.json
+    python benchmark.py --renderer pdftoppm --compare pdf2image.json
+"""
+import argparse
+import io
+import json
+import logging
+import math
+import random
+import resource
+import sys
+import tempfile
+import time
+from dataclasses import asdict, replace
+from typing import Any, Dict, List, Optional, Sequence
+
+from PIL import Image, ImageDraw, ImageFont
+
+import pipeline
+from fakes import FakeClassifier, FakeLatency, FakeMistral
+from jobs import DONE, JobManager
+from ocr import TokenBucket
+from settings import Settings, load_settings
+
+FIRST_NAMES = ["Juan", "María", "Pedro", "Ana", "Luis", "Carmen", "José", "Rosa", "Miguel", "Lucía"]
+LAST_NAMES = ["Pérez", "Rodríguez", "Gómez", "Martínez", "Santos", "Reyes", "Díaz", "Castillo", "Núñez", "Féliz"]
+EMPLOYERS = ["Empresa Ejemplo SRL", "Comercial del Caribe", "Banco Popular Dominicano", "Ferretería Central"]
+
+
+def sample_lines(rng: random.Random) -> List[str]:
+    """One applicant's worth of form lines with random values, so no two pages render alike."""
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}"
+    return [
+        "SOLICITUD DE PRÉSTAMO DE VEHÍCULO",
+        f"Nombre completo: {name}",
+        f"Cédula: {rng.randint(1, 402):03d}-{rng.randint(0, 9999999):07d}-{rng.randint(0, 9)}",
+        f"Teléfono celular: ({rng.choice([809, 829, 849])}) {rng.randint(200, 999)}-{rng.randint(0, 9999):04d}",
+        f"Correo electrónico: {name.split()[0].lower()}{rng.randint(1, 999)}@example.com",
+        f"Fecha de nacimiento: {rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(1950, 2000)}",
+        f"Lugar de trabajo: {rng.choice(EMPLOYERS)}",
+        f"Ingresos mensuales: RD$ {rng.randint(20, 400) * 1000:,}.00",
+        f"Monto del préstamo: RD$ {rng.randint(300, 3000) * 1000:,}.00",
+        f"Banco: {rng.choice(EMPLOYERS)}  Cuenta: {rng.randint(10 ** 8, 10 ** 9 - 1)}",
+    ]
+
+
+def _font(dpi: int) -> Any:
+    # Body text at roughly 11 pt; older Pillow only has the fixed-size bitmap font
+    try:
+        return ImageFont.load_default(size=max(10, dpi * 11 // 72))
+    except TypeError:
+        return ImageFont.load_default()
+
+
+def make_pdf(pages: int, dpi: int, seed: int = 0) -> bytes:
+    """Build a synthetic scanned-looking PDF of letter-size pages at ``dpi``.
+
+    Every page carries different values at body-text size, so the pages
+    pass blank detection and never deduplicate against each other.
+    """
+    rng = random.Random(seed)
+    width, height = int(8.5 * dpi), int(11 * dpi)
+    font = _font(dpi)
+    line_height = max(12, dpi // 4)
+    images = []
+    for page in range(pages):
+        image = Image.new("L", (width, height), color=255)
+        draw = ImageDraw.Draw(image)
+        y = dpi // 2
+        draw.text((dpi // 2, y), f"Página {page + 1} de {pages}", fill=0, font=font)
+        lines = sample_lines(rng)
+        while y < height - dpi:
+            y += line_height
+            draw.text((dpi // 2, y), rng.choice(lines), fill=rng.randint(0, 60), font=font)
+        images.append(image)
+    buffer = io.BytesIO()
+    images[0].save(buffer, format="PDF", save_all=True, append_images=images[1:], resolution=dpi)
+    return buffer.getvalue()
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile of ``values``."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process (Linux reports KiB)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_benchmark(
+    settings: Settings,
+    documents: int,
+    page_counts: Sequence[int],
+    dpis: Sequence[int],
+    ocr_latency: FakeLatency,
+    classify_latency: Optional[FakeLatency],
+) -> Dict[str, Any]:
+    """Run the pipeline over synthetic documents and summarise throughput and latency.
+
+    Documents are submitted together to a :class:`jobs.JobManager` with
+    ``settings.job_workers`` workers, smallest first, as ``main.py`` does;
+    per-document latency runs from submission to completion.
+    """
+    corpus = [
+        (f"synthetic-{i:03d}.pdf", make_pdf(page_counts[i % len(page_counts)], dpis[i % len(dpis)], seed=i))
+        for i in range(documents)
+    ]
+    client = FakeMistral(ocr_latency)
+    classifier = FakeClassifier(classify_latency) if classify_latency else None
+    rate_limiter = TokenBucket(settings.ocr_rate_limit, settings.ocr_burst)
+    concurrency = pipeline.adaptive_concurrency(settings)
+
+    def process(name: str, pdf_bytes: bytes) -> Any:
+        # No cache: every run measures real pipeline work
+        result = pipeline.ocr_pdf(
+            pdf_bytes, name, client, settings, rate_limiter=rate_limiter, cache=None, concurrency=concurrency,
+        )
+        if classifier is not None:
+            pipeline.classify_text(
+                pipeline.combine_documents([result]), "offline", classifier=classifier, settings=settings,
+            )
+        return result
+
+    manager = JobManager(settings.job_workers, retention_seconds=float("inf"))
+    started = time.perf_counter()
+    submitted = [
+        manager.submit(name, name, lambda job, name=name, pdf_bytes=pdf_bytes: process(name, pdf_bytes), priority=len(pdf_bytes))
+        for name, pdf_bytes in sorted(corpus, key=lambda item: len(item[1]))
+    ]
+    for job in submitted:
+        job.wait()
+    elapsed = time.perf_counter() - started
+
+    latencies: List[float] = []
+    failures = 0
+    failed_pages = 0
+    total_pages = 0
+    blank_pages = 0
+    duplicate_pages = 0
+    dpi_distribution: Dict[int, int] = {}
+    stage_seconds: Dict[str, float] = {}
+    for job in submitted:
+        if job.status != DONE:
+            logging.error("Document %s failed: %s", job.name, job.error)
+            failures += 1
+            continue
+        result = job.result
+        latencies.append(job.finished - job.created)
+        total_pages += result.page_count
+        failed_pages += len(result.failed_pages)
+        blank_pages += result.blank_pages
+        duplicate_pages += result.duplicate_pages
+        for stage in ("render", "encode"):
+            stage_seconds[stage] = stage_seconds.get(stage, 0.0) + result.timings.get(stage, 0.0)
+        for dpi, count in result.dpi_distribution.items():
+            dpi_distribution[dpi] = dpi_distribution.get(dpi, 0) + count
+
+    return {
+        "settings": asdict(settings),
+        "documents": documents,
+        "failures": failures,
+        "failed_pages": failed_pages,
+        "pages": total_pages,
+        "blank_pages": blank_pages,
+        "duplicate_pages": duplicate_pages,
+        "ocr_pages": total_pages - blank_pages - duplicate_pages - failed_pages,
+        "elapsed_seconds": round(elapsed, 3),
+        "pages_per_second": round(total_pages / elapsed, 3) if elapsed else 0.0,
+        "latency_p50": round(percentile(latencies, 50), 3),
+        "latency_p95": round(percentile(latencies, 95), 3),
+        "latency_p99": round(percentile(latencies, 99), 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "render_seconds": round(stage_seconds.get("render", 0.0), 3),
+        "encode_seconds": round(stage_seconds.get("encode", 0.0), 3),
+        "ocr_requests": client.requests,
+        "ocr_upload_mb": round(client.upload_bytes / 1024 / 1024, 2),
+        "dpi_distribution": dict(sorted(dpi_distribution.items())),
+    }
+
+
+def compare(current: Dict[str, Any], previous: Dict[str, Any]) -> List[str]:
+    """Describe the change of every headline metric against a previous run."""
+    lines = []
+    for key in ("pages_per_second", "latency_p50", "latency_p95", "latency_p99", "peak_rss_mb",
+                "render_seconds", "encode_seconds", "ocr_pages", "ocr_requests", "ocr_upload_mb"):
+        before, after = previous.get(key), current.get(key)
+        if not before or after is None:
+            continue
+        lines.append(f"{key:>18}: {before} -> {after} ({(after - before) / before * 100:+.1f}%)")
+    return lines
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmark with fake OCR and classification backends.")
+    parser.add_argument("--documents", type=int, default=10, help="Number of synthetic PDFs")
+    parser.add_argument("--pages", type=_int_list, default=[5, 20], help="Comma-separated page counts to cycle through")
+    parser.add_argument("--dpi", type=_int_list, default=[150], help="Comma-separated DPIs of the synthetic scans")
+    parser.add_argument("--ocr-latency", type=float, default=0.5, help="Base OCR request latency in seconds")
+    parser.add_argument("--ocr-jitter", type=float, default=0.2, help="Uniform extra OCR latency in seconds")
+    parser.add_argument("--ocr-error-rate", type=float, default=0.0, help="Fraction of OCR requests failing with a 5xx")
+    parser.add_argument("--ocr-throttle-rate", type=float, default=0.0, help="Fraction of OCR requests failing with a 429")
+    parser.add_argument("--classify-latency", type=float, default=None,
+                        help="Base classification latency in seconds; omit to skip classification")
+    parser.add_argument("--renderer", choices=["pdf2image", "pdftoppm"], default=None,
+                        help="Page renderer, overriding OCR_RENDERER")
+    parser.add_argument("--page-filter", action="store_true",
+                        help="Keep the configured blank and duplicate page filter (off by default so every page is OCR'd)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for latency jitter and failures")
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    parser.add_argument("--compare", help="Previous results JSON to compare against")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    # Keep benchmark runs away from the persistent cache and any metrics file
+    settings = replace(load_settings(), cache_max_mb=0, cache_dir=tempfile.gettempdir(), metrics_file="")
+    if not args.page_filter:
+        settings = replace(settings, page_blank_ink_ratio=0.0, page_dedupe=False)
+    if args.renderer:
+        settings = replace(settings, renderer=args.renderer)
+    ocr_latency = FakeLatency(
+        base_seconds=args.ocr_latency,
+        jitter_seconds=args.ocr_jitter,
+        error_rate=args.ocr_error_rate,
+        throttle_rate=args.ocr_throttle_rate,
+        seed=args.seed,
+    )
+    classify_latency = None
+    if args.classify_latency is not None:
+        classify_latency = FakeLatency(base_seconds=args.classify_latency, jitter_seconds=args.classify_latency / 4, seed=args.seed)
+
+    results = run_benchmark(settings, args.documents, args.pages, args.dpi, ocr_latency, classify_latency)
+    print(json.dumps({key: value for key, value in results.items() if key != "settings"}, indent=2))
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            print("\n".join(compare(results, json.load(f))))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 1 if results["failures"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional, Tuple, Union
+
+
+def content_key(*parts: Union[bytes, str]) -> str:
+    """Return a SHA-256 hex digest over ``parts``.
+
+    Each part is length-prefixed so ``("ab", "c")`` and ``("a", "bc")`` hash
+    differently.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+@dataclass
+class CacheStats:
+    """Counters reported by :class:`DiskCache`."""
+
+    hits: int = 0
+    misses: int = 0
+    bytes_saved: int = 0
+    entries: int = 0
+    size_bytes: int = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return asdict(self)
+
+
+class DiskCache:
+    """Content-addressed JSON cache on local disk with size-based LRU eviction.
+
+    Entries are stored one file per key under ``directory``. Reads bump the
+    file's modification time, which is used as the recency order when the
+    total size exceeds ``max_bytes``.
+
+    Parameters
+    ----------
+    directory : str
+        Cache root, created if missing.
+    max_bytes : int
+        Upper bound on the total size of stored entries.
+    ttl_seconds : float, optional
+        Entries older than this are treated as misses and removed.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, ttl_seconds: Optional[float] = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+        # key -> (size, last access)
+        self._index: Dict[str, Tuple[int, float]] = {}
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _load_index(self) -> None:
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                stat = os.stat(os.path.join(root, name))
+                self._index[name[:-5]] = (stat.st_size, stat.st_mtime)
+        self._refresh_size()
+
+    def _refresh_size(self) -> None:
+        self._stats.entries = len(self._index)
+        self._stats.size_bytes = sum(size for size, _ in self._index.values())
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for ``key``, or ``None`` on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            if self.ttl_seconds is not None and time.time() - entry.get("created", 0) > self.ttl_seconds:
+                os.unlink(path)
+                raise OSError("expired")
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self._stats.misses += 1
+                self._index.pop(key, None)
+                self._refresh_size()
+            return None
+
+        with self._lock:
+            self._stats.hits += 1
+            self._stats.bytes_saved += entry.get("saved_bytes", 0)
+            size = self._index.get(key, (os.path.getsize(path), 0))[0]
+            self._index[key] = (size, os.path.getmtime(path))
+        return entry["value"]
+
+    def set(self, key: str, value: Any, saved_bytes: int = 0) -> None:
+        """Store ``value`` under ``key``.
+
+        ``saved_bytes`` is credited to :attr:`CacheStats.bytes_saved` each
+        time the entry is served, e.g. the upload size a hit avoids.
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        payload = json.dumps({"value": value, "saved_bytes": saved_bytes, "created": time.time()}, ensure_ascii=False)
+        # Write to a sibling file and rename so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError:
+            logging.exception("Failed to write cache entry %s", key)
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return
+
+        with self._lock:
+            self._index[key] = (os.path.getsize(path), os.path.getmtime(path))
+            self._evict()
+            self._refresh_size()
+
+    def _evict(self) -> None:
+        total = sum(size for size, _ in self._index.values())
+        if total <= self.max_bytes:
+            return
+        for key, (size, _) in sorted(self._index.items(), key=lambda item: item[1][1]):
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                pass
+            del self._index[key]
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            for key in list(self._index):
+                try:
+                    os.unlink(self._path(key))
+                except OSError:
+                    pass
+            self._index.clear()
+            self._refresh_size()
+
+    @property
+    def stats(self) -> CacheStats:
+        """Snapshot of the cache counters."""
+        with self._lock:
+            return CacheStats(**self._stats.as_dict())
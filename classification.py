@@ -1,7 +1,19 @@
 import logging
-from typing import Any
+import queue
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
 
-def classify_with_o1_model(text: str, api_key: str, json_schema: str) -> Any:
+import fast_path
+from cache import DiskCache, content_key
+from schema import compile_schema
+
+# Bump whenever the model or prompt changes so cached classifications are not reused
+CLASSIFIER_VERSION = "o1-stub-1"
+
+def classify_with_o1_model(text: str, api_key: str, json_schema: str, client: Any = None) -> Any:
     """Dummy classification function.
 
     Parameters
@@ -12,6 +24,9 @@ def classify_with_o1_model(text: str, api_key: str, json_schema: str) -> Any:
         API key for the classification service (currently unused).
     json_schema : str
         Schema description for the classification output.
+    client : OpenAI, optional
+        Pooled client for ``api_key``, see
+        :meth:`clients.ClientRegistry.with_client` (currently unused).
 
     Returns
     -------
@@ -21,5 +36,518 @@ def classify_with_o1_model(text: str, api_key: str, json_schema: str) -> Any:
     logging.warning("Using stub classify_with_o1_model; implement actual logic.")
     return {
         "text_length": len(text),
-        "schema_keys": len([line for line in json_schema.splitlines() if ':' in line])
+        "schema_keys": len(compile_schema(json_schema).fields)
     }
+
+
+def classification_cache_key(text: str, json_schema: str, version: str = CLASSIFIER_VERSION) -> str:
+    """Cache key of a classification request.
+
+    Whitespace in ``text`` is normalised so re-OCR'd packets that differ only
+    in spacing share an entry.
+    """
+    normalized = " ".join(text.split())
+    return content_key("classification", version, compile_schema(json_schema).fingerprint, normalized)
+
+
+# Field groups for chunked extraction, in merge priority order. Each group
+# lists name fragments that route schema fields to it and keywords that route
+# OCR pages to it. Fields matching no group fall into "applicant".
+FIELD_GROUPS = [
+    {
+        "name": "spouse",
+        "fields": ["CONYUGE"],
+        "keywords": ["cónyuge", "conyuge", "esposo", "esposa", "casado", "unión libre"],
+    },
+    {
+        "name": "vehicle",
+        "fields": ["VEHICULO"],
+        "keywords": ["vehículo", "vehiculo", "marca", "modelo", "chasis", "placa", "jeepeta", "camioneta", "dealer"],
+    },
+    {
+        "name": "banks",
+        "fields": ["BANCO", "REFENCIAS_BANCARIAS", "REFERENCIA_FINANCIERA"],
+        "keywords": ["banco", "cuenta", "ahorro", "corriente", "bancaria", "financiera"],
+    },
+    {
+        "name": "pep",
+        "fields": ["PEP", "INDICICIO_ESTADUNIDENSE", "CIUDADANIA"],
+        "keywords": ["pep", "políticamente", "politicamente", "expuesta", "ciudadanía", "ciudadania", "fatca"],
+    },
+    {
+        "name": "references",
+        "fields": ["REFERENCIA", "REFERECIA", "REF_POR_DEALER"],
+        "keywords": ["referencia", "referencias", "comercial", "personal"],
+    },
+    {
+        "name": "applicant",
+        "fields": [],
+        "keywords": ["solicitante", "nombre", "cédula", "cedula", "dirección", "direccion", "teléfono",
+                     "telefono", "ingresos", "empleo", "trabajo", "préstamo", "prestamo", "solicitud"],
+    },
+]
+
+_FILE_MARKER = re.compile(r"^=== FILE: (.*) ===$", re.MULTILINE)
+_PAGE_MARKER = re.compile(r"^--- PAGE (\d+) ---$", re.MULTILINE)
+
+
+@dataclass
+class TextChunk:
+    """One page of the combined OCR text."""
+
+    file_name: str
+    page_number: int
+    text: str
+
+    def render(self) -> str:
+        return f"=== FILE: {self.file_name} === --- PAGE {self.page_number} ---\n\n{self.text}"
+
+
+def split_chunks(combined_text: str) -> List[TextChunk]:
+    """Split combined OCR text on its ``=== FILE ===`` and ``--- PAGE n ---`` markers.
+
+    Text without markers comes back as a single chunk.
+    """
+    chunks = []
+    file_matches = list(_FILE_MARKER.finditer(combined_text))
+    if not file_matches:
+        return [TextChunk("", 1, combined_text.strip())] if combined_text.strip() else []
+    for index, file_match in enumerate(file_matches):
+        end = file_matches[index + 1].start() if index + 1 < len(file_matches) else len(combined_text)
+        file_text = combined_text[file_match.end():end]
+        page_matches = list(_PAGE_MARKER.finditer(file_text))
+        if not page_matches:
+            chunks.append(TextChunk(file_match.group(1), 1, file_text.strip()))
+            continue
+        for page_index, page_match in enumerate(page_matches):
+            page_end = page_matches[page_index + 1].start() if page_index + 1 < len(page_matches) else len(file_text)
+            chunks.append(TextChunk(file_match.group(1), int(page_match.group(1)), file_text[page_match.end():page_end].strip()))
+    return chunks
+
+
+def group_fields(field_names: List[str]) -> Dict[str, List[str]]:
+    """Assign every schema field to exactly one group of :data:`FIELD_GROUPS`."""
+    groups: Dict[str, List[str]] = {group["name"]: [] for group in FIELD_GROUPS}
+    for field_name in field_names:
+        normalized = field_name.upper()
+        for group in FIELD_GROUPS:
+            if any(fragment in normalized for fragment in group["fields"]):
+                groups[group["name"]].append(field_name)
+                break
+        else:
+            groups["applicant"].append(field_name)
+    return {name: fields for name, fields in groups.items() if fields}
+
+
+def route_chunks(chunks: List[TextChunk], keywords: List[str], fallback: int = 2) -> List[TextChunk]:
+    """Chunks mentioning any of ``keywords``, or the first ``fallback`` chunks if none do."""
+    routed = [chunk for chunk in chunks if any(keyword in chunk.text.lower() for keyword in keywords)]
+    return routed or chunks[:fallback]
+
+
+def pack_chunks(chunks: List[TextChunk], max_chars: int) -> List[List[TextChunk]]:
+    """Pack chunks, in order, into batches of at most ``max_chars`` characters."""
+    batches: List[List[TextChunk]] = []
+    size = 0
+    for chunk in chunks:
+        length = len(chunk.text)
+        if batches and size + length <= max_chars:
+            batches[-1].append(chunk)
+            size += length
+        else:
+            batches.append([chunk])
+            size = length
+    return batches
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == {} or value == []
+
+
+def merge_partial_results(partials: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, List[Any]]]:
+    """Merge partial classification results.
+
+    The first non-empty value for a field wins. ``partials`` must already be
+    in priority order (group order, then document order), which makes the
+    merge deterministic regardless of which request finished first.
+
+    Returns
+    -------
+    tuple of (dict, dict)
+        Merged result, and for every conflicting field the discarded values.
+    """
+    merged: Dict[str, Any] = {}
+    conflicts: Dict[str, List[Any]] = {}
+    for partial in partials:
+        for key, value in partial.items():
+            if _is_empty(value):
+                merged.setdefault(key, value)
+            elif _is_empty(merged.get(key)):
+                merged[key] = value
+            elif merged[key] != value:
+                conflicts.setdefault(key, []).append(value)
+    return merged, conflicts
+
+
+def _classify_cached(
+    classifier: Callable[[str, str, str], Any],
+    text: str,
+    api_key: str,
+    json_schema: str,
+    cache: Optional[DiskCache],
+) -> Dict[str, Any]:
+    key = classification_cache_key(text, json_schema) if cache is not None else ""
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    partial = classifier(text, api_key, json_schema) or {}
+    if cache is not None and partial:
+        cache.set(key, partial)
+    return partial
+
+
+def classify_chunked(
+    text: str,
+    api_key: str,
+    json_schema: str,
+    classifier: Optional[Callable[[str, str, str], Any]] = None,
+    max_chunk_chars: int = 40_000,
+    max_workers: int = 6,
+    cache: Optional[DiskCache] = None,
+) -> Dict[str, Any]:
+    """Map-reduce classification over field groups and page chunks.
+
+    The combined text is split into page chunks, schema fields are split
+    into :data:`FIELD_GROUPS`, and each group is sent only the pages that
+    mention its keywords, packed into requests of at most
+    ``max_chunk_chars`` characters. Requests run in parallel and their
+    results are merged with :func:`merge_partial_results`.
+
+    Parameters
+    ----------
+    text : str
+        Combined OCR text.
+    api_key : str
+        API key for the classification service.
+    json_schema : str
+        Full schema; each request receives the subset for its group.
+    classifier : callable, optional
+        Function with the signature of :func:`classify_with_o1_model`, used
+        for each partial request. Defaults to :func:`classify_with_o1_model`.
+    max_chunk_chars : int
+        Character budget of the text sent in one request.
+    max_workers : int
+        Maximum number of concurrent requests.
+    cache : DiskCache, optional
+        Cache of partial results. A request is keyed by its own pages and
+        sub-schema, so when one file of a packet changes, groups whose
+        routed pages are unchanged are served from the cache.
+
+    Returns
+    -------
+    dict
+        Merged classification result.
+    """
+    classifier = classifier or classify_with_o1_model
+    schema = compile_schema(json_schema)
+    chunks = split_chunks(text)
+    if not chunks:
+        return {}
+
+    grouped = group_fields(list(schema.fields))
+    tasks = []
+    for group in FIELD_GROUPS:
+        fields = grouped.get(group["name"])
+        if not fields:
+            continue
+        sub_schema = schema.subset(fields)
+        for batch in pack_chunks(route_chunks(chunks, group["keywords"]), max_chunk_chars):
+            tasks.append((group["name"], "\n\n".join(chunk.render() for chunk in batch), sub_schema))
+
+    def run(task: Tuple[str, str, str]) -> Dict[str, Any]:
+        _, task_text, sub_schema = task
+        return _classify_cached(classifier, task_text, api_key, sub_schema, cache)
+
+    logging.info("Chunked classification: %d chunks, %d requests", len(chunks), len(tasks))
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tasks)))) as pool:
+        # map keeps task order, so the merge below does not depend on completion order
+        partials = list(pool.map(run, tasks))
+
+    merged, conflicts = merge_partial_results(partials)
+    if conflicts:
+        logging.info("Chunked classification conflicts (first value kept): %s", sorted(conflicts))
+    return merged
+
+
+# Optional key of a classifier result mapping field names to a 0-1 confidence
+CONFIDENCE_KEY = "_confidence"
+
+# Marks the end of the page stream of an IncrementalClassifier
+_END = object()
+
+
+@dataclass
+class FieldValue:
+    """Current value of one field in an :class:`IncrementalClassifier`, with where it was found."""
+
+    value: Any
+    confidence: float
+    file_name: str
+    page_number: int
+
+
+class IncrementalClassifier:
+    """Classify a packet page by page while OCR is still running.
+
+    Pages are queued with :meth:`add_page` as they arrive. A worker takes
+    whatever has arrived (up to ``batch_chars`` characters), classifies it
+    against the fields that are still missing, and folds the answers into a
+    running field map that :meth:`snapshot` exposes at any time. Once every
+    ``required_fields`` entry holds a value with at least ``min_confidence``
+    the classifier stops early and ignores the remaining pages.
+
+    A classifier may report per-field confidence under :data:`CONFIDENCE_KEY`;
+    fields without one get ``default_confidence``. A later value replaces an
+    earlier one only with strictly higher confidence. With ``use_fast_path``
+    each batch first goes through :func:`fast_path.extract_fields`; values
+    named by their label count as fully confident and are not asked of the
+    model, section-dependent hints get :data:`fast_path.HINT_CONFIDENCE`.
+
+    Parameters
+    ----------
+    api_key : str
+        API key for the classification service.
+    json_schema : str
+        Full schema; each request receives the subset of missing fields.
+    classifier : callable, optional
+        Function with the signature of :func:`classify_with_o1_model`.
+    required_fields : iterable of str
+        Fields that must be filled before stopping early. Empty disables
+        early completion.
+    min_confidence : float
+        Confidence a required field needs to count as filled.
+    batch_chars : int
+        Character budget of the pages sent in one request.
+    cache : DiskCache, optional
+        Cache of partial results, as in :func:`classify_chunked`.
+    default_confidence : float
+        Confidence of values reported without one.
+    use_fast_path : bool
+        Fill pattern-shaped fields locally before each request.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        json_schema: str,
+        classifier: Optional[Callable[[str, str, str], Any]] = None,
+        required_fields: Iterable[str] = (),
+        min_confidence: float = 0.8,
+        batch_chars: int = 8_000,
+        cache: Optional[DiskCache] = None,
+        default_confidence: float = 1.0,
+        use_fast_path: bool = False,
+    ):
+        self.api_key = api_key
+        self.json_schema = json_schema
+        self.schema = compile_schema(json_schema)
+        self.classifier = classifier or classify_with_o1_model
+        self.required_fields = [name for name in required_fields if name in self.schema.fields]
+        self.min_confidence = min_confidence
+        self.batch_chars = batch_chars
+        self.cache = cache
+        self.default_confidence = default_confidence
+        self.use_fast_path = use_fast_path
+        self.fields: Dict[str, FieldValue] = {}
+        self.pages_classified = 0
+        self.requests = 0
+        self.error: Optional[BaseException] = None
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._seen: Set[Tuple[str, int]] = set()
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._finished = False
+        self._thread: Optional[threading.Thread] = None
+
+    def add_page(self, file_name: str, page_number: int, text: str, source_key: Optional[str] = None) -> bool:
+        """Queue one page; repeated ``(source_key or file_name, page_number)`` pairs are ignored.
+
+        The first text of a page is the one classified, so pass pages once
+        their text is final; :func:`pipeline.ocr_pdf` holds pages back from
+        ``on_page`` until the DPI ladder is done with them. Returns whether
+        the page was queued.
+        """
+        seen_key = (source_key or file_name, page_number)
+        with self._lock:
+            if seen_key in self._seen or self._done.is_set():
+                return False
+            self._seen.add(seen_key)
+        self._queue.put(TextChunk(file_name, page_number, text))
+        return True
+
+    def finish(self) -> None:
+        """Signal that no more pages will arrive; the worker flushes what is queued and stops."""
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+        self._queue.put(_END)
+
+    def start(self) -> "IncrementalClassifier":
+        """Run the worker on a background thread."""
+        self._thread = threading.Thread(target=self.run, name="incremental-classifier", daemon=True)
+        self._thread.start()
+        return self
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    @property
+    def pages_received(self) -> int:
+        return len(self._seen)
+
+    @property
+    def busy(self) -> bool:
+        """Whether queued pages are still waiting to be classified."""
+        return not self.done and self.pages_classified < self.pages_received
+
+    def missing_required(self) -> List[str]:
+        with self._lock:
+            return [
+                name for name in self.required_fields
+                if name not in self.fields or self.fields[name].confidence < self.min_confidence
+            ]
+
+    @property
+    def complete(self) -> bool:
+        """Whether every required field is filled with sufficient confidence."""
+        return bool(self.required_fields) and not self.missing_required()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current field values, coerced to the schema."""
+        with self._lock:
+            values = {name: field_value.value for name, field_value in self.fields.items()}
+        return self.schema.validate(values).value
+
+    def provenance(self) -> Dict[str, Tuple[str, int, float]]:
+        """``(file_name, page_number, confidence)`` of every filled field."""
+        with self._lock:
+            return {
+                name: (field_value.file_name, field_value.page_number, field_value.confidence)
+                for name, field_value in self.fields.items()
+            }
+
+    def run(self) -> None:
+        """Consume queued pages until :meth:`finish` is called or the required fields are complete."""
+        try:
+            finished = False
+            while not finished:
+                batch = [self._queue.get()]
+                size = len(getattr(batch[0], "text", ""))
+                # Take whatever else has already arrived, up to the character budget
+                while size < self.batch_chars:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                    size += len(getattr(batch[-1], "text", ""))
+                finished = batch[-1] is _END
+                pages = [chunk for chunk in batch if chunk is not _END]
+                if pages:
+                    self._classify(pages)
+                if self.complete:
+                    logging.info(
+                        "Incremental classification complete after %d pages, %d requests",
+                        self.pages_classified, self.requests,
+                    )
+                    break
+        except Exception as e:
+            logging.exception("Incremental classification failed")
+            self.error = e
+        finally:
+            self._done.set()
+
+    def _missing_fields(self) -> List[str]:
+        with self._lock:
+            return [
+                name for name in self.schema.fields
+                if name not in self.fields or self.fields[name].confidence < self.min_confidence
+            ]
+
+    def _classify(self, pages: List[TextChunk]) -> None:
+        if self.use_fast_path:
+            found = fast_path.extract_fields(
+                ((chunk.file_name, chunk.page_number, chunk.text, 0) for chunk in pages), wanted=self._missing_fields(),
+            )
+            with self._lock:
+                for name, extraction in found.items():
+                    # Hints stay below min_confidence, so the model is still asked and can replace them
+                    confidence = fast_path.HINT_CONFIDENCE if extraction.hint else 1.0
+                    current = self.fields.get(name)
+                    if current is None or current.confidence < confidence:
+                        self.fields[name] = FieldValue(extraction.value, confidence, extraction.file_name, extraction.page_number)
+        missing = self._missing_fields()
+        if not missing:
+            self.pages_classified += len(pages)
+            return
+        text = "\n\n".join(chunk.render() for chunk in pages)
+        partial = dict(_classify_cached(self.classifier, text, self.api_key, self.schema.subset(missing), self.cache))
+        confidences = partial.pop(CONFIDENCE_KEY, None) or {}
+        self.requests += 1
+        self.pages_classified += len(pages)
+        # Attribute each value to the first page of the batch that mentions it
+        with self._lock:
+            for name, value in partial.items():
+                if _is_empty(value) or name not in self.schema.fields:
+                    continue
+                confidence = float(confidences.get(name, self.default_confidence))
+                current = self.fields.get(name)
+                if current is not None and current.confidence >= confidence:
+                    continue
+                source = next((chunk for chunk in pages if str(value) in chunk.text), pages[0])
+                self.fields[name] = FieldValue(value, confidence, source.file_name, source.page_number)
+
+
+def classify_incremental(
+    text: str,
+    api_key: str,
+    json_schema: str,
+    classifier: Optional[Callable[[str, str, str], Any]] = None,
+    required_fields: Iterable[str] = (),
+    min_confidence: float = 0.8,
+    batch_chars: int = 8_000,
+    cache: Optional[DiskCache] = None,
+) -> Dict[str, Any]:
+    """Run an :class:`IncrementalClassifier` over already combined text, in page order.
+
+    Stops sending pages as soon as the required fields are complete.
+    """
+    incremental = IncrementalClassifier(
+        api_key,
+        json_schema,
+        classifier=classifier,
+        required_fields=required_fields,
+        min_confidence=min_confidence,
+        batch_chars=batch_chars,
+        cache=cache,
+    )
+    pending: List[TextChunk] = []
+    size = 0
+    for chunk in split_chunks(text):
+        pending.append(chunk)
+        size += len(chunk.text)
+        if size >= batch_chars:
+            incremental._classify(pending)
+            pending, size = [], 0
+            if incremental.complete:
+                break
+    else:
+        if pending:
+            incremental._classify(pending)
+    logging.info(
+        "Incremental classification: %d pages, %d requests, complete=%s",
+        incremental.pages_classified, incremental.requests, incremental.complete,
+    )
+    return incremental.snapshot()
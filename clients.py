@@ -0,0 +1,262 @@
+import hashlib
+import hmac
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from settings import Settings
+
+T = TypeVar("T")
+
+try:
+    import httpx
+except ImportError:  # httpx ships with the Mistral and OpenAI SDKs
+    httpx = None
+
+
+@dataclass
+class ConnectionStats:
+    """HTTP traffic of one pooled client.
+
+    Attributes
+    ----------
+    requests : int
+        Requests sent.
+    connections : int
+        TCP connections opened; every other request reused a kept-alive one.
+    tls_handshakes : int
+        TLS handshakes performed.
+    last_used : float
+        ``time.monotonic()`` of the last request, or of creation.
+    """
+
+    requests: int = 0
+    connections: int = 0
+    tls_handshakes: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+
+    @property
+    def reused(self) -> int:
+        return max(0, self.requests - self.connections)
+
+    @property
+    def reuse_ratio(self) -> float:
+        return self.reused / self.requests if self.requests else 0.0
+
+
+def _tracing_hook(stats: ConnectionStats, lock: threading.Lock) -> Callable[[Any], None]:
+    # httpcore reports connection setup through the per-request "trace" extension
+    def trace(event_name: str, info: Dict[str, Any]) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            with lock:
+                stats.connections += 1
+        elif event_name == "connection.start_tls.complete":
+            with lock:
+                stats.tls_handshakes += 1
+
+    def on_request(request: Any) -> None:
+        with lock:
+            stats.requests += 1
+            stats.last_used = time.monotonic()
+        request.extensions["trace"] = trace
+
+    return on_request
+
+
+def http_client(settings: Settings, stats: ConnectionStats, lock: threading.Lock) -> Any:
+    """An ``httpx.Client`` with the pool size and timeouts of ``settings``, counting into ``stats``."""
+    pool_size = settings.http_pool_size()
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=settings.http_keepalive_seconds,
+        ),
+        timeout=httpx.Timeout(settings.http_timeout_seconds, connect=settings.http_connect_timeout_seconds),
+        event_hooks={"request": [_tracing_hook(stats, lock)]},
+    )
+
+
+def mistral_client(api_key: str, http: Any, settings: Settings) -> Any:
+    from mistralai import Mistral
+
+    if http is None:
+        return Mistral(api_key=api_key, timeout_ms=int(settings.http_timeout_seconds * 1000))
+    return Mistral(api_key=api_key, client=http)
+
+
+def openai_client(api_key: str, http: Any, settings: Settings) -> Any:
+    from openai import OpenAI
+
+    if http is None:
+        return OpenAI(api_key=api_key, timeout=settings.http_timeout_seconds)
+    return OpenAI(api_key=api_key, http_client=http)
+
+
+FACTORIES: Dict[str, Callable[[str, Any, Settings], Any]] = {
+    "mistral": mistral_client,
+    "openai": openai_client,
+}
+
+
+@dataclass
+class _Entry:
+    client: Any
+    http: Any
+    stats: ConnectionStats
+    leases: int = 0
+
+
+class ClientRegistry:
+    """Long-lived API clients shared by every session, one per service and API key.
+
+    Clients keep their HTTP connection pool between files, so only the
+    first request of a key pays for the TCP and TLS handshakes. Entries are
+    looked up by an HMAC of the key under a per-process secret: the registry
+    never stores keys itself, a caller only gets the client of the key it
+    presents, and :meth:`stats` identifies keys by a short digest that
+    cannot be brute-forced offline. Clients without a request for
+    ``settings.client_idle_minutes`` are closed, unless a job still holds
+    a lease on them.
+
+    Parameters
+    ----------
+    settings : Settings
+        Pool size, timeouts and idle expiry.
+    factories : dict, optional
+        Service name to ``factory(api_key, http_client, settings)``.
+        Defaults to :data:`FACTORIES`.
+    """
+
+    def __init__(self, settings: Settings, factories: Optional[Dict[str, Callable[[str, Any, Settings], Any]]] = None):
+        self.settings = settings
+        self.factories = dict(FACTORIES if factories is None else factories)
+        self._secret = os.urandom(32)
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str], _Entry] = {}
+
+    def key_id(self, api_key: str) -> str:
+        return hmac.new(self._secret, api_key.encode("utf-8"), hashlib.sha256).hexdigest()
+
+    def acquire(self, service: str, api_key: str) -> Any:
+        """Lease the pooled client of ``service`` for ``api_key``, created on first use.
+
+        A leased client is never evicted; hand it back with :meth:`release`
+        once the job using it has finished, or use :meth:`lease`.
+        """
+        if service not in self.factories:
+            raise ValueError(f"Unknown API service {service!r}")
+        self.evict_idle()
+        slot = (service, self.key_id(api_key))
+        with self._lock:
+            entry = self._entries.get(slot)
+            if entry is None:
+                stats = ConnectionStats()
+                http = http_client(self.settings, stats, self._stats_lock) if httpx is not None else None
+                entry = _Entry(self.factories[service](api_key, http, self.settings), http, stats)
+                self._entries[slot] = entry
+                logging.info("Created pooled %s client %s", service, slot[1][:8])
+            else:
+                with self._stats_lock:
+                    entry.stats.last_used = time.monotonic()
+            entry.leases += 1
+            return entry.client
+
+    def release(self, service: str, api_key: str) -> None:
+        """Return a lease taken with :meth:`acquire`; the idle clock restarts now."""
+        slot = (service, self.key_id(api_key))
+        with self._lock:
+            entry = self._entries.get(slot)
+            if entry is None or entry.leases <= 0:
+                logging.warning("Released %s client %s that holds no lease", service, slot[1][:8])
+                return
+            entry.leases -= 1
+            with self._stats_lock:
+                entry.stats.last_used = time.monotonic()
+
+    @contextmanager
+    def lease(self, service: str, api_key: str) -> Iterator[Any]:
+        """Context manager around :meth:`acquire` and :meth:`release`."""
+        client = self.acquire(service, api_key)
+        try:
+            yield client
+        finally:
+            self.release(service, api_key)
+
+    def with_client(self, fn: Callable[..., T], service: str) -> Callable[[str, str, str], T]:
+        """Wrap a ``fn(text, api_key, json_schema, client=...)`` classifier to use pooled clients.
+
+        The result has the plain ``(text, api_key, json_schema)`` classifier
+        signature; each call leases the ``service`` client of its API key
+        for the duration of the request and passes it as ``client``.
+        """
+        def call(text: str, api_key: str, json_schema: str) -> T:
+            with self.lease(service, api_key) as client:
+                return fn(text, api_key, json_schema, client=client)
+
+        return call
+
+    def evict_idle(self) -> int:
+        """Close unleased clients idle for longer than ``settings.client_idle_minutes``; returns how many."""
+        if self.settings.client_idle_minutes <= 0:
+            return 0
+        cutoff = time.monotonic() - self.settings.client_idle_minutes * 60
+        with self._lock:
+            with self._stats_lock:
+                idle = [
+                    slot for slot, entry in self._entries.items()
+                    if entry.leases == 0 and entry.stats.last_used < cutoff
+                ]
+            entries = [self._entries.pop(slot) for slot in idle]
+        for entry in entries:
+            self._close(entry)
+        return len(entries)
+
+    def stats(self, api_keys: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """Connection reuse per pooled client, keys shown as a short digest.
+
+        With ``api_keys`` only the clients of those keys are listed, so a
+        session sees its own traffic and nothing about other sessions.
+        """
+        digests = None if api_keys is None else {self.key_id(api_key) for api_key in api_keys}
+        now = time.monotonic()
+        with self._lock, self._stats_lock:
+            return [
+                {
+                    "service": service,
+                    "key": digest[:8],
+                    "requests": entry.stats.requests,
+                    "connections": entry.stats.connections,
+                    "tls_handshakes": entry.stats.tls_handshakes,
+                    "reused": entry.stats.reused,
+                    "reuse_ratio": entry.stats.reuse_ratio,
+                    "leases": entry.leases,
+                    "idle_seconds": now - entry.stats.last_used,
+                }
+                for (service, digest), entry in self._entries.items()
+                if digests is None or digest in digests
+            ]
+
+    def close(self) -> None:
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            self._close(entry)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    @staticmethod
+    def _close(entry: _Entry) -> None:
+        if entry.http is not None:
+            try:
+                entry.http.close()
+            except Exception:
+                logging.debug("Failed to close pooled HTTP client", exc_info=True)
@@ -0,0 +1,260 @@
+import logging
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from classification import FIELD_GROUPS, TextChunk, split_chunks
+from ocr import format_page_block
+from page_store import file_block
+
+try:
+    import tiktoken
+except ImportError:  # optional; token counts fall back to a character estimate
+    tiktoken = None
+
+# Bump whenever compaction changes what the classifier sees
+COMPACTION_VERSION = "compact-3"
+
+# Characters per token of the fallback estimate, measured on Spanish OCR markdown
+CHARS_PER_TOKEN = 3.6
+
+_IMAGE_REF = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+_RULE_LINE = re.compile(r"^\s*(?:[-*_]\s*){3,}$")
+_TABLE_SEPARATOR = re.compile(r"^\s*\|?\s*:?-{2,}:?\s*(?:\|\s*:?-{2,}:?\s*)*\|?\s*$")
+_EMPHASIS = re.compile(r"(\*\*|__)(.+?)\1")
+_HEADING = re.compile(r"^\s*#{1,6}\s+")
+_SPACES = re.compile(r"[^\S\n]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+_PAGE_NUMBER = re.compile(
+    r"\b(?:p[aá]g(?:ina)?\.?|page)\s*\d+(?:\s*(?:de|of|/)\s*\d+)?|^\d+(?:\s*/\s*\d+)?$", re.IGNORECASE,
+)
+_DATE_TOKEN = re.compile(r"\b\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}\b")
+
+# Lines at the top and bottom of a page where headers and footers are looked for,
+# at most a quarter of the page's lines each so short pages keep their body
+EDGE_LINES = 3
+
+# Shorter lines ("Sí", "N/A", a bare amount) are values, never boilerplate
+BOILERPLATE_MIN_CHARS = 12
+
+_KEYWORDS = re.compile(
+    "|".join(re.escape(keyword) for group in FIELD_GROUPS for keyword in group["keywords"]), re.IGNORECASE,
+)
+
+
+@lru_cache(maxsize=8)
+def _encoder(model: str) -> Any:
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model: str = "o1") -> int:
+    """Tokens of ``text`` for ``model``; estimated from its length when ``tiktoken`` is not installed."""
+    if not text:
+        return 0
+    if tiktoken is not None:
+        try:
+            return len(_encoder(model).encode(text, disallowed_special=()))
+        except Exception:
+            logging.debug("tiktoken failed for model %s, estimating", model, exc_info=True)
+    return max(1, round(len(text) / CHARS_PER_TOKEN))
+
+
+def collapse_markdown(text: str) -> str:
+    """Strip OCR markdown that carries no field values.
+
+    Drops image references, horizontal rules and table separator rows,
+    unwraps table rows and emphasis, removes heading marks, and collapses
+    whitespace runs.
+    """
+    lines = []
+    for line in _IMAGE_REF.sub("", text).splitlines():
+        if _RULE_LINE.match(line) or _TABLE_SEPARATOR.match(line):
+            continue
+        stripped = line.strip()
+        if stripped.startswith("|"):
+            cells = [cell.strip() for cell in stripped.strip("|").split("|")]
+            line = " | ".join(cells)
+        line = _HEADING.sub("", _EMPHASIS.sub(r"\2", line))
+        lines.append(_SPACES.sub(" ", line).strip())
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+
+def _line_key(line: str) -> str:
+    key = _SPACES.sub(" ", line.strip().lower())
+    # Page numbers and print dates differ between otherwise identical headers and footers
+    return _DATE_TOKEN.sub("#", _PAGE_NUMBER.sub("#", key))
+
+
+def _page_keys(text: str) -> List[Optional[str]]:
+    """Boilerplate key of every line of a page, ``None`` for lines that cannot be boilerplate.
+
+    Only the first and last :data:`EDGE_LINES` non-blank lines (a quarter
+    of a short page's lines), where headers and footers sit, with at least :data:`BOILERPLATE_MIN_CHARS`
+    characters get a key. Lines match on their exact text with page numbers
+    and dates masked, so lines that differ only in a phone number, cédula
+    or amount are never taken for a template.
+    """
+    lines = text.splitlines()
+    filled = [index for index, line in enumerate(lines) if line.strip()]
+    edge = min(EDGE_LINES, max(1, len(filled) // 4))
+    edges = set(filled[:edge] + filled[-edge:])
+    return [
+        _line_key(line) if index in edges and len(line.strip()) >= BOILERPLATE_MIN_CHARS else None
+        for index, line in enumerate(lines)
+    ]
+
+
+def boilerplate_lines(pages: List[TextChunk], min_pages: int) -> set:
+    """Header and footer line keys that appear on at least ``min_pages`` distinct pages."""
+    if min_pages <= 1 or len(pages) < min_pages:
+        return set()
+    counts: Counter = Counter()
+    for page in pages:
+        counts.update({key for key in _page_keys(page.text) if key is not None})
+    return {key for key, count in counts.items() if count >= min_pages}
+
+
+def page_value(text: str, tokens: int) -> float:
+    """Schema keyword hits per 100 tokens; pages with the lowest value are dropped first."""
+    return 100.0 * len(_KEYWORDS.findall(text)) / max(tokens, 1)
+
+
+@dataclass
+class CompactionResult:
+    """Compacted classification input and what compaction did.
+
+    Attributes
+    ----------
+    text : str
+        Compacted text in the ``=== FILE ===`` / ``--- PAGE n ---`` layout.
+    tokens_before : int
+        Tokens of the original text.
+    tokens_after : int
+        Tokens of ``text``.
+    pages : int
+        Pages in the original text.
+    dropped_pages : list of (str, int)
+        ``(file_name, page_number)`` of pages removed to fit the budget.
+    boilerplate_removed : int
+        Repeated header and footer lines removed.
+    """
+
+    text: str
+    tokens_before: int
+    tokens_after: int
+    pages: int
+    dropped_pages: List[Tuple[str, int]] = field(default_factory=list)
+    boilerplate_removed: int = 0
+
+    @property
+    def saved_ratio(self) -> float:
+        return 1.0 - self.tokens_after / self.tokens_before if self.tokens_before else 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "pages": self.pages,
+            "pages_dropped": len(self.dropped_pages),
+            "boilerplate_removed": self.boilerplate_removed,
+        }
+
+
+def _render(pages: List[TextChunk]) -> str:
+    parts = []
+    current: Optional[str] = None
+    blocks: List[str] = []
+    for page in pages:
+        if page.file_name != current:
+            if current is not None:
+                parts.append(file_block(current, "".join(blocks)))
+            current, blocks = page.file_name, []
+        blocks.append(format_page_block(page.page_number, page.text))
+    if current is not None:
+        parts.append(file_block(current, "".join(blocks)))
+    return "".join(parts)
+
+
+def compact_text(
+    combined_text: str,
+    max_tokens: int = 0,
+    model: str = "o1",
+    boilerplate_min_pages: int = 3,
+    collapse: bool = True,
+) -> CompactionResult:
+    """Shrink combined OCR text before it is sent for classification.
+
+    Header and footer lines repeated on at least ``boilerplate_min_pages``
+    pages are kept only on the first page they appear on, markdown is collapsed with :func:`collapse_markdown`, and
+    pages left empty are removed. If the result still exceeds
+    ``max_tokens``, the pages with the lowest :func:`page_value` are
+    dropped until it fits; the most valuable page is always kept.
+
+    Parameters
+    ----------
+    combined_text : str
+        Combined OCR text, as produced by ``PageStore.combined_text``.
+    max_tokens : int
+        Token budget. ``0`` disables page dropping.
+    model : str
+        Model whose tokenizer counts tokens.
+    boilerplate_min_pages : int
+        Pages a line must repeat on to count as boilerplate. ``0`` or ``1``
+        keeps every line.
+    collapse : bool
+        Whether to collapse markdown and whitespace.
+
+    Returns
+    -------
+    CompactionResult
+    """
+    tokens_before = count_tokens(combined_text, model)
+    pages = split_chunks(combined_text)
+    if not pages:
+        return CompactionResult(combined_text, tokens_before, tokens_before, 0)
+    # Text without file markers has nothing to split into pages
+    unmarked = len(pages) == 1 and not pages[0].file_name
+
+    repeated = boilerplate_lines(pages, boilerplate_min_pages)
+    # Page a boilerplate line was first seen on; every copy on that page is kept
+    first_seen: Dict[str, int] = {}
+    removed = 0
+    compacted: List[TextChunk] = []
+    for index, page in enumerate(pages):
+        lines = []
+        for line, key in zip(page.text.splitlines(), _page_keys(page.text)):
+            if key is not None and key in repeated:
+                if first_seen.setdefault(key, index) != index:
+                    removed += 1
+                    continue
+            lines.append(line)
+        text = "\n".join(lines)
+        if collapse:
+            text = collapse_markdown(text)
+        if text:
+            compacted.append(TextChunk(page.file_name, page.page_number, text))
+
+    render = (lambda kept: kept[0].text if kept else "") if unmarked else _render
+    text = render(compacted)
+    tokens = count_tokens(text, model)
+    dropped: List[Tuple[str, int]] = []
+    if max_tokens > 0 and tokens > max_tokens and len(compacted) > 1:
+        scored = [(page_value(page.text, count_tokens(page.text, model)), index) for index, page in enumerate(compacted)]
+        # Lowest value first; among equals, later pages go first
+        drop_order = [index for _, index in sorted(scored, key=lambda item: (item[0], -item[1]))]
+        kept = set(range(len(compacted)))
+        for index in drop_order[:-1]:
+            kept.discard(index)
+            dropped.append((compacted[index].file_name, compacted[index].page_number))
+            text = render([page for i, page in enumerate(compacted) if i in kept])
+            tokens = count_tokens(text, model)
+            if tokens <= max_tokens:
+                break
+    if max_tokens > 0 and tokens > max_tokens:
+        logging.warning("Classification input is %d tokens after compaction, over the %d budget", tokens, max_tokens)
+    return CompactionResult(text, tokens_before, tokens, len(pages), dropped, removed)
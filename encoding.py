@@ -0,0 +1,210 @@
+import base64
+import io
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from PIL import Image
+
+# Pillow format name -> MIME type accepted in an image data URL
+MIME_TYPES = {
+    "JPEG": "image/jpeg",
+    "PNG": "image/png",
+    "WEBP": "image/webp",
+}
+
+LOSSY_FORMATS = {"JPEG", "WEBP"}
+
+
+@dataclass
+class EncodedPage:
+    """A page image encoded in memory and ready to send to the OCR API.
+
+    Attributes
+    ----------
+    data_url : str
+        ``data:<mime>;base64,...`` URL for the ``image_url`` document type.
+    num_bytes : int
+        Size of the encoded image before base64.
+    image_format : str
+        Pillow format name that was used.
+    quality : int
+        Final encoder quality (lossy formats only).
+    size : tuple of (int, int)
+        Final pixel dimensions, smaller than the rendered page if the payload
+        had to be downscaled to fit ``max_bytes``.
+    """
+
+    data_url: str
+    num_bytes: int
+    image_format: str
+    quality: int
+    size: Tuple[int, int]
+
+
+def _encode(image: Image.Image, image_format: str, quality: int) -> io.BytesIO:
+    buffer = io.BytesIO()
+    if image_format in LOSSY_FORMATS:
+        image.save(buffer, format=image_format, quality=quality)
+    else:
+        image.save(buffer, format=image_format, optimize=True)
+    return buffer
+
+
+def encode_page(
+    image: Image.Image,
+    image_format: str = "JPEG",
+    quality: int = 75,
+    grayscale: bool = False,
+    max_bytes: Optional[int] = None,
+    min_quality: int = 40,
+    min_scale: float = 0.5,
+) -> EncodedPage:
+    """Encode a rendered page straight to a base64 data URL, without touching disk.
+
+    Parameters
+    ----------
+    image : PIL.Image.Image
+        Rendered page.
+    image_format : str
+        One of ``JPEG``, ``PNG`` or ``WEBP``.
+    quality : int
+        Starting encoder quality for lossy formats.
+    grayscale : bool
+        Convert to 8-bit grayscale before encoding.
+    max_bytes : int, optional
+        Target size of the encoded image. Quality is lowered first (lossy
+        formats only), then resolution, until the payload fits or
+        ``min_quality`` and ``min_scale`` are both reached.
+    min_quality : int
+        Lowest quality tried when shrinking the payload.
+    min_scale : float
+        Smallest fraction of the original resolution tried when shrinking.
+
+    Returns
+    -------
+    EncodedPage
+        The data URL and the size of the payload that was produced.
+    """
+    image_format = image_format.upper()
+    if image_format not in MIME_TYPES:
+        raise ValueError(f"Unsupported page format: {image_format}")
+
+    if grayscale:
+        image = image.convert("L")
+    elif image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    source = image
+    scale = 1.0
+    buffer = _encode(image, image_format, quality)
+    while max_bytes and buffer.tell() > max_bytes:
+        if image_format in LOSSY_FORMATS and quality > min_quality:
+            quality = max(min_quality, quality - 10)
+        elif scale > min_scale:
+            scale = max(min_scale, scale * 0.8)
+            size = (max(1, int(source.width * scale)), max(1, int(source.height * scale)))
+            image = source.resize(size, Image.LANCZOS)
+        else:
+            break
+        buffer = _encode(image, image_format, quality)
+
+    return EncodedPage(
+        data_url=to_data_url(buffer.getbuffer(), image_format),
+        num_bytes=buffer.tell(),
+        image_format=image_format,
+        quality=quality,
+        size=image.size,
+    )
+
+
+def to_data_url(data: bytes, image_format: str) -> str:
+    """Wrap encoded image bytes in a ``data:<mime>;base64,...`` URL."""
+    return f"data:{MIME_TYPES[image_format.upper()]};base64,{base64.b64encode(data).decode('ascii')}"
+
+
+def encode_rendered(
+    data: bytes,
+    image_format: str = "JPEG",
+    quality: int = 75,
+    max_bytes: Optional[int] = None,
+) -> EncodedPage:
+    """Use page bytes produced directly by the renderer as the upload payload.
+
+    Only the image header is parsed. The page is decoded and re-encoded with
+    :func:`encode_page` only when it exceeds ``max_bytes``.
+    """
+    image = Image.open(io.BytesIO(data))
+    if max_bytes and len(data) > max_bytes:
+        return encode_page(image, image_format=image_format, quality=quality, max_bytes=max_bytes)
+    return EncodedPage(
+        data_url=to_data_url(data, image_format),
+        num_bytes=len(data),
+        image_format=image_format.upper(),
+        quality=quality,
+        size=image.size,
+    )
+
+
+def _pdf_object(number: int, body: bytes) -> bytes:
+    return b"%d 0 obj\n" % number + body + b"\nendobj\n"
+
+
+def images_to_pdf(images: List[bytes], dpi: int = 200) -> bytes:
+    """Wrap encoded page images into one PDF, one image per page, for a batched OCR request.
+
+    JPEG pages are embedded as they are (``DCTDecode``), so nothing is
+    decoded or re-encoded. Other formats go through Pillow's PDF writer.
+
+    Parameters
+    ----------
+    images : list of bytes
+        Encoded page images, in page order.
+    dpi : int
+        Resolution the pages were rendered at, which sets the page size.
+    """
+    opened = [Image.open(io.BytesIO(data)) for data in images]
+    if any(image.format != "JPEG" or image.mode not in ("L", "RGB") for image in opened):
+        buffer = io.BytesIO()
+        pages = [image.convert("RGB") if image.mode not in ("L", "RGB") else image for image in opened]
+        pages[0].save(buffer, format="PDF", save_all=True, append_images=pages[1:], resolution=dpi)
+        return buffer.getvalue()
+
+    # Objects: 1 catalog, 2 page tree, then page, content stream and image for every page
+    chunks = [b"%PDF-1.4\n"]
+    offsets = []
+    kids = []
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None]
+    for page_index, (data, image) in enumerate(zip(images, opened)):
+        page_number, content_number, image_number = 3 + 3 * page_index, 4 + 3 * page_index, 5 + 3 * page_index
+        width, height = image.size
+        points = (width * 72 / dpi, height * 72 / dpi)
+        content = b"q %.2f 0 0 %.2f 0 0 cm /Im0 Do Q" % points
+        kids.append(b"%d 0 R" % page_number)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] " % points
+            + b"/Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>" % (image_number, content_number)
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        objects.append(
+            b"<< /Type /XObject /Subtype /Image /Width %d /Height %d " % (width, height)
+            + b"/ColorSpace /%s /BitsPerComponent 8 /Filter /DCTDecode /Length %d >>\nstream\n"
+            % (b"DeviceGray" if image.mode == "L" else b"DeviceRGB", len(data))
+            + data + b"\nendstream"
+        )
+    objects[1] = b"<< /Type /Pages /Kids [" + b" ".join(kids) + b"] /Count %d >>" % len(kids)
+
+    position = len(chunks[0])
+    for number, body in enumerate(objects, start=1):
+        chunk = _pdf_object(number, body)
+        offsets.append(position)
+        chunks.append(chunk)
+        position += len(chunk)
+    chunks.append(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    chunks.extend(b"%010d 00000 n \n" % offset for offset in offsets)
+    chunks.append(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, position))
+    return b"".join(chunks)
+
+
+def data_url_bytes(data_url: str) -> bytes:
+    """Decode the payload of a base64 data URL."""
+    return base64.b64decode(data_url.split(",", 1)[1])
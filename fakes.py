@@ -0,0 +1,213 @@
+import base64
+import hashlib
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+
+class FakeAPIError(Exception):
+    """Error raised by the fake clients, shaped like an HTTP API error.
+
+    Attributes
+    ----------
+    status_code : int
+        HTTP status the real API would have returned.
+    headers : dict
+        Response headers, e.g. ``Retry-After`` on 429s.
+    """
+
+    def __init__(self, message: str, status_code: int, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+@dataclass
+class FakeLatency:
+    """Latency and failure model for a fake backend.
+
+    Attributes
+    ----------
+    base_seconds : float
+        Fixed time per request.
+    per_page_seconds : float
+        Additional time per page in the request.
+    jitter_seconds : float
+        Upper bound of uniform random extra delay.
+    error_rate : float
+        Probability that a request fails with a 5xx.
+    throttle_rate : float
+        Probability that a request is rejected with a 429.
+    seed : int, optional
+        Seed for reproducible runs.
+    """
+
+    base_seconds: float = 0.5
+    per_page_seconds: float = 0.0
+    jitter_seconds: float = 0.2
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    seed: Optional[int] = None
+    _random: random.Random = field(init=False, repr=False)
+    _lock: threading.Lock = field(init=False, repr=False, default_factory=threading.Lock)
+
+    def __post_init__(self):
+        self._random = random.Random(self.seed)
+
+    def wait(self, pages: int = 1) -> None:
+        """Sleep for one request, then maybe raise a simulated failure."""
+        with self._lock:
+            jitter = self._random.uniform(0, self.jitter_seconds)
+            roll = self._random.random()
+        time.sleep(self.base_seconds + self.per_page_seconds * pages + jitter)
+        if roll < self.throttle_rate:
+            raise FakeAPIError("Rate limit exceeded", 429, {"Retry-After": "1"})
+        if roll < self.throttle_rate + self.error_rate:
+            raise FakeAPIError("Internal server error", 500)
+
+
+@dataclass
+class FakeOCRPage:
+    index: int
+    markdown: str
+
+
+@dataclass
+class FakeOCRResponse:
+    pages: List[FakeOCRPage]
+
+
+class _FakeOCRResource:
+    def __init__(self, owner: "FakeMistral"):
+        self._owner = owner
+
+    def process(self, model: str, document: Dict[str, Any], pages: Optional[List[int]] = None, **kwargs: Any) -> FakeOCRResponse:
+        return self._owner._process(model, document, pages)
+
+
+@dataclass
+class FakeUploadedFile:
+    id: str
+
+
+@dataclass
+class FakeSignedURL:
+    url: str
+
+
+class _FakeFilesResource:
+    def __init__(self, owner: "FakeMistral"):
+        self._owner = owner
+
+    def upload(self, file: Dict[str, Any], purpose: str = "ocr", **kwargs: Any) -> FakeUploadedFile:
+        return FakeUploadedFile(self._owner._upload(file["content"]))
+
+    def get_signed_url(self, file_id: str, **kwargs: Any) -> FakeSignedURL:
+        if file_id not in self._owner.uploads:
+            raise FakeAPIError("File not found", 404)
+        return FakeSignedURL(f"{FAKE_FILE_SCHEME}{file_id}")
+
+    def delete(self, file_id: str, **kwargs: Any) -> None:
+        with self._owner._lock:
+            self._owner.uploads.pop(file_id, None)
+
+
+# Signed URLs of fake uploads; the fake OCR endpoint resolves them to the stored bytes
+FAKE_FILE_SCHEME = "fake-file://"
+
+
+def _count_pdf_pages(pdf_bytes: bytes) -> int:
+    return max(1, len(re.findall(rb"/Type\s*/Page(?!s)", pdf_bytes)))
+
+
+def _data_url_bytes(data_url: str) -> bytes:
+    try:
+        return base64.b64decode(data_url.split(",", 1)[1])
+    except (IndexError, ValueError):
+        return b""
+
+
+class FakeMistral:
+    """Local stand-in for ``mistralai.Mistral`` exposing ``client.ocr.process``.
+
+    Returns deterministic synthetic markdown so pipeline output is stable
+    across runs, and counts requests and uploaded bytes. Files uploaded
+    through ``client.files`` are kept in memory until deleted and can be
+    referenced by their signed URL.
+
+    Parameters
+    ----------
+    latency : FakeLatency, optional
+        Latency and failure model. Defaults to :class:`FakeLatency` values.
+    page_count : int, optional
+        Pages reported for ``document_url`` requests without ``pages``.
+        Defaults to the number of pages in the inline PDF, so batched
+        multi-page requests get one result per page.
+    """
+
+    def __init__(self, latency: Optional[FakeLatency] = None, page_count: Optional[int] = None):
+        self.latency = latency or FakeLatency()
+        self.page_count = page_count
+        self.ocr = _FakeOCRResource(self)
+        self.files = _FakeFilesResource(self)
+        self.uploads: Dict[str, bytes] = {}
+        self.requests = 0
+        self.upload_bytes = 0
+        self._lock = threading.Lock()
+
+    def _upload(self, content: bytes) -> str:
+        file_id = hashlib.sha256(content).hexdigest()[:16]
+        with self._lock:
+            self.requests += 1
+            self.upload_bytes += len(content)
+            self.uploads[file_id] = content
+        return file_id
+
+    def _process(self, model: str, document: Dict[str, Any], pages: Optional[List[int]]) -> FakeOCRResponse:
+        payload = document.get("image_url") or document.get("document_url") or ""
+        with self._lock:
+            self.requests += 1
+            self.upload_bytes += len(payload)
+        digest = hashlib.sha256(payload.encode("ascii", errors="ignore")).hexdigest()[:12]
+
+        if document.get("type") == "document_url":
+            if payload.startswith(FAKE_FILE_SCHEME):
+                pdf_bytes = self.uploads.get(payload[len(FAKE_FILE_SCHEME):])
+                if pdf_bytes is None:
+                    raise FakeAPIError("File not found", 404)
+            else:
+                pdf_bytes = _data_url_bytes(payload)
+            page_count = self.page_count if self.page_count is not None else _count_pdf_pages(pdf_bytes)
+            indices = list(pages) if pages is not None else list(range(page_count))
+        else:
+            indices = [0]
+        self.latency.wait(len(indices))
+        return FakeOCRResponse(pages=[
+            FakeOCRPage(index=index, markdown=f"# Solicitud de préstamo\n\nPágina {index + 1} ({digest})\n\nNOMBRE: Juan Pérez")
+            for index in indices
+        ])
+
+
+class FakeClassifier:
+    """Local stand-in for the remote classifier, callable like ``classify_with_o1_model``.
+
+    Parameters
+    ----------
+    latency : FakeLatency, optional
+        Latency and failure model. ``per_page_seconds`` is applied per
+        10,000 characters of input to mimic prompt-size dependent latency.
+    """
+
+    def __init__(self, latency: Optional[FakeLatency] = None):
+        self.latency = latency or FakeLatency(base_seconds=2.0, jitter_seconds=1.0)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, text: str, api_key: str, json_schema: str) -> Dict[str, Any]:
+        with self._lock:
+            self.calls += 1
+        self.latency.wait(max(1, len(text) // 10_000))
+        return {"text_length": len(text)}
@@ -0,0 +1,277 @@
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Bump whenever the rules change so cached classifications are not reused
+RULES_VERSION = "fast-path-2"
+
+# Confidence of a section-dependent hint in incremental classification, below
+# any sensible ``min_confidence`` so the model is still asked for the field
+HINT_CONFIDENCE = 0.5
+
+SPANISH_MONTHS = {
+    "enero": 1, "febrero": 2, "marzo": 3, "abril": 4, "mayo": 5, "junio": 6, "julio": 7,
+    "agosto": 8, "septiembre": 9, "setiembre": 9, "octubre": 10, "noviembre": 11, "diciembre": 12,
+}
+
+# Headings that switch the person a generic label (e.g. "Cédula") refers to.
+# They only count as a line of their own (see _HEADING), so "Cónyuge: N/A" on
+# a single applicant's form does not switch to the spouse section
+_ABOUT = r"(?:datos|informaci[oó]n)\s+(?:del?|de\s+la)\s+"
+SECTIONS = {
+    "spouse": _ABOUT + r"(?:c[oó]nyuge|esposo\(?a\)?|esposa)",
+    "father": _ABOUT + r"padre",
+    "mother": _ABOUT + r"madre",
+    "reference": r"referencias?\s+personal(?:es)?",
+    "commercial": r"referencias?\s+(?:comercial(?:es)?|bancarias?)",
+    "applicant": r"datos\s+personales|" + _ABOUT + r"solicitante",
+}
+
+# A heading fills its line, optionally as markdown heading, bold text or table cell
+_HEADING = r"^(?:[|#*_]|[^\S\n])*(?:{})(?:[:|*_]|[^\S\n])*$"
+
+_OF_SPOUSE = r"\s+(?:del\s+|de\s+la\s+)?(?:c[oó]nyuge|esposo\(?a\)?|esposa)"
+_SEPARATOR = r"[^\S\n]*(?:no\.?|n[uú]m(?:ero)?\.?|#)?[^\S\n]*[:.\-]?[^\S\n]*"
+_CEDULA = r"\d{3}[-\s]?\d{7}[-\s]?\d"
+_PHONE = r"(?:\+?1[\s.-]?)?\(?8[024]9\)?[\s.-]?\d{3}[\s.-]?\d{4}"
+_EMAIL = r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+"
+_DATE = (
+    r"\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}"
+    r"|\d{1,2}\s+de\s+(?:" + "|".join(SPANISH_MONTHS) + r")\s+(?:de\s+|del\s+)?\d{4}"
+)
+_AMOUNT = r"(?:RD\$|US\$|\$)?[^\S\n]*\d{1,3}(?:,\d{3})+(?:\.\d{2})?|(?:RD\$|US\$|\$)[^\S\n]*\d+(?:\.\d{2})?"
+_ACCOUNT = r"\d[\d-]{4,18}\d"
+
+
+@dataclass(frozen=True)
+class Rule:
+    """A labelled value pattern and the field it fills in each section.
+
+    Attributes
+    ----------
+    name : str
+        Rule identifier, used as the regex group name.
+    label : str
+        Pattern of the label preceding the value on the same line.
+    value : str
+        Pattern of the value.
+    fields : dict
+        Section name to schema field. ``"*"`` applies in every section not
+        listed; sections without a field are ignored. A field taken from the
+        ``"*"`` entry is named by the label itself; any other depends on the
+        section heading and is only a hint.
+    kind : str
+        How the value is normalised: ``cedula``, ``phone``, ``email``,
+        ``date``, ``amount`` or ``account``. Dates become ISO 8601.
+    """
+
+    name: str
+    label: str
+    value: str
+    fields: Dict[str, str]
+    kind: str
+
+
+RULES = [
+    Rule("cedula_conyuge", r"c[eé]dula" + _OF_SPOUSE, _CEDULA, {"*": "CEDULA_CONYUGE"}, "cedula"),
+    Rule("telefono_conyuge", r"(?:tel[eé]fono|celular)" + _OF_SPOUSE, _PHONE, {"*": "TELEFONO_CONYUGE"}, "phone"),
+    Rule("email_conyuge", r"(?:correo(?:\s+electr[oó]nico)?|e-?mail)" + _OF_SPOUSE, _EMAIL, {"*": "EMAIL_CONYUGE"}, "email"),
+    Rule("nacimiento_conyuge", r"fecha\s+de\s+nacimiento" + _OF_SPOUSE, _DATE, {"*": "FECHA_NACIMIENTO_CONYUGE"}, "date"),
+    Rule("cedula", r"c[eé]dula(?:\s+de\s+identidad)?(?:\s+y\s+electoral)?", _CEDULA,
+         {"applicant": "CEDULA", "spouse": "CEDULA_CONYUGE"}, "cedula"),
+    Rule("celular", r"(?:tel[eé]fono\s+)?(?:celular|m[oó]vil|cel\.)", _PHONE,
+         {"applicant": "TELEFONO_CELULAR", "spouse": "TELEFONO_CONYUGE", "father": "TELEFONO_PADRE",
+          "mother": "TELEFONO_MADRE", "reference": "TELEFONO_REFERENCIA_PERSONAL",
+          "commercial": "TELEFONO_REFERENCIA_COMERCIAL_"}, "phone"),
+    Rule("telefono_casa", r"tel[eé]fono\s+(?:de\s+)?(?:casa|residencia|residencial)", _PHONE,
+         {"applicant": "TELEFONO_CASA"}, "phone"),
+    Rule("telefono_trabajo", r"tel[eé]fono\s+(?:del?\s+)?(?:trabajo|oficina|empresa)", _PHONE,
+         {"applicant": "TELEFONO_TRABAJO"}, "phone"),
+    Rule("telefono", r"tel[eé]fono|tel\.", _PHONE,
+         {"spouse": "TELEFONO_CONYUGE", "father": "TELEFONO_PADRE", "mother": "TELEFONO_MADRE",
+          "reference": "TELEFONO_REFERENCIA_PERSONAL", "commercial": "TELEFONO_REFERENCIA_COMERCIAL_"}, "phone"),
+    Rule("email", r"correo(?:\s+electr[oó]nico)?|e-?mail", _EMAIL,
+         {"applicant": "CORREO_ELECTRONICO", "spouse": "EMAIL_CONYUGE"}, "email"),
+    Rule("nacimiento", r"fecha\s+de\s+nacimiento|f\.\s*nac\.?|nacido\s+el", _DATE,
+         {"applicant": "FECHA_NACIMIENTO", "spouse": "FECHA_NACIMIENTO_CONYUGE"}, "date"),
+    Rule("monto_prestamo", r"monto\s+(?:del?\s+)?(?:pr[eé]stamo|solicitado|a\s+financiar|financiado)", _AMOUNT,
+         {"*": "MONTO_PRESTAMO"}, "amount"),
+    Rule("monto_inicial", r"(?:monto|pago)\s+inicial|inicial", _AMOUNT, {"*": "MONTO_INICIAL"}, "amount"),
+    Rule("precio_vehiculo", r"(?:precio|valor)\s+(?:del\s+)?veh[ií]culo", _AMOUNT, {"*": "PRECIO_VEHICULO"}, "amount"),
+    Rule("cuenta", r"(?:n[uú]mero\s+de\s+)?cuenta(?!\s+(?:por|a)\s+cobrar)(?:\s+(?:de\s+)?(?:ahorros?|corriente))?",
+         _ACCOUNT, {"applicant": "CUENTABANCO", "commercial": "CUENTABANCO"}, "account"),
+]
+
+# Fields filled by successive distinct matches, with the ordinal appended (CUENTABANCO1..3)
+REPEATED_FIELDS = {"CUENTABANCO": 3, "TELEFONO_REFERENCIA_COMERCIAL_": 2}
+
+
+@dataclass
+class Extraction:
+    """A field value found by the fast path, with where it was found.
+
+    Attributes
+    ----------
+    field : str
+        Schema field.
+    value : str
+        Normalised value.
+    file_name : str
+        File the value was found in.
+    page_number : int
+        One-based page within that file.
+    offset : int
+        Character offset of the value in the page text, plus the page's
+        offset in the document text when it is known.
+    rule : str
+        Name of the rule that matched.
+    hint : bool
+        Whether the field was chosen by the section the value was found in
+        rather than by its label. Section detection can be wrong, so a hint
+        should not override the model.
+    """
+
+    field: str
+    value: str
+    file_name: str
+    page_number: int
+    offset: int
+    rule: str
+    hint: bool = False
+
+
+def _compile(rules: List[Rule]) -> "re.Pattern[str]":
+    # One alternation over every section heading and rule, so each page is scanned once
+    parts = [f"(?P<section_{name}>{_HEADING.format(pattern)})" for name, pattern in SECTIONS.items()]
+    parts += [f"(?:{rule.label}){_SEPARATOR}(?P<{rule.name}>{rule.value})" for rule in rules]
+    return re.compile("|".join(parts), re.IGNORECASE | re.MULTILINE)
+
+
+_RULES_BY_NAME = {rule.name: rule for rule in RULES}
+_PATTERN = _compile(RULES)
+
+
+def normalize(kind: str, value: str) -> str:
+    """Canonical form of a matched value."""
+    value = value.strip()
+    if kind == "cedula":
+        digits = re.sub(r"\D", "", value)
+        return f"{digits[:3]}-{digits[3:10]}-{digits[10:]}"
+    if kind == "phone":
+        digits = re.sub(r"\D", "", value)[-10:]
+        return f"({digits[:3]}) {digits[3:6]}-{digits[6:]}"
+    if kind == "email":
+        return value.lower().rstrip(".")
+    if kind == "date":
+        words = re.match(r"(\d{1,2})\s+de\s+(\w+)\s+(?:de\s+|del\s+)?(\d{4})", value, re.IGNORECASE)
+        if words:
+            day, month, year = int(words.group(1)), SPANISH_MONTHS[words.group(2).lower()], int(words.group(3))
+        else:
+            day, month, year = (int(part) for part in re.split(r"[/.-]", value))
+            if year < 100:
+                year += 1900 if year > datetime.now().year % 100 else 2000
+        # Day-first, as on Dominican forms; an impossible date is left for the model
+        try:
+            return datetime(year, month, day).strftime("%Y-%m-%dT%H:%M:%S")
+        except ValueError:
+            return ""
+    if kind == "amount":
+        return re.sub(r"\s+", " ", value)
+    return value
+
+
+def extract_fields(pages: Iterable[Tuple[str, int, str, int]], wanted: Optional[Iterable[str]] = None) -> Dict[str, Extraction]:
+    """Fill pattern-shaped fields from page texts in one regex pass per page.
+
+    Pages are scanned in the given order and the first match of a field
+    wins. Section headings (spouse, parents, references) on a line of their
+    own switch which field a generic label fills; the section resets at
+    every new file. Such fields are marked as hints.
+
+    Parameters
+    ----------
+    pages : iterable of (str, int, str, int)
+        ``(file_name, page_number, text, base_offset)`` in reading order.
+        ``base_offset`` is added to the in-page offset of every match.
+    wanted : iterable of str, optional
+        Only fill these fields. Defaults to every field the rules know.
+
+    Returns
+    -------
+    dict
+        Field name to :class:`Extraction`.
+    """
+    wanted_fields = set(wanted) if wanted is not None else None
+    found: Dict[str, Extraction] = {}
+    repeated: Dict[str, List[str]] = {}
+    current_file = None
+    section = "applicant"
+    for file_name, page_number, text, base_offset in pages:
+        if file_name != current_file:
+            current_file, section = file_name, "applicant"
+        for match in _PATTERN.finditer(text):
+            group = match.lastgroup
+            if group.startswith("section_"):
+                section = group[len("section_"):]
+                continue
+            rule = _RULES_BY_NAME[group]
+            hint = section in rule.fields
+            field = rule.fields[section] if hint else rule.fields.get("*", "")
+            if not field:
+                continue
+            value = normalize(rule.kind, match.group(group))
+            if not value:
+                continue
+            if field in REPEATED_FIELDS:
+                values = repeated.setdefault(field, [])
+                if value in values or len(values) >= REPEATED_FIELDS[field]:
+                    continue
+                values.append(value)
+                field = f"{field}{len(values)}"
+            if field in found or (wanted_fields is not None and field not in wanted_fields):
+                continue
+            found[field] = Extraction(
+                field, value, file_name, page_number, base_offset + match.start(group), rule.name, hint,
+            )
+    return found
+
+
+def extract_from_store(store: Any, order: Iterable[str]) -> Dict[str, Extraction]:
+    """Run :func:`extract_fields` over the documents of a :class:`page_store.PageStore`, in ``order``.
+
+    Offsets are relative to each file's ``--- PAGE n ---`` document text.
+    """
+    def pages() -> Iterable[Tuple[str, int, str, int]]:
+        for doc_key in order:
+            document = store.get(doc_key)
+            if document is None:
+                continue
+            for page in document.pages:
+                if page.source != "error":
+                    # Skip the "\n\n--- PAGE n ---\n\n" header in front of the page text
+                    header = len(f"\n\n--- PAGE {page.page_number} ---\n\n")
+                    yield document.name, page.page_number, page.text, page.offset + header
+
+    return extract_fields(pages())
+
+
+def as_values(extractions: Dict[str, Extraction], hints: bool = True) -> Dict[str, Any]:
+    """Field values of ``extractions``; with ``hints=False`` only those named by their label."""
+    return {field: extraction.value for field, extraction in extractions.items() if hints or not extraction.hint}
+
+
+def merge(extractions: Dict[str, Extraction], model_result: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine fast-path values with the model's answer.
+
+    Values named by their label win over the model's; hints only fill
+    fields the model left empty.
+    """
+    merged = {field: extraction.value for field, extraction in extractions.items() if extraction.hint}
+    for field, value in (model_result or {}).items():
+        if value is not None and value != "" and value != [] and value != {}:
+            merged[field] = value
+        else:
+            merged.setdefault(field, value)
+    merged.update(as_values(extractions, hints=False))
+    return merged
@@ -0,0 +1,151 @@
+import itertools
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+@dataclass
+class Job:
+    """A unit of background work, identified by the content hash of its input.
+
+    Attributes
+    ----------
+    key : str
+        Deduplication key, e.g. the document hash.
+    name : str
+        Display name.
+    status : str
+        One of ``queued``, ``running``, ``done`` or ``failed``.
+    total : int
+        Total units of work (pages) once known.
+    completed : int
+        Units finished so far.
+    partial : dict
+        Output the job function publishes while running (e.g. finished
+        pages), for callers that consume results incrementally.
+    result : Any
+        Return value of the job function once ``done``.
+    error : BaseException, optional
+        Exception raised by the job function if ``failed``.
+    priority : float
+        Scheduling order; queued jobs with a lower value start first.
+    """
+
+    key: str
+    name: str
+    status: str = QUEUED
+    total: int = 0
+    completed: int = 0
+    partial: Dict[Any, Any] = field(default_factory=dict)
+    result: Any = None
+    error: Optional[BaseException] = None
+    priority: float = 0.0
+    created: float = field(default_factory=time.time)
+    finished: Optional[float] = None
+    _done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def progress(self) -> float:
+        return self.completed / self.total if self.total else 0.0
+
+    @property
+    def active(self) -> bool:
+        return self.status in (QUEUED, RUNNING)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the job is done or failed; returns whether it finished."""
+        return self._done.wait(timeout)
+
+
+class JobManager:
+    """Process-wide background worker pool with per-key deduplication.
+
+    Submitting a key that is already queued, running or done returns the
+    existing job, so the same document uploaded from several tabs or by
+    several users is processed once. Queued jobs start in ``priority``
+    order (e.g. smallest document first), then in submission order.
+    Finished jobs are kept for ``retention_seconds`` so late pollers can
+    still collect the result.
+
+    Parameters
+    ----------
+    max_workers : int
+        Number of jobs processed concurrently.
+    retention_seconds : float
+        How long finished jobs stay available.
+    """
+
+    def __init__(self, max_workers: int = 4, retention_seconds: float = 3600.0):
+        self._queue: "queue.PriorityQueue[Tuple[float, int, Job, Callable[[Job], Any]]]" = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self.retention_seconds = retention_seconds
+        for index in range(max(1, max_workers)):
+            threading.Thread(target=self._work, name=f"job-{index}", daemon=True).start()
+
+    def submit(self, key: str, name: str, fn: Callable[[Job], Any], force: bool = False, priority: float = 0.0) -> Job:
+        """Queue ``fn(job)`` under ``key`` unless an equivalent job already exists.
+
+        Failed jobs are always replaced; ``force`` also replaces finished ones
+        (e.g. to retry pages that failed inside a successful job).
+        """
+        with self._lock:
+            self._prune()
+            existing = self._jobs.get(key)
+            if existing is not None and existing.status != FAILED and not (force and existing.status == DONE):
+                return existing
+            job = Job(key=key, name=name, priority=priority)
+            self._jobs[key] = job
+        self._queue.put((priority, next(self._sequence), job, fn))
+        return job
+
+    def get(self, key: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(key)
+
+    def queue_position(self, key: str) -> int:
+        """Queued jobs that start before ``key``; ``0`` if it is not queued."""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None or job.status != QUEUED:
+                return 0
+            return sum(
+                1 for other in self._jobs.values()
+                if other.status == QUEUED and (other.priority, other.created) < (job.priority, job.created)
+            )
+
+    def _work(self) -> None:
+        while True:
+            _, _, job, fn = self._queue.get()
+            self._run(job, fn)
+
+    def _run(self, job: Job, fn: Callable[[Job], Any]) -> None:
+        job.status = RUNNING
+        try:
+            job.result = fn(job)
+            job.status = DONE
+        except Exception as e:
+            logging.exception("Job %s (%s) failed", job.name, job.key[:12])
+            job.error = e
+            job.status = FAILED
+        finally:
+            job.finished = time.time()
+            job._done.set()
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.retention_seconds
+        for key in [key for key, job in self._jobs.items() if job.finished is not None and job.finished < cutoff]:
+            del self._jobs[key]
+
+    def active_count(self) -> int:
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.active)
@@ -1,595 +1,111 @@
 import streamlit as st
-import base64
 import json
-from mistralai import Mistral
-from pdf2image import convert_from_bytes
+import logging
 import os
-import tempfile
+import time
+import uuid
 from openai import OpenAI as OpenAIClient
-import classification  # Import the classification module
+import classification
+import fast_path
+import jobs
+from clients import ClientRegistry
+import pipeline  # OCR and classification pipeline shared with the batch CLI
+from ocr import TokenBucket
+from page_filter import PageHashIndex
+from page_store import MemoryBudget, PageStore, sweep_spill_dirs
+from settings import load_settings
 
 # Set page configuration
 st.set_page_config(page_title="PDF Page OCR Processor", layout="wide")
 
-# Add this big string with the JSON structure
-CLASSIFICATION_JSON_STRUCTURE = r'''
-{
-  "111": {
-    "type": "string",
-    "description": "Unknown purpose, single character string."
-  },
-  "ACTIVIDAD_PRESTAMO": {
-    "type": "string",
-    "description": "Purpose of the loan, e.g., 'Uso personal' (Personal use)."
-  },
-  "ANO_VEHICULO": {
-    "type": "integer",
-    "description": "Year of the vehicle being acquired with the loan."
-  },
-  "AÑO_VEHICULO_PROPIO": {
-    "type": "string",
-    "description": "Year of a vehicle already owned by the applicant."
-  },
-  "BANCO1": {
-    "type": "string",
-    "description": "Name of the first bank."
-  },
-  "BANCO2": {
-    "type": "string",
-    "description": "Name of the second bank."
-  },
-  "BANCO3": {
-    "type": "string",
-    "description": "Name of the third bank."
-  },
-  "BIENES_INMUEBLES_APARTAMENTO": {
-    "type": "string",
-    "description": "Indicates if the applicant owns an apartment."
-  },
-  "BIENES_INMUEBLES_CASAS": {
-    "type": "string",
-    "description": "Indicates if the applicant owns a house."
-  },
-  "BIENES_INMUEBLES_SOLARES": {
-    "type": "string",
-    "description": "Indicates if the applicant owns land plots."
-  },
-  "BURO_CLIENTE_CONFIRMA": {
-    "type": "string",
-    "description": "Confirmation from the credit bureau, e.g., 'SI'."
-  },
-  "CALLE": {
-    "type": "string",
-    "description": "Street name of the applicant's address."
-  },
-  "CANTIDAD_EMPLEADOS": {
-    "type": "string",
-    "description": "Number of employees if applicable (e.g., for self-employment)."
-  },
-  "CARGO_OCUPA": {
-    "type": "string",
-    "description": "Job title or position held by the applicant."
-  },
-  "CATEGORIA_OCUPACIONAL": {
-    "type": "object",
-    "description": "Categorization of the applicant's occupation.",
-    "properties": {
-      "codigo": {
-        "type": "string",
-        "description": "Code for the occupational category, e.g., 'Cuenta propia profesional'."
-      },
-      "descripcion": {
-        "type": "string",
-        "description": "Description of the occupational category, e.g., 'Cuenta propia profesional'."
-      }
-    }
-  },
-  "CEDULA": {
-    "type": "string",
-    "description": "Applicant's national identification number (Cedula)."
-  },
-  "CEDULA_CONYUGE": {
-    "type": "string",
-    "description": "Spouse's national identification number (Cedula)."
-  },
-  "CIUDAD": {
-    "type": "integer",
-    "description": "Code representing the applicant's city."
-  },
-  "CIUDADANIA_CONYUGE": {
-    "type": "string",
-    "description": "Spouse's citizenship."
-  },
-  "CONCEPTO_COBRAR": {
-    "type": "string",
-    "description": "Description of accounts receivable."
-  },
-  "CONCEPTO_INVERSIONES": {
-    "type": "string",
-    "description": "Description of investments."
-  },
-  "CONCEPTO_MOBILIARIO": {
-    "type": "string",
-    "description": "Description of furniture and fixtures."
-  },
-  "CONCEPTO_OTROS_COMPROMISOS_PAGOS": {
-    "type": "string",
-    "description": "Description of other financial commitments or payments."
-  },
-  "CORREO_ELECTRONICO": {
-    "type": "string",
-    "description": "Applicant's email address."
-  },
-  "CUANTO_PAGA_ALQUILER": {
-    "type": "string",
-    "description": "Monthly rent payment amount."
-  },
-  "CUENTA_COBRAR": {
-    "type": "string",
-    "description": "Amount of accounts receivable."
-  },
-  "CUENTABANCO1": {
-    "type": "string",
-    "description": "Account number for the first bank."
-  },
-  "CUENTABANCO2": {
-    "type": "string",
-    "description": "Account number for the second bank."
-  },
-  "CUENTABANCO3": {
-    "type": "string",
-    "description": "Account number for the third bank."
-  },
-  "DEPENDIENTES": {
-    "type": "string",
-    "description": "Number of dependents for the applicant."
-  },
-  "DEPENDIENTES_CONYUGE": {
-    "type": "string",
-    "description": "Number of dependents for the spouse."
-  },
-  "DESCRIPCION_OTROS_INGRESOS": {
-    "type": "string",
-    "description": "Description of other income sources."
-  },
-  "DIRECCION DE LA MADRE": {
-    "type": "string",
-    "description": "Mother's address."
-  },
-  "DIRECCION_PADRE": {
-    "type": "string",
-    "description": "Father's address."
-  },
-  "DIRECCION_REFERENCIA_PERSONAL": {
-    "type": "string",
-    "description": "Address of a personal reference."
-  },
-  "DIRRECCION_EMPLEO": {
-    "type": "string",
-    "description": "Applicant's employment address."
-  },
-  "DONDE_OTROS_COMPROMISO_PAGOS": {
-    "type": "string",
-    "description": "Institution or entity for other financial commitments/payments."
-  },
-  "EDIFICIO": {
-    "type": "string",
-    "description": "Building name or number of the applicant's address."
-  },
-  "EMAIL_CONYUGE": {
-    "type": "string",
-    "description": "Spouse's email address."
-  },
-  "ESTADO_CIVIL": {
-    "type": "string",
-    "description": "Applicant's marital status, e.g., 'S' (Soltero/Single)."
-  },
-  "FECHA_NACIMIENTO": {
-    "type": "string",
-    "format": "date-time",
-    "description": "Applicant's date of birth in ISO 8601 format."
-  },
-  "FECHA_NACIMIENTO_CONYUGE": {
-    "type": ["string", "null"],
-    "format": "date-time",
-    "description": "Spouse's date of birth in ISO 8601 format, or null if not applicable."
-  },
-  "GASTOS": {
-    "type": "string",
-    "description": "Applicant's monthly expenses."
-  },
-  "INDICICIO_ESTADUNIDENSE": {
-    "type": "string",
-    "description": "Indication of U.S. connections or status."
-  },
-  "INGRESOS": {
-    "type": "string",
-    "description": "Applicant's total monthly income."
-  },
-  "INGRESOS_EXTRAS": {
-    "type": "string",
-    "description": "Indicates if the applicant has extra income, e.g., 'No'."
-  },
-  "INTITUCION_PEP": {
-    "type": "string",
-    "description": "Institution related to Politically Exposed Person (PEP) status."
-  },
-  "LUGAR_NACIMIENTO": {
-    "type": "string",
-    "description": "Applicant's place of birth."
-  },
-  "LUGAR_NACIMIENTO_CONYUGE": {
-    "type": "string",
-    "description": "Spouse's place of birth."
-  },
-  "LUGAR_TRABAJO": {
-    "type": "string",
-    "description": "Applicant's place of work."
-  },
-  "LUGAR_TRABAJO_CONYUGE": {
-    "type": "string",
-    "description": "Spouse's place of work."
-  },
-  "MARCA_VEHICULO": {
-    "type": "integer",
-    "description": "Code representing the brand of the vehicle being acquired with the loan."
-  },
-  "MARCA_VEHICULO_PROPIO": {
-    "type": "string",
-    "description": "Brand of a vehicle already owned by the applicant."
-  },
-  "MESES": {
-    "type": "string",
-    "description": "Duration in months, likely for loan term or time in current residence/job."
-  },
-  "MODELO_VEHICULO": {
-    "type": "integer",
-    "description": "Code representing the model of the vehicle being acquired with the loan."
-  },
-  "MODELO_VEHICULO_PROPIO": {
-    "type": "string",
-    "description": "Model of a vehicle already owned by the applicant."
-  },
-  "MONTO_INICIAL": {
-    "type": "string",
-    "description": "Initial amount or down payment for the loan."
-  },
-  "MONTO_PRESTAMO": {
-    "type": "string",
-    "description": "Total loan amount."
-  },
-  "NACIONALIDAD": {
-    "type": "integer",
-    "description": "Code representing the applicant's nationality."
-  },
-  "NEGOCIO_PROPIO": {
-    "type": "string",
-    "description": "Indicates if the applicant has their own business, e.g., 'No'."
-  },
-  "NIVEL_EDUCATIVO": {
-    "type": "string",
-    "description": "Applicant's educational level."
-  },
-  "NIVEL_EDUCATIVO_CONYUGE": {
-    "type": "string",
-    "description": "Spouse's educational level."
-  },
-  "NOMBRE_BANCO1": {
-    "type": "string",
-    "description": "Full name of the first bank."
-  },
-  "NOMBRE_BANCO2": {
-    "type": "string",
-    "description": "Full name of the second bank."
-  },
-  "NOMBRE_BANCO3": {
-    "type": "string",
-    "description": "Full name of the third bank."
-  },
-  "NOMBRE_COMPLETO": {
-    "type": "string",
-    "description": "Applicant's full name."
-  },
-  "NOMBRE_DEL_CONYUGE": {
-    "type": "string",
-    "description": "Spouse's full name."
-  },
-  "NOMBRE_MADRE": {
-    "type": "string",
-    "description": "Mother's full name."
-  },
-  "NOMBRE_PADRE": {
-    "type": "string",
-    "description": "Father's full name."
-  },
-  "NOMBRE_PEP": {
-    "type": "string",
-    "description": "Name of the Politically Exposed Person (PEP)."
-  },
-  "NOMBRE_REFERENCIA_COMERCIAL_1": {
-    "type": "string",
-    "description": "Name of the first commercial reference."
-  },
-  "NOMBRE_REFERENCIA_COMERCIAL_2": {
-    "type": "string",
-    "description": "Name of the second commercial reference."
-  },
-  "NOMBRE_REFERENCIA_PERSONAL": {
-    "type": "string",
-    "description": "Name of a personal reference."
-  },
-  "NUMERO_CASA_APATAMENTO": {
-    "type": "string",
-    "description": "House or apartment number of the applicant's address."
-  },
-  "OCUPACION": {
-    "type": "integer",
-    "description": "Code representing the applicant's occupation."
-  },
-  "OCUPACION_CONYUGE": {
-    "type": "string",
-    "description": "Spouse's occupation."
-  },
-  "OTRA_CIUDADANIA_DOCUMENTO": {
-    "type": "string",
-    "description": "Document number for another citizenship."
-  },
-  "OTRA_CIUDADANIA_FECHA_EMISIÓN": {
-    "type": ["string", "null"],
-    "format": "date-time",
-    "description": "Issue date of the other citizenship document, or null if not applicable."
-  },
-  "OTRA_CIUDADANIA_FECHA_VENCIMIENTO": {
-    "type": ["string", "null"],
-    "format": "date-time",
-    "description": "Expiration date of the other citizenship document, or null if not applicable."
-  },
-  "OTRA_CIUDADANIA_STATUS": {
-    "type": "string",
-    "description": "Status of other citizenship."
-  },
-  "OTRA_CIUDADANIA_TIPO_DOCUMENTO": {
-    "type": "string",
-    "description": "Type of document for another citizenship."
-  },
-  "OTROS INGRESOS": {
-    "type": "string",
-    "description": "General field for other income."
-  },
-  "OTROS_INGRESOS": {
-    "type": ["string", "null"],
-    "description": "Other income sources, or null if not applicable."
-  },
-  "PAIS_DE_REESIDENCIA": {
-    "type": "integer",
-    "description": "Code representing the applicant's country of residence."
-  },
-  "PAIS_OTRA_CIUDADANIA": {
-    "type": "string",
-    "description": "Country of other citizenship."
-  },
-  "PAISBANCO1": {
-    "type": "string",
-    "description": "Country of the first bank."
-  },
-  "PAISBANCO2": {
-    "type": "string",
-    "description": "Country of the second bank."
-  },
-  "PAISBANCO3": {
-    "type": "string",
-    "description": "Country of the third bank."
-  },
-  "PARENTEZO_PEP": {
-    "type": "string",
-    "description": "Relationship to the Politically Exposed Person (PEP)."
-  },
-  "PASSAPORTE_CONYUGE": {
-    "type": "string",
-    "description": "Spouse's passport number."
-  },
-  "PEP_CARGO": {
-    "type": "string",
-    "description": "Position held by the Politically Exposed Person (PEP)."
-  },
-  "PRECIO_VEHICULO": {
-    "type": "string",
-    "description": "Price of the vehicle being acquired with the loan."
-  },
-  "PROVINCIA": {
-    "type": "integer",
-    "description": "Code representing the applicant's province."
-  },
-  "REF_POR_DEALER": {
-    "type": "string",
-    "description": "Indicates if the applicant was referred by a dealer, e.g., 'No'."
-  },
-  "REFENCIAS_BANCARIAS": {
-    "type": "string",
-    "description": "General field for bank references."
-  },
-  "REFERENCIA_FINANCIERA": {
-    "type": "string",
-    "description": "General field for financial references."
-  },
-  "RELACION_REFERENCIA": {
-    "type": "string",
-    "description": "Relationship to the personal reference."
-  },
-  "SECTOR": {
-    "type": "string",
-    "description": "Neighborhood or sector of the applicant's address."
-  },
-  "SELECCION_VEHICULO": {
-    "type": "string",
-    "description": "Indicates if a vehicle has been selected, e.g., 'Si'."
-  },
-  "SEXO": {
-    "type": "string",
-    "description": "Applicant's gender, e.g., 'M' (Male)."
-  },
-  "SEXO_CONYUGE": {
-    "type": "string",
-    "description": "Spouse's gender."
-  },
-  "TASA_INTERES": {
-    "type": "string",
-    "description": "Interest rate for the loan."
-  },
-  "TELEFONO_CASA": {
-    "type": "string",
-    "description": "Applicant's home phone number."
-  },
-  "TELEFONO_CELULAR": {
-    "type": "string",
-    "description": "Applicant's cell phone number."
-  },
-  "TELEFONO_CONYUGE": {
-    "type": "string",
-    "description": "Spouse's phone number."
-  },
-  "TELEFONO_MADRE": {
-    "type": "string",
-    "description": "Mother's phone number."
-  },
-  "TELEFONO_PADRE": {
-    "type": "string",
-    "description": "Father's phone number."
-  },
-  "TELEFONO_REFERENCIA_COMERCIAL_1": {
-    "type": "string",
-    "description": "Phone number of the first commercial reference."
-  },
-  "TELEFONO_REFERENCIA_COMERCIAL_2": {
-    "type": "string",
-    "description": "Phone number of the second commercial reference."
-  },
-  "TELEFONO_REFERENCIA_PERSONAL": {
-    "type": "string",
-    "description": "Phone number of a personal reference."
-  },
-  "TELEFONO_TRABAJO": {
-    "type": "string",
-    "description": "Applicant's work phone number."
-  },
-  "TIEMPO_LABORANDO": {
-    "type": "integer",
-    "description": "Time (likely in years or months) working at current job."
-  },
-  "TIEMPO_NEGOCIO_PROPIO": {
-    "type": "string",
-    "description": "Time (likely in years or months) operating own business."
-  },
-  "TIEMPO_VIVIENDA": {
-    "type": "string",
-    "description": "Time (likely in years or months) at current residence."
-  },
-  "TIENE_CONYUGE": {
-    "type": "string",
-    "description": "Indicates if the applicant has a spouse."
-  },
-  "TIENE_INMUEBLES": {
-    "type": "string",
-    "description": "Indicates if the applicant owns real estate."
-  },
-  "TIENE_INVERSIONES": {
-    "type": "string",
-    "description": "Indicates if the applicant has investments."
-  },
-  "TIENE_MOBILIARIO": {
-    "type": "string",
-    "description": "Indicates if the applicant owns furniture/fixtures."
-  },
-  "TIENE_OTROS_COMPROMISOS_PAGO": {
-    "type": "string",
-    "description": "Indicates if the applicant has other financial commitments/payments."
-  },
-  "TIENE_REFERECIA_COMERCIAL": {
-    "type": "string",
-    "description": "Indicates if the applicant has commercial references."
-  },
-  "TIENE_REFERENCIA_PERSONALES": {
-    "type": "string",
-    "description": "Indicates if the applicant has personal references."
-  },
-  "TIENE_VEHICULO": {
-    "type": "string",
-    "description": "Indicates if the applicant owns a vehicle."
-  },
-  "TIPO_CUENTA_BANCO1": {
-    "type": "string",
-    "description": "Type of account for the first bank."
-  },
-  "TIPO_CUENTA_BANCO2": {
-    "type": "string",
-    "description": "Type of account for the second bank."
-  },
-  "TIPO_CUENTA_BANCO3": {
-    "type": "string",
-    "description": "Type of account for the third bank."
-  },
-  "TIPO_EMPLEO": {
-    "type": "integer",
-    "description": "Code representing the type of employment."
-  },
-  "TIPO_PERSONA": {
-    "type": "string",
-    "description": "Type of person, e.g., 'PF' (Persona Física/Individual)."
-  },
-  "TIPO_VEHICULO_CAMIONETAS": {
-    "type": "string",
-    "description": "Indicates if the vehicle is a pickup truck."
-  },
-  "TIPO_VEHICULO_CARROS": {
-    "type": "string",
-    "description": "Indicates if the vehicle is a car."
-  },
-  "TIPO_VEHICULO_JEEPETAS": {
-    "type": "string",
-    "description": "Indicates if the vehicle is an SUV."
-  },
-  "TRABAJA_ACTUALMENTE": {
-    "type": "string",
-    "description": "Indicates if the applicant is currently working, e.g., 'No'."
-  },
-  "TRABAJA_CONYUGE": {
-    "type": "string",
-    "description": "Indicates if the spouse is currently working."
-  },
-  "VALOR_COBRAR": {
-    "type": ["string", "null"],
-    "description": "Value of accounts receivable, or null if not applicable."
-  },
-  "VALOR_INMUBLES": {
-    "type": ["string", "null"],
-    "description": "Value of real estate owned, or null if not applicable."
-  },
-  "VALOR_INVERSIONES": {
-    "type": ["string", "null"],
-    "description": "Value of investments, or null if not applicable."
-  },
-  "VALOR_MOBILIARIO": {
-    "type": ["string", "null"],
-    "description": "Value of furniture and fixtures, or null if not applicable."
-  },
-  "VALOR_OTROS_COMPROMISOS_DE_PAGO": {
-    "type": ["string", "null"],
-    "description": "Value of other financial commitments/payments, or null if not applicable."
-  },
-  "VALOR_VEHICULO_PROPIO": {
-    "type": ["string", "null"],
-    "description": "Value of a vehicle already owned by the applicant, or null if not applicable."
-  },
-  "VEHICULO_NUEVO_USADO": {
-    "type": "string",
-    "description": "Condition of the vehicle (new or used), e.g., 'Usado' (Used)."
-  },
-  "VENTAS_MENSUALES": {
-    "type": "string",
-    "description": "Monthly sales, likely for self-employed individuals."
-  }
-}
-'''
+# Deployment settings (rendering resolution, in-flight page window, ...)
+settings = load_settings()
+
+
+@st.cache_resource
+def get_ocr_rate_limiter():
+    # One limiter per process so every session shares the same OCR request budget
+    return TokenBucket(settings.ocr_rate_limit, settings.ocr_burst)
+
+
+@st.cache_resource
+def get_ocr_concurrency():
+    # Budget of in-flight OCR requests per API key, shared by every file and session using that key;
+    # AIMD shrinks it when the API throttles that key
+    return pipeline.KeyedConcurrency(settings)
+
+
+@st.cache_resource
+def get_ocr_cache():
+    # Persistent, content-addressed OCR cache shared by every session
+    return pipeline.open_ocr_cache(settings)
+
+
+@st.cache_resource
+def get_classification_cache():
+    # Persistent classification cache shared by every session
+    return pipeline.open_classification_cache(settings)
+
+
+@st.cache_resource
+def get_job_manager():
+    # Background OCR workers shared by every session, deduplicated by document hash
+    return jobs.JobManager(settings.job_workers, settings.job_retention_minutes * 60)
+
+
+@st.cache_resource
+def get_memory_budget():
+    # Global cap on resident OCR text across sessions; also sweeps spill files left by a previous process
+    removed = sweep_spill_dirs(settings.spill_dir, settings.spill_ttl_hours * 3600)
+    if removed:
+        logging.info("Removed %d stale session spill directories", removed)
+    return MemoryBudget(settings.memory_budget_mb * 1024 * 1024)
+
+
+@st.cache_resource
+def get_client_registry():
+    # Long-lived API clients shared by every session, looked up by a keyed hash of the API key
+    return ClientRegistry(settings)
+
+
+def get_classifier():
+    # Classification requests reuse the pooled OpenAI client of their key, leased per request
+    return get_client_registry().with_client(classification.classify_with_o1_model, "openai")
+
+
+def ocr_job(pdf_bytes, name, mistral_api_key, page_index):
+    """Build the background job function that OCRs one PDF.
+
+    Runs on a worker thread, so it reports progress through the job rather than
+    Streamlit elements.
+    """
+    def run(job):
+        def on_start(page_count):
+            job.total = page_count
+
+        def on_page(page_number, text):
+            job.completed += 1
+            job.partial[page_number] = text
+
+        # The lease keeps idle eviction from closing the client while the job runs
+        with get_client_registry().lease("mistral", mistral_api_key) as client:
+            result = pipeline.ocr_pdf(
+                pdf_bytes,
+                name,
+                client,
+                settings,
+                rate_limiter=get_ocr_rate_limiter(),
+                cache=get_ocr_cache(),
+                on_start=on_start,
+                on_page=on_page,
+                concurrency=get_ocr_concurrency().get(mistral_api_key),
+                page_index=page_index,
+            )
+        pipeline.export_metrics(settings)
+        return result
+
+    return run
+
 
 # Title and Description
 st.title("📄 PDF Page OCR Processor")
@@ -614,6 +130,7 @@ else:
     if st.button("Change API Keys"):
         del st.session_state.mistral_api_key
         del st.session_state.openai_api_key
+        st.session_state.pop("live_classifier", None)
         st.rerun()
 
     # --- PDF Upload Section ---
@@ -622,105 +139,171 @@ else:
     if uploaded_files:
         st.success(f"Uploaded {len(uploaded_files)} PDFs. Processing each file...")
         
-        # Initialize session state for storing OCR data
-        if 'pdf_ocr_data' not in st.session_state:
-            st.session_state.pdf_ocr_data = {}
-        
-        # Initialize combined OCR text
-        if 'combined_ocr_text' not in st.session_state:
-            st.session_state.combined_ocr_text = ""
+        # Initialize the per-file page store; the combined text is built from it on demand and
+        # documents beyond the memory caps are spilled to a per-session directory
+        if 'page_store' not in st.session_state:
+            st.session_state.page_store = PageStore(
+                max_bytes=settings.session_memory_mb * 1024 * 1024,
+                spill_dir=os.path.join(settings.spill_dir, uuid.uuid4().hex),
+                budget=get_memory_budget(),
+            )
+        page_store = st.session_state.page_store
+
+        # Pixel digests of this session's pages, so repeated pages across files are OCR'd once
+        if 'page_index' not in st.session_state:
+            st.session_state.page_index = PageHashIndex(settings.page_dedupe, settings.page_index_max_entries)
+        page_index = st.session_state.page_index
         
         # Progress tracking
         processed_files = 0
+        upload_order = []
         
-        # Process each file
+        # Key OCR data by content, model and render settings rather than by file name
+        packet = []
         for uploaded_file in uploaded_files:
+            pdf_bytes = uploaded_file.getvalue()
+            packet.append((uploaded_file, pdf_bytes, pipeline.document_key(pdf_bytes, settings)))
+
+        # Incremental mode classifies pages as they arrive instead of after the last file
+        live = None
+        if settings.classify_mode == "incremental":
+            packet_keys = frozenset(doc_key for _, _, doc_key in packet)
+            if st.session_state.get("live_packet") != packet_keys and "live_classifier" in st.session_state:
+                # Files were added or removed: start over, so removed files leave no values behind and
+                # added ones are not ignored by a classifier that already finished or stopped early
+                st.session_state.live_classifier.finish()
+                del st.session_state.live_classifier
+            if 'live_classifier' not in st.session_state:
+                st.session_state.live_classifier = pipeline.incremental_classifier(
+                    st.session_state.openai_api_key, settings,
+                    classifier=get_classifier(), cache=get_classification_cache(),
+                )
+                st.session_state.live_docs = set()
+                st.session_state.live_packet = packet_keys
+            live = st.session_state.live_classifier
+
+        # Queue every file at once, smallest first, so the files run concurrently and small ones finish early;
+        # identical documents from other tabs reuse the same job
+        job_manager = get_job_manager()
+        for uploaded_file, pdf_bytes, doc_key in sorted(packet, key=lambda item: len(item[1])):
+            if doc_key not in page_store and job_manager.get(doc_key) is None:
+                job_manager.submit(
+                    doc_key,
+                    uploaded_file.name,
+                    ocr_job(pdf_bytes, uploaded_file.name, st.session_state.mistral_api_key, page_index),
+                    priority=len(pdf_bytes),
+                )
+
+        # Show each file in upload order as its results arrive
+        jobs_pending = False
+        for uploaded_file, pdf_bytes, doc_key in packet:
             st.markdown(f"### 📁 File: {uploaded_file.name}")
-            
-            # Check if we have OCR data for this file
-            file_data = st.session_state.pdf_ocr_data.get(uploaded_file.name, {})
+            upload_order.append(doc_key)
             
             try:
                 # Only process if we haven't already stored OCR data
-                if 'full_ocr_text' not in file_data:
-                    # Convert PDF to list of PIL images
-                    with st.spinner(f"Converting {uploaded_file.name} to images..."):
-                        pdf_bytes = uploaded_file.getvalue()
-                        pages = convert_from_bytes(pdf_bytes, dpi=200)  # Higher DPI for better OCR quality
-
-                    # Retrieve API keys
-                    mistral_api_key = st.session_state.mistral_api_key
-                    mistral_client = Mistral(api_key=mistral_api_key)
+                if doc_key not in page_store:
+                    job = job_manager.get(doc_key)
+                    if job is None:
+                        job = job_manager.submit(
+                            doc_key,
+                            uploaded_file.name,
+                            ocr_job(pdf_bytes, uploaded_file.name, st.session_state.mistral_api_key, page_index),
+                            priority=len(pdf_bytes),
+                        )
 
-                    st.success(f"Found {len(pages)} pages in {uploaded_file.name}. Starting OCR...")
+                    if job.active:
+                        jobs_pending = True
+                        if live is not None:
+                            for page_number, text in list(job.partial.items()):
+                                live.add_page(uploaded_file.name, page_number, text, source_key=doc_key)
+                        if job.total:
+                            st.progress(job.progress, text=f"Processing {job.completed}/{job.total} pages...")
+                        else:
+                            ahead = job_manager.queue_position(doc_key)
+                            st.info(f"Queued {uploaded_file.name} for OCR" + (f" ({ahead} files ahead)..." if ahead else "..."))
+                        st.markdown("---")
+                        continue
 
-                    full_ocr_text = ""
-                    
-                    # Process each page
-                    for i, page_image in enumerate(pages):
-                        with st.spinner(f"Processing Page {i+1}/{len(pages)}..."):
-                            # Save image to temporary file
-                            with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as tmpfile:
-                                page_image.save(tmpfile.name, format="JPEG")
-                                tmpfile_path = tmpfile.name
-
-                            # Encode image to base64
-                            with open(tmpfile_path, "rb") as image_file:
-                                base64_image = base64.b64encode(image_file.read()).decode("utf-8")
-
-                            # Clean up temp file
-                            os.unlink(tmpfile_path)
-
-                            # Prepare image URL with base64 data
-                            image_data_url = f"data:image/jpeg;base64,{base64_image}"
-
-                            # Send request to Mistral OCR
-                            ocr_response = mistral_client.ocr.process(
-                                model="mistral-ocr-latest",
-                                document={
-                                    "type": "image_url",
-                                    "image_url": image_data_url
-                                }
+                    if job.status == jobs.FAILED:
+                        # Failed jobs are replaced on resubmission
+                        if st.button("Retry", key=f"retry_job_{doc_key}"):
+                            job_manager.submit(
+                                doc_key,
+                                uploaded_file.name,
+                                ocr_job(pdf_bytes, uploaded_file.name, st.session_state.mistral_api_key, page_index),
+                                priority=len(pdf_bytes),
                             )
+                            st.rerun()
+                        raise job.error
 
-                            # Extract text from response
-                            ocr_text = ""
-                            try:
-                                # Get pages from response
-                                pages_list = getattr(ocr_response, "pages", [])
-                                
-                                # Extract markdown from each page
-                                page_texts = []
-                                for page in pages_list:
-                                    if hasattr(page, "markdown"):
-                                        page_texts.append(page.markdown)
-                                
-                                ocr_text = "\n\n---\n\n".join(page_texts)  # Combine pages with separators
-                            except Exception as e:
-                                ocr_text = f"Error extracting text: {str(e)}"
-                            
-                            # Add page text to full document text
-                            full_ocr_text += f"\n\n--- PAGE {i+1} ---\n\n{ocr_text}"
-                    
-                    # Store OCR data in session state
-                    file_data['full_ocr_text'] = full_ocr_text
-                    st.session_state.pdf_ocr_data[uploaded_file.name] = file_data
-                    
-                    # Add to combined OCR text
-                    st.session_state.combined_ocr_text += f"\n\n=== FILE: {uploaded_file.name} ===\n\n{full_ocr_text}"
+                    result = job.result
+                    if result.from_cache:
+                        st.info(f"OCR text for {uploaded_file.name} loaded from cache")
+                    else:
+                        st.success(
+                            f"OCR completed for {uploaded_file.name}! "
+                            f"{result.text_layer_pages} pages from the text layer, {result.native_pages} via native PDF OCR, "
+                            f"{result.image_pages} as images ({result.upload_bytes / 1024:.0f} KB, "
+                            f"{result.upload_bytes / max(1, result.image_pages) / 1024:.0f} KB/page) "
+                            f"in {result.ocr_requests} OCR requests."
+                        )
+                        if len(settings.dpi_ladder()) > 1:
+                            st.caption("Pages per resolution: " + ", ".join(
+                                f"{dpi} dpi: {count}" for dpi, count in result.dpi_distribution.items()
+                            ))
+                        if result.calls_saved:
+                            st.info(
+                                f"Saved {result.calls_saved} OCR calls: {result.blank_pages} blank pages skipped, "
+                                f"{result.duplicate_pages} duplicate pages reused."
+                            )
+                            st.caption("Skipped pages: " + ", ".join(
+                                f"{page_number} ({reason})" for page_number, reason in result.skipped_pages.items()
+                            ))
+                        with st.expander(f"Timing breakdown for {uploaded_file.name}"):
+                            st.table([
+                                {"stage": stage, "seconds": seconds}
+                                for stage, seconds in result.timings.items()
+                            ])
+                            if result.stage_stats:
+                                st.table(result.stage_stats)
                     
-                    st.success(f"OCR completed for {uploaded_file.name}!")
-                    processed_files += 1
+                    if result.failed_pages:
+                        # Keep partial results out of the session so a retry only redoes the failed pages
+                        st.warning(
+                            f"OCR failed for pages {', '.join(map(str, result.failed_pages))} of {uploaded_file.name} "
+                            "after several retries. The other pages are saved."
+                        )
+                        if st.button("Retry failed pages", key=f"retry_{doc_key}"):
+                            job_manager.submit(
+                                doc_key,
+                                uploaded_file.name,
+                                ocr_job(pdf_bytes, uploaded_file.name, st.session_state.mistral_api_key, page_index),
+                                force=True,
+                                priority=len(pdf_bytes),
+                            )
+                            st.rerun()
+                    else:
+                        # Store the page records in the session's page store
+                        page_store.add(doc_key, uploaded_file.name, result.pages)
+                        processed_files += 1
                 else:
                     st.info("OCR text already available for this file")
                     processed_files += 1
+
+                if live is not None and doc_key in page_store and doc_key not in st.session_state.live_docs:
+                    for page in page_store.get(doc_key).pages:
+                        if page.source != "error":
+                            live.add_page(uploaded_file.name, page.page_number, page.text, source_key=doc_key)
+                    st.session_state.live_docs.add(doc_key)
                 
                 # Show OCR results for this file
-                with st.expander(f"View OCR Text for {uploaded_file.name}"):
-                    st.text_area("", 
-                                 value=st.session_state.pdf_ocr_data[uploaded_file.name]['full_ocr_text'], 
-                                 height=300,
-                                 key=f"ocr_{uploaded_file.name}")
+                if doc_key in page_store:
+                    with st.expander(f"View OCR Text for {uploaded_file.name}"):
+                        st.text_area("", 
+                                     value=page_store.get(doc_key).text(), 
+                                     height=300,
+                                     key=f"ocr_{doc_key}")
                 
                 st.markdown("---")
 
@@ -732,33 +315,130 @@ else:
                 elif "invalid api" in error_msg or "unauthorized" in error_msg:
                     st.error("Authentication failed: Invalid or missing API key.")
                 elif "timeout" in error_msg:
-                    st.error("Request timed out. Please try again later.")
+                    st.error("Request timed out repeatedly. Pages already processed are cached; please try again later.")
                 else:
                     st.error(f"Unexpected error processing {uploaded_file.name}: {e}")
         
+        live_pending = False
+        if live is not None:
+            if processed_files == len(uploaded_files):
+                live.finish()
+            required = settings.required_fields()
+            missing = live.missing_required()
+            st.markdown("## ⚡ Live Classification")
+            st.caption(
+                f"{live.pages_classified}/{live.pages_received} pages classified in {live.requests} requests, "
+                f"{len(required) - len(missing)}/{len(required)} required fields found"
+            )
+            if live.error is not None:
+                st.error(f"Classification failed: {live.error}")
+            elif live.complete:
+                st.success("All required fields found; remaining pages were not sent for classification.")
+            elif missing:
+                st.caption(f"Still looking for: {', '.join(missing)}")
+            live_result = live.snapshot()
+            st.json(live_result)
+            if live.done and live_result:
+                st.download_button(
+                    label="Download JSON",
+                    data=json.dumps(live_result, indent=2, ensure_ascii=False),
+                    file_name="classification_result.json",
+                    mime="application/json"
+                )
+            live_pending = live.busy
+
+        if jobs_pending or live_pending:
+            # Poll running jobs without blocking the script; reruns only redraw progress
+            time.sleep(settings.job_poll_seconds)
+            st.rerun()
+
+        # Drop pages (and their dedupe entries) of files that were removed from the uploader
+        page_store.retain(upload_order)
+        page_index.retain(upload_order)
+
+        # OCR cache statistics
+        ocr_cache = get_ocr_cache()
+        if ocr_cache is not None:
+            cache_stats = ocr_cache.stats
+            logging.info("OCR cache stats: %s", cache_stats.as_dict())
+            with st.sidebar:
+                st.markdown("### 🗄️ OCR Cache")
+                st.metric("Hits", cache_stats.hits)
+                st.metric("Misses", cache_stats.misses)
+                st.metric("Upload saved", f"{cache_stats.bytes_saved / 1024 / 1024:.1f} MB")
+                st.caption(f"{cache_stats.entries} entries, {cache_stats.size_bytes / 1024 / 1024:.1f} MB on disk")
+
+        store_stats = page_store.stats()
+        with st.sidebar:
+            st.markdown("### 🧠 Session Storage")
+            st.caption(
+                f"{store_stats['resident']} files in memory ({store_stats['resident_bytes'] / 1024 / 1024:.1f} MB), "
+                f"{store_stats['spilled']} spilled to disk ({store_stats['spilled_bytes'] / 1024 / 1024:.1f} MB compressed)"
+            )
+            session_keys = [st.session_state.mistral_api_key, st.session_state.openai_api_key]
+            for client_stats in get_client_registry().stats(api_keys=session_keys):
+                st.caption(
+                    f"{client_stats['service'].title()} client: {client_stats['requests']} requests over "
+                    f"{client_stats['connections']} connections ({client_stats['reuse_ratio']:.0%} reused)"
+                )
+
+        classification_cache = get_classification_cache()
+        if classification_cache is not None:
+            classification_stats = classification_cache.stats
+            with st.sidebar:
+                st.markdown("### 🗄️ Classification Cache")
+                st.caption(
+                    f"{classification_stats.hits} hits, {classification_stats.misses} misses, "
+                    f"{classification_stats.entries} entries"
+                )
+
         # Show combined OCR text and classification option
-        if st.session_state.combined_ocr_text and processed_files == len(uploaded_files):
+        if len(page_store) and processed_files == len(uploaded_files):
             st.markdown("## 🔗 Combined OCR Text")
             with st.expander("View Combined OCR Text"):
                 st.text_area("", 
-                             value=st.session_state.combined_ocr_text, 
+                             value=page_store.combined_text(upload_order), 
                              height=400,
                              key="combined_ocr")
+            if settings.classify_compact or settings.classify_max_tokens > 0:
+                compacted = pipeline.compact_for_classification(page_store.combined_text(upload_order), settings)
+                st.caption(
+                    f"Classification input: {compacted.tokens_before:,} → {compacted.tokens_after:,} tokens "
+                    f"({compacted.saved_ratio:.0%} saved, {compacted.boilerplate_removed} boilerplate lines removed"
+                    + (f", {len(compacted.dropped_pages)} low-value pages dropped" if compacted.dropped_pages else "")
+                    + ")"
+                )
             
-            # New classification button for O1 model
-            st.markdown("## 🚀 Combined Classification")
-            if st.button("Classify All with O1 Model"):
+            # New classification button for O1 model (incremental mode classifies live above)
+            if live is None:
+                st.markdown("## 🚀 Combined Classification")
+            if live is None and st.button("Classify All with O1 Model"):
                 with st.spinner("Classifying combined text with O1 model..."):
                     try:
-                        classification_result = classification.classify_with_o1_model(
-                            st.session_state.combined_ocr_text,
+                        classification_result = pipeline.classify_text(
+                            page_store.combined_text(upload_order),
                             st.session_state.openai_api_key,
-                            CLASSIFICATION_JSON_STRUCTURE
+                            classifier=get_classifier(),
+                            settings=settings,
+                            cache=get_classification_cache(),
                         )
+                        pipeline.export_metrics(settings)
                         
                         if classification_result:
                             st.markdown("### ✅ Classification Result")
                             st.json(classification_result)
+
+                            if settings.classify_fast_path:
+                                # Where each locally extracted value was found, offsets relative to the file's text
+                                found = fast_path.extract_from_store(page_store, upload_order)
+                                if found:
+                                    with st.expander(f"Fields found by pattern rules ({len(found)})"):
+                                        st.table([
+                                            {"Field": e.field, "Value": e.value, "File": e.file_name,
+                                             "Page": e.page_number, "Offset": e.offset,
+                                             "Used as": "hint" if e.hint else "value"}
+                                            for e in found.values()
+                                        ])
                             
                             # Add download button for JSON
                             json_str = json.dumps(classification_result, indent=2, ensure_ascii=False)
@@ -0,0 +1,161 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Bucket upper bounds for latency histograms, in seconds
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Bucket upper bounds for payload size histograms, in bytes
+SIZE_BUCKETS = (16_384, 65_536, 131_072, 262_144, 524_288, 1_048_576, 2_097_152, 4_194_304, 8_388_608)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class _Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+class Metrics:
+    """Thread-safe registry of counters and histograms with Prometheus text export.
+
+    Metric names follow Prometheus conventions (``_total`` for counters,
+    ``_seconds`` / ``_bytes`` for histograms). Labels are passed as keyword
+    arguments.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, _Histogram]] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str) -> None:
+        """Attach a ``# HELP`` line to ``name`` in the export."""
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        """Increase counter ``name`` by ``value``."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = TIME_BUCKETS, **labels: Any) -> None:
+        """Record ``value`` in histogram ``name``."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = _Histogram(buckets)
+            series[key].observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels: Any) -> Iterator[None]:
+        """Time the enclosed block into histogram ``name``."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def counter_value(self, name: str, **labels: Any) -> float:
+        """Current value of a counter, ``0`` if it was never incremented."""
+        with self._lock:
+            return self._counters.get(name, {}).get(_label_key(labels), 0.0)
+
+    def to_prometheus(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            for name in sorted(self._counters):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(self._counters[name].items()):
+                    lines.append(f"{name}{_format_labels(key)} {_format_number(value)}")
+            for name in sorted(self._histograms):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in sorted(self._histograms[name].items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(key, ('le', _format_number(bound)))} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {_format_number(histogram.sum)}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        """Atomically write :meth:`to_prometheus` to ``path`` for a textfile collector."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+def log_event(event: str, **fields: Any) -> None:
+    """Emit one structured (JSON) log line."""
+    logging.info(json.dumps({"event": event, **fields}, ensure_ascii=False, default=str))
+
+
+# Process-wide registry used by the pipeline
+METRICS = Metrics()
+METRICS.describe("ocr_stage_seconds", "Per-page time spent in each pipeline stage.")
+METRICS.describe("ocr_document_seconds", "Wall time to OCR one document.")
+METRICS.describe("ocr_page_payload_bytes", "Encoded size of page images sent to the OCR API.")
+METRICS.describe("ocr_pages_total", "Pages processed, by source.")
+METRICS.describe("ocr_cache_hits_total", "OCR cache hits, by level.")
+METRICS.describe("ocr_cache_misses_total", "OCR cache misses, by level.")
+METRICS.describe("ocr_retries_total", "OCR requests retried after a transient failure.")
+METRICS.describe("ocr_pages_skipped_total", "Pages that needed no OCR call, by reason (blank, duplicate).")
+METRICS.describe("ocr_dpi_escalations_total", "Pages re-rendered at a higher resolution, by target dpi and reason.")
+METRICS.describe("ocr_dpi_escalation_failures_total", "Pages whose re-render at a higher resolution failed, by target dpi.")
+METRICS.describe("ocr_page_dpi_total", "Pages by final rendering resolution.")
+METRICS.describe("ocr_requests_total", "OCR requests sent by the image pipeline, single page or batch.")
+METRICS.describe("ocr_failed_pages_total", "Pages whose OCR retries were exhausted.")
+METRICS.describe("classification_seconds", "Time spent in classification calls.")
+METRICS.describe("classification_cache_hits_total", "Classification requests served from the cache.")
+METRICS.describe("classification_cache_misses_total", "Classification requests not found in the cache.")
+METRICS.describe("classification_fast_path_fields_total", "Fields filled by local pattern rules instead of the model.")
+METRICS.describe("classification_tokens_total", "Classification input tokens, before and after compaction.")
+METRICS.describe("classification_pages_dropped_total", "Pages left out of classification to fit the token budget.")
+METRICS.describe("classification_validation_errors_total", "Classification values that could not be coerced to the schema.")
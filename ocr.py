@@ -0,0 +1,305 @@
+import base64
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from cache import content_key
+from resilience import AdaptiveConcurrency, RetryPolicy, call_with_retries
+
+OCR_MODEL = "mistral-ocr-latest"
+
+
+class TokenBucket:
+    """Thread-safe token bucket used to cap the OCR request rate.
+
+    Parameters
+    ----------
+    rate : float
+        Tokens added per second. A rate of ``0`` or less disables limiting.
+    capacity : float, optional
+        Maximum burst size. Defaults to ``max(1, rate)``.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Block until ``tokens`` are available and return the time spent waiting."""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+def extract_page_text(ocr_response: Any) -> str:
+    """Join the markdown of every page in an OCR response."""
+    try:
+        # Get pages from response
+        pages_list = getattr(ocr_response, "pages", [])
+
+        # Extract markdown from each page
+        page_texts = []
+        for page in pages_list:
+            if hasattr(page, "markdown"):
+                page_texts.append(page.markdown)
+
+        return "\n\n---\n\n".join(page_texts)  # Combine pages with separators
+    except Exception as e:
+        return f"Error extracting text: {str(e)}"
+
+
+def response_page_texts(ocr_response: Any, requested: Optional[List[int]] = None) -> Dict[int, str]:
+    """Markdown of each page in an OCR response, keyed by zero-based page index.
+
+    Pages carry their index in the document. A page without one is mapped
+    by its position: to ``requested[position]`` when the request named its
+    pages, else to the position itself.
+
+    Raises
+    ------
+    ValueError
+        If a page has no index and the response does not have exactly one
+        page per ``requested`` entry, so positions cannot be trusted.
+    """
+    pages = list(getattr(ocr_response, "pages", []))
+    if requested is not None and len(pages) != len(requested) and any(
+        getattr(page, "index", None) is None for page in pages
+    ):
+        raise ValueError(f"OCR response has {len(pages)} unindexed pages for {len(requested)} requested")
+    texts = {}
+    for position, page in enumerate(pages):
+        if hasattr(page, "markdown"):
+            index = getattr(page, "index", None)
+            if index is None:
+                index = requested[position] if requested is not None else position
+            texts[index] = page.markdown
+    return texts
+
+
+def plan_batches(sizes: List[int], max_pages: int, max_bytes: int) -> List[List[int]]:
+    """Split items into consecutive batches of at most ``max_pages`` items and ``max_bytes`` in total.
+
+    An item larger than ``max_bytes`` gets a batch of its own.
+
+    Returns
+    -------
+    list of list of int
+        Indices into ``sizes``, in order.
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_bytes = 0
+    for index, size in enumerate(sizes):
+        if current and (len(current) >= max_pages or (max_bytes > 0 and current_bytes + size > max_bytes)):
+            batches.append(current)
+            current, current_bytes = [], 0
+        current.append(index)
+        current_bytes += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+def format_page_block(page_number: int, text: str) -> str:
+    """Render one page in the ``--- PAGE n ---`` layout used for the full OCR text."""
+    return f"\n\n--- PAGE {page_number} ---\n\n{text}"
+
+
+def page_cache_key(document: Dict[str, Any], model: str = OCR_MODEL) -> str:
+    """Cache key for one OCR request: the encoded page content plus the model."""
+    return content_key("page", model, json.dumps(document, sort_keys=True))
+
+
+def request_ocr(
+    client: Any,
+    document: Dict[str, Any],
+    model: str = OCR_MODEL,
+    rate_limiter: Optional[TokenBucket] = None,
+) -> Any:
+    """Send a single document to the OCR endpoint and return the raw response."""
+    if rate_limiter is not None:
+        rate_limiter.acquire()
+    return client.ocr.process(model=model, document=document)
+
+
+def pdf_document(pdf_bytes: bytes) -> Dict[str, Any]:
+    """Build a ``document_url`` payload carrying the whole PDF inline."""
+    base64_pdf = base64.b64encode(pdf_bytes).decode("ascii")
+    return {"type": "document_url", "document_url": f"data:application/pdf;base64,{base64_pdf}"}
+
+
+def upload_pdf(client: Any, pdf_bytes: bytes, file_name: str = "document.pdf") -> Tuple[str, Dict[str, Any]]:
+    """Upload a PDF once through the files API.
+
+    Returns the file ID and a ``document_url`` payload pointing at a signed
+    URL of the upload, which any number of requests can reference without
+    sending the PDF again. Delete the file with :func:`delete_upload`.
+    """
+    uploaded = client.files.upload(file={"file_name": file_name, "content": pdf_bytes}, purpose="ocr")
+    signed = client.files.get_signed_url(file_id=uploaded.id)
+    return uploaded.id, {"type": "document_url", "document_url": signed.url}
+
+
+def delete_upload(client: Any, file_id: str) -> None:
+    """Delete a file uploaded by :func:`upload_pdf`; failures are only logged."""
+    try:
+        client.files.delete(file_id=file_id)
+    except Exception:
+        logging.warning("Failed to delete uploaded PDF %s", file_id, exc_info=True)
+
+
+def _ocr_pdf_slice(
+    client: Any,
+    document: Dict[str, Any],
+    page_numbers: List[int],
+    model: str,
+    rate_limiter: Optional[TokenBucket],
+    retry_policy: RetryPolicy,
+    concurrency: Optional[AdaptiveConcurrency],
+    on_retry: Optional[Callable[[int, BaseException, float], None]],
+) -> Dict[int, str]:
+    # The endpoint numbers pages from 0
+    requested = [page_number - 1 for page_number in page_numbers]
+
+    def attempt() -> Any:
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        return client.ocr.process(model=model, document=document, pages=requested)
+
+    ocr_response = call_with_retries(attempt, retry_policy, concurrency, on_retry)
+    # A response that cannot be mapped to the requested pages raises, failing the slice
+    return {index + 1: text for index, text in response_page_texts(ocr_response, requested).items()}
+
+
+def ocr_pdf_native(
+    client: Any,
+    pdf_bytes: bytes,
+    page_numbers: List[int],
+    pages_per_request: int = 0,
+    max_in_flight: int = 4,
+    rate_limiter: Optional[TokenBucket] = None,
+    model: str = OCR_MODEL,
+    on_page: Optional[Callable[[int, str], None]] = None,
+    retry_policy: RetryPolicy = RetryPolicy(max_attempts=1),
+    concurrency: Optional[AdaptiveConcurrency] = None,
+    on_retry: Optional[Callable[[int, BaseException, float], None]] = None,
+) -> Tuple[Dict[int, str], List[int]]:
+    """OCR a PDF by submitting it as a document instead of page images.
+
+    Parameters
+    ----------
+    client : Mistral
+        OCR client exposing ``client.ocr.process``.
+    pdf_bytes : bytes
+        Raw PDF content.
+    page_numbers : list of int
+        One-based pages to OCR.
+    pages_per_request : int
+        Pages per request. ``0`` sends every page in a single request;
+        smaller slices run in parallel. With several slices the PDF is
+        uploaded once through the files API and every slice references the
+        upload, so upload cost does not grow with the number of slices.
+        If the upload fails, each slice carries the PDF inline.
+    max_in_flight : int
+        Maximum number of concurrent slice requests.
+    rate_limiter : TokenBucket, optional
+        Limiter shared by every caller hitting the same API.
+    model : str
+        OCR model name.
+    on_page : callable, optional
+        Called as ``on_page(page_number, text)`` from the calling thread.
+    retry_policy : RetryPolicy
+        Retries for transient failures of each slice. No retries by default.
+    concurrency : AdaptiveConcurrency, optional
+        Shared AIMD limit on concurrent OCR requests.
+    on_retry : callable, optional
+        Called as ``on_retry(attempt, error, delay)`` before each retry.
+
+    Returns
+    -------
+    tuple of (dict, list)
+        Page number to OCR text, and the pages that failed or were missing
+        from the response. Callers should OCR the latter as images.
+    """
+    page_numbers = sorted(page_numbers)
+    if not page_numbers:
+        return {}, []
+    size = pages_per_request if pages_per_request > 0 else len(page_numbers)
+    slices = [page_numbers[i:i + size] for i in range(0, len(page_numbers), size)]
+    def upload() -> Tuple[str, Dict[str, Any]]:
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        return upload_pdf(client, pdf_bytes)
+
+    file_id = None
+    if len(slices) > 1:
+        try:
+            file_id, document = call_with_retries(upload, retry_policy, None, on_retry)
+        except Exception as e:
+            logging.warning("PDF upload failed, sending it inline with each of %d slices: %s", len(slices), e)
+    if file_id is None:
+        document = pdf_document(pdf_bytes)
+
+    try:
+        return _ocr_pdf_slices(
+            client, document, slices, max_in_flight, rate_limiter, model, on_page, retry_policy, concurrency, on_retry,
+        )
+    finally:
+        if file_id is not None:
+            delete_upload(client, file_id)
+
+
+def _ocr_pdf_slices(
+    client: Any,
+    document: Dict[str, Any],
+    slices: List[List[int]],
+    max_in_flight: int,
+    rate_limiter: Optional[TokenBucket],
+    model: str,
+    on_page: Optional[Callable[[int, str], None]],
+    retry_policy: RetryPolicy,
+    concurrency: Optional[AdaptiveConcurrency],
+    on_retry: Optional[Callable[[int, BaseException, float], None]],
+) -> Tuple[Dict[int, str], List[int]]:
+    results: Dict[int, str] = {}
+    failed: List[int] = []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_in_flight, len(slices))), thread_name_prefix="ocr-pdf") as pool:
+        futures = {
+            pool.submit(
+                _ocr_pdf_slice, client, document, page_slice, model, rate_limiter, retry_policy, concurrency, on_retry,
+            ): page_slice
+            for page_slice in slices
+        }
+        for future in as_completed(futures):
+            page_slice = futures[future]
+            try:
+                texts = future.result()
+            except Exception as e:
+                logging.warning("Native PDF OCR failed for pages %s-%s: %s", page_slice[0], page_slice[-1], e)
+                failed.extend(page_slice)
+                continue
+            for page_number in page_slice:
+                if page_number in texts:
+                    results[page_number] = texts[page_number]
+                    if on_page is not None:
+                        on_page(page_number, texts[page_number])
+                else:
+                    failed.append(page_number)
+    return results, sorted(failed)
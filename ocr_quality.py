@@ -0,0 +1,49 @@
+import re
+from typing import Optional, Pattern
+
+# Punctuation and markdown that OCR output legitimately contains
+_EXPECTED_SYMBOLS = set(".,;:!?¿¡'\"()[]{}<>/\\-_+=*#%&@$|~^°ºª€·…–—“”‘’")
+
+
+def garbage_ratio(text: str) -> float:
+    """Fraction of non-whitespace characters that are neither alphanumeric nor expected punctuation."""
+    characters = [c for c in text if not c.isspace()]
+    if not characters:
+        return 0.0
+    garbage = sum(1 for c in characters if not c.isalnum() and c not in _EXPECTED_SYMBOLS)
+    return garbage / len(characters)
+
+
+def assess_text(
+    text: str,
+    min_chars: int = 30,
+    max_garbage_ratio: float = 0.3,
+    markers: Optional[Pattern[str]] = None,
+) -> Optional[str]:
+    """Judge whether a page's OCR text is good enough to keep.
+
+    Parameters
+    ----------
+    text : str
+        OCR output of one page.
+    min_chars : int
+        Fewer non-whitespace characters than this count as a failed read.
+    max_garbage_ratio : float
+        Largest tolerated :func:`garbage_ratio`.
+    markers : re.Pattern, optional
+        Pattern a usable page is expected to match (e.g. field labels of the
+        deployment's forms).
+
+    Returns
+    -------
+    str or None
+        Why the text looks unreliable (``short``, ``garbage`` or
+        ``markers``), ``None`` if it passes.
+    """
+    if len(re.sub(r"\s+", "", text)) < min_chars:
+        return "short"
+    if garbage_ratio(text) > max_garbage_ratio:
+        return "garbage"
+    if markers is not None and not markers.search(text):
+        return "markers"
+    return None
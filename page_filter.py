@@ -0,0 +1,168 @@
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Iterable, Optional, Tuple
+
+from PIL import Image
+
+# Longest side of the greyscale copy the statistics are computed on. Large
+# enough that a line of body text still reads as dark strokes, not grey haze
+THUMBNAIL_SIZE = 1024
+# How much darker than the page background a pixel must be to count as ink
+INK_CONTRAST = 48
+
+
+def open_thumbnail(data: bytes) -> Image.Image:
+    """Decode encoded page bytes straight to a :func:`grayscale` copy.
+
+    JPEG is decoded directly at a fraction of its resolution, which is far
+    cheaper than a full decode.
+    """
+    image = Image.open(io.BytesIO(data))
+    image.draft("L", (THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+    return grayscale(image)
+
+
+def grayscale(image: Image.Image) -> Image.Image:
+    """Greyscale copy of a page, longest side at most :data:`THUMBNAIL_SIZE`.
+
+    Convert a page once and pass the result to :func:`is_blank` and
+    :func:`pixel_digest`; a page that is already such a copy is returned
+    as is. The caller's image is never modified.
+    """
+    if image.mode == "L" and max(image.size) <= THUMBNAIL_SIZE:
+        return image
+    gray = image.convert("L") if image.mode != "L" else image.copy()
+    gray.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+    return gray
+
+
+def ink_ratio(image: Image.Image) -> float:
+    """Fraction of pixels clearly darker than the page background.
+
+    The background is the median grey level, so tinted paper and scanner
+    grey do not count as ink, and the test is relative to it rather than
+    to a fixed level that thin, anti-aliased strokes never reach.
+    """
+    histogram = grayscale(image).histogram()
+    total = sum(histogram)
+    if not total:
+        return 0.0
+    cumulative = 0
+    background = 255
+    for level, count in enumerate(histogram):
+        cumulative += count
+        if cumulative * 2 >= total:
+            background = level
+            break
+    return sum(histogram[:max(0, background - INK_CONTRAST)]) / total
+
+
+def is_blank(image: Image.Image, max_ink_ratio: float) -> bool:
+    """Whether a page carries (almost) no ink.
+
+    Parameters
+    ----------
+    image : PIL.Image.Image
+        Rendered page, preferably already passed through :func:`grayscale`.
+    max_ink_ratio : float
+        Pages with at most this fraction of ink pixels (see
+        :func:`ink_ratio`) are blank. ``0`` disables detection.
+    """
+    return max_ink_ratio > 0 and ink_ratio(image) <= max_ink_ratio
+
+
+def pixel_digest(image: Image.Image) -> str:
+    """Exact digest of the :func:`grayscale` pixels of a page."""
+    return hashlib.sha256(grayscale(image).tobytes()).hexdigest()
+
+
+@dataclass
+class HashEntry:
+    """A page registered in a :class:`PageHashIndex`, resolved once its OCR text is known."""
+
+    digest: str
+    label: str
+    source: str = ""
+    page_number: int = 0
+    text: Optional[str] = None
+    _done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def resolve(self, text: Optional[str]) -> None:
+        """Publish the page's OCR text, or ``None`` if it failed."""
+        self.text = text
+        self._done.set()
+
+    @property
+    def resolved(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[str]:
+        self._done.wait(timeout)
+        return self.text
+
+
+class PageHashIndex:
+    """Pixel digests of pages already sent to OCR, shared across the files of one packet.
+
+    The first page with a given :func:`pixel_digest` becomes the original;
+    later pages with the same digest reuse its OCR text instead of making
+    their own call. Only identical pixels match: a perceptual hash cannot
+    tell two filled-in copies of the same form apart, so near-duplicates
+    are OCR'd on their own.
+
+    Parameters
+    ----------
+    enabled : bool
+        Whether duplicates are detected at all.
+    max_entries : int
+        Resolved entries kept, least recently matched evicted first. ``0``
+        keeps all.
+    """
+
+    def __init__(self, enabled: bool = False, max_entries: int = 0):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, HashEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def claim(self, digest: str, label: str, source: str = "", page_number: int = 0) -> Tuple[HashEntry, bool]:
+        """Return ``(entry, is_duplicate)`` for a page.
+
+        Either the matching earlier entry, or a new entry the caller must
+        :meth:`~HashEntry.resolve` once its OCR finishes. ``source`` (e.g.
+        the document key) lets :meth:`retain` drop a removed file's pages.
+        """
+        with self._lock:
+            entry = self._entries.get(digest) if self.enabled else None
+            # A failed original is replaced, so the next copy gets its own call
+            if entry is not None and not (entry.resolved and entry.text is None):
+                self._entries.move_to_end(digest)
+                return entry, True
+            entry = HashEntry(digest=digest, label=label, source=source, page_number=page_number)
+            if self.enabled:
+                self._entries[digest] = entry
+                self._entries.move_to_end(digest)
+                self._evict()
+            return entry, False
+
+    def retain(self, sources: Iterable[str]) -> None:
+        """Drop the entries of every source not in ``sources``."""
+        keep = set(sources)
+        with self._lock:
+            for digest in [digest for digest, entry in self._entries.items() if entry.source not in keep]:
+                del self._entries[digest]
+
+    def _evict(self) -> None:
+        if self.max_entries <= 0:
+            return
+        # Unresolved entries may have duplicates waiting on them, so only resolved ones go
+        for digest in [digest for digest, entry in self._entries.items() if entry.resolved]:
+            if len(self._entries) <= self.max_entries:
+                break
+            del self._entries[digest]
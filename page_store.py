@@ -0,0 +1,419 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import weakref
+import zlib
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ocr import format_page_block
+
+
+@dataclass
+class PageRecord:
+    """One OCR'd page.
+
+    Attributes
+    ----------
+    page_number : int
+        One-based page number within its file.
+    text : str
+        Page text.
+    source : str
+        Where the text came from: ``image``, ``native``, ``text_layer``,
+        ``blank`` (skipped, empty text), ``duplicate`` (text reused from an
+        identical page) or ``error``.
+    offset : int
+        Start of this page's ``--- PAGE n ---`` block within the document text.
+    metadata : dict
+        Free-form per-page details (e.g. upload size).
+    """
+
+    page_number: int
+    text: str
+    source: str = "image"
+    offset: int = 0
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+def build_page_records(
+    page_texts: Dict[int, str],
+    sources: Optional[Dict[int, str]] = None,
+    metadata: Optional[Dict[int, Dict[str, Any]]] = None,
+) -> List[PageRecord]:
+    """Build page records in page order, computing each page's offset in the document text."""
+    records = []
+    offset = 0
+    for page_number in sorted(page_texts):
+        text = page_texts[page_number]
+        records.append(PageRecord(
+            page_number=page_number,
+            text=text,
+            source=(sources or {}).get(page_number, "image"),
+            offset=offset,
+            metadata=(metadata or {}).get(page_number, {}),
+        ))
+        offset += len(format_page_block(page_number, text))
+    return records
+
+
+def document_text(pages: Iterable[PageRecord]) -> str:
+    """Render pages in the ``--- PAGE n ---`` layout."""
+    return "".join(format_page_block(page.page_number, page.text) for page in pages)
+
+
+def file_block(name: str, full_ocr_text: str) -> str:
+    """Render one file in the ``=== FILE: name ===`` layout of the combined text."""
+    return f"\n\n=== FILE: {name} ===\n\n{full_ocr_text}"
+
+
+@dataclass
+class StoredDocument:
+    """Pages of one uploaded file."""
+
+    doc_key: str
+    name: str
+    pages: List[PageRecord]
+
+    def text(self) -> str:
+        return document_text(self.pages)
+
+
+@dataclass
+class SpilledDocument:
+    """A document moved out of memory into a compressed spill file."""
+
+    doc_key: str
+    name: str
+    path: str
+    page_count: int
+    size: int
+    compressed_size: int
+
+
+def document_size(pages: Iterable[PageRecord]) -> int:
+    """Approximate in-memory size of a document, in characters of page text."""
+    return sum(len(page.text) for page in pages)
+
+
+def write_spill(path: str, document: StoredDocument) -> int:
+    """Write ``document`` zlib-compressed to ``path`` atomically; return the compressed size."""
+    payload = zlib.compress(json.dumps({
+        "doc_key": document.doc_key,
+        "name": document.name,
+        "pages": [asdict(page) for page in document.pages],
+    }, ensure_ascii=False).encode("utf-8"), 6)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return len(payload)
+
+
+def read_spill(path: str) -> StoredDocument:
+    with open(path, "rb") as f:
+        data = json.loads(zlib.decompress(f.read()).decode("utf-8"))
+    return StoredDocument(
+        doc_key=data["doc_key"],
+        name=data["name"],
+        pages=[PageRecord(**page) for page in data["pages"]],
+    )
+
+
+def sweep_spill_dirs(root: str, max_age_seconds: float) -> int:
+    """Remove session spill directories untouched for ``max_age_seconds``.
+
+    Catches directories of sessions whose process exited before they could
+    clean up. Returns the number of directories removed.
+    """
+    if not os.path.isdir(root):
+        return 0
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    for entry in os.scandir(root):
+        try:
+            if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+
+class MemoryBudget:
+    """Process-wide cap on the resident OCR text of every :class:`PageStore`.
+
+    Stores register themselves on creation (weakly, so an expired session's
+    store is simply dropped). When the total resident size exceeds
+    ``max_bytes`` the least recently used documents across all stores are
+    spilled to disk.
+
+    Parameters
+    ----------
+    max_bytes : int
+        Global cap. ``0`` disables it.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._stores: "weakref.WeakSet[PageStore]" = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def register(self, store: "PageStore") -> None:
+        with self._lock:
+            self._stores.add(store)
+
+    def resident_bytes(self) -> int:
+        with self._lock:
+            stores = list(self._stores)
+        return sum(store.resident_bytes() for store in stores)
+
+    def enforce(self) -> int:
+        """Spill documents until the global cap is met; return the number spilled."""
+        if self.max_bytes <= 0:
+            return 0
+        spilled = 0
+        with self._lock:
+            stores = list(self._stores)
+            total = sum(store.resident_bytes() for store in stores)
+            if total <= self.max_bytes:
+                return 0
+            for store in stores:
+                total -= store.drop_combined()
+            candidates = sorted(
+                (last_used, id(store), store, doc_key)
+                for store in stores
+                for doc_key, last_used in store.resident_usage()
+            )
+            for _, _, store, doc_key in candidates:
+                if total <= self.max_bytes:
+                    break
+                total -= store.spill(doc_key)
+                spilled += 1
+        return spilled
+
+
+class PageStore:
+    """Per-file page records with a lazily built combined text.
+
+    Documents are stored once, as page records. The combined text used for
+    display and classification is joined only when asked for and memoised
+    until the set of documents changes, so nothing is appended to an
+    ever-growing string and removing a file frees its pages.
+
+    With a ``spill_dir``, documents beyond the per-session ``max_bytes`` (or
+    the shared ``budget``) are zlib-compressed to disk, least recently used
+    first, and loaded back lazily when viewed. The spill directory is removed
+    when the store is closed or garbage collected with its expired session.
+
+    Parameters
+    ----------
+    max_bytes : int
+        Per-store cap on resident page text. ``0`` disables it.
+    spill_dir : str, optional
+        Directory for this store's spill files. Without it nothing is spilled.
+    budget : MemoryBudget, optional
+        Shared process-wide cap.
+    """
+
+    def __init__(self, max_bytes: int = 0, spill_dir: Optional[str] = None, budget: Optional[MemoryBudget] = None):
+        self._documents: Dict[str, StoredDocument] = {}
+        self._spilled: Dict[str, SpilledDocument] = {}
+        self._last_used: Dict[str, float] = {}
+        self._order: List[str] = []
+        self._combined: Optional[Tuple[Tuple[str, ...], str]] = None
+        self._lock = threading.RLock()
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.budget = budget
+        self.spill_count = 0
+        self.load_count = 0
+        if spill_dir:
+            self._finalizer = weakref.finalize(self, shutil.rmtree, spill_dir, True)
+        if budget is not None:
+            budget.register(self)
+
+    def __contains__(self, doc_key: str) -> bool:
+        return doc_key in self._documents or doc_key in self._spilled
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def add(self, doc_key: str, name: str, pages: List[PageRecord]) -> StoredDocument:
+        """Store (or replace) the pages of one document."""
+        document = StoredDocument(doc_key=doc_key, name=name, pages=pages)
+        with self._lock:
+            self._discard(doc_key)
+            self._documents[doc_key] = document
+            self._order.append(doc_key)
+            self._last_used[doc_key] = time.monotonic()
+            self._combined = None
+        self._enforce(keep=doc_key)
+        return document
+
+    def get(self, doc_key: str) -> Optional[StoredDocument]:
+        """Return a document, loading it back from its spill file if needed."""
+        with self._lock:
+            document = self._documents.get(doc_key)
+            if document is None:
+                spilled = self._spilled.get(doc_key)
+                if spilled is None:
+                    return None
+                document = read_spill(spilled.path)
+                document.name = spilled.name
+                self._documents[doc_key] = document
+                self._discard_spill(doc_key)
+                self.load_count += 1
+            self._last_used[doc_key] = time.monotonic()
+        self._enforce(keep=doc_key)
+        return document
+
+    def _peek(self, doc_key: str) -> StoredDocument:
+        # Read without making the document resident (used to build the combined text)
+        with self._lock:
+            document = self._documents.get(doc_key)
+            if document is not None:
+                return document
+            spilled = self._spilled[doc_key]
+        document = read_spill(spilled.path)
+        document.name = spilled.name
+        return document
+
+    def remove(self, doc_key: str) -> None:
+        with self._lock:
+            self._discard(doc_key)
+
+    def _discard(self, doc_key: str) -> None:
+        if self._documents.pop(doc_key, None) is not None or doc_key in self._spilled:
+            self._combined = None
+        self._discard_spill(doc_key)
+        self._last_used.pop(doc_key, None)
+        if doc_key in self._order:
+            self._order.remove(doc_key)
+
+    def _discard_spill(self, doc_key: str) -> None:
+        spilled = self._spilled.pop(doc_key, None)
+        if spilled is not None and os.path.exists(spilled.path):
+            os.unlink(spilled.path)
+
+    def retain(self, doc_keys: Iterable[str]) -> List[str]:
+        """Evict every document not in ``doc_keys`` and return the evicted keys."""
+        keep = set(doc_keys)
+        evicted = [doc_key for doc_key in self._order if doc_key not in keep]
+        for doc_key in evicted:
+            self.remove(doc_key)
+        return evicted
+
+    def page_count(self) -> int:
+        with self._lock:
+            return (
+                sum(len(document.pages) for document in self._documents.values())
+                + sum(spilled.page_count for spilled in self._spilled.values())
+            )
+
+    def resident_bytes(self) -> int:
+        """Page text (and memoised combined text) currently held in memory."""
+        with self._lock:
+            combined = len(self._combined[1]) if self._combined is not None else 0
+            return combined + sum(document_size(document.pages) for document in self._documents.values())
+
+    def spilled_bytes(self) -> int:
+        with self._lock:
+            return sum(spilled.compressed_size for spilled in self._spilled.values())
+
+    def resident_usage(self) -> List[Tuple[str, float]]:
+        """``(doc_key, last_used)`` of every resident document."""
+        with self._lock:
+            return [(doc_key, self._last_used.get(doc_key, 0.0)) for doc_key in self._documents]
+
+    def drop_combined(self) -> int:
+        """Forget the memoised combined text; return the characters freed."""
+        with self._lock:
+            freed = len(self._combined[1]) if self._combined is not None else 0
+            self._combined = None
+            return freed
+
+    def spill(self, doc_key: str) -> int:
+        """Compress one resident document to disk; return the characters freed."""
+        if not self.spill_dir:
+            return 0
+        with self._lock:
+            document = self._documents.get(doc_key)
+            if document is None:
+                return 0
+            path = os.path.join(self.spill_dir, f"{doc_key}.json.z")
+            compressed_size = write_spill(path, document)
+            size = document_size(document.pages)
+            self._spilled[doc_key] = SpilledDocument(
+                doc_key=doc_key,
+                name=document.name,
+                path=path,
+                page_count=len(document.pages),
+                size=size,
+                compressed_size=compressed_size,
+            )
+            del self._documents[doc_key]
+            self.spill_count += 1
+            return size
+
+    def _enforce(self, keep: Optional[str] = None) -> None:
+        if self.max_bytes > 0 and self.spill_dir:
+            with self._lock:
+                total = self.resident_bytes()
+                if total > self.max_bytes:
+                    total -= self.drop_combined()
+                for doc_key, _ in sorted(self.resident_usage(), key=lambda item: item[1]):
+                    if total <= self.max_bytes:
+                        break
+                    if doc_key != keep:
+                        total -= self.spill(doc_key)
+        if self.budget is not None:
+            self.budget.enforce()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "documents": len(self._order),
+                "resident": len(self._documents),
+                "spilled": len(self._spilled),
+                "resident_bytes": self.resident_bytes(),
+                "spilled_bytes": self.spilled_bytes(),
+                "spills": self.spill_count,
+                "loads": self.load_count,
+            }
+
+    def close(self) -> None:
+        """Drop every document and delete the spill directory."""
+        with self._lock:
+            self._documents.clear()
+            self._spilled.clear()
+            self._last_used.clear()
+            self._order.clear()
+            self._combined = None
+        if self.spill_dir:
+            self._finalizer()
+
+    def combined_text(self, order: Optional[Iterable[str]] = None) -> str:
+        """Combined ``=== FILE ===`` text of the documents in ``order`` (default: insertion order)."""
+        with self._lock:
+            keys = tuple(doc_key for doc_key in (order if order is not None else self._order) if doc_key in self)
+            if self._combined is not None and self._combined[0] == keys:
+                return self._combined[1]
+            parts = []
+            for key in keys:
+                document = self._peek(key)
+                parts.append(file_block(document.name, document.text()))
+            text = "".join(parts)
+            self._combined = (keys, text)
+        self._enforce()
+        return text
@@ -0,0 +1,1019 @@
+import hashlib
+import hmac
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import classification
+import compaction
+import fast_path
+from cache import DiskCache, content_key
+from encoding import data_url_bytes, encode_page, encode_rendered, images_to_pdf
+from metrics import METRICS, SIZE_BUCKETS, log_event
+from ocr_quality import assess_text
+from page_filter import HashEntry, PageHashIndex, grayscale, is_blank, open_thumbnail, pixel_digest
+from page_store import PageRecord, build_page_records, document_text, file_block
+from ocr import (
+    OCR_MODEL,
+    TokenBucket,
+    extract_page_text,
+    ocr_pdf_native,
+    page_cache_key,
+    pdf_document,
+    plan_batches,
+    request_ocr,
+    response_page_texts,
+)
+from resilience import AdaptiveConcurrency, RetryPolicy, call_with_retries, is_rejected, is_retryable
+from rendering import (
+    PDFTOPPM_FORMATS,
+    count_pages,
+    page_windows,
+    render_page_bytes,
+    render_page_range,
+    text_layer_pages,
+)
+from schema import CLASSIFICATION_JSON_STRUCTURE, compile_schema
+from settings import Settings
+from stages import Stage, StagedPipeline
+
+
+@dataclass
+class DocumentResult:
+    """OCR output of one PDF plus a summary of how it was produced.
+
+    Attributes
+    ----------
+    name : str
+        Original file name.
+    doc_key : str
+        Content hash of the PDF, OCR model and render settings.
+    pages : list of PageRecord
+        Per-page text, source and offset. :attr:`full_ocr_text` renders them
+        in the ``--- PAGE n ---`` layout.
+    page_count : int
+        Number of pages in the PDF.
+    text_layer_pages : int
+        Pages taken from the embedded text layer.
+    native_pages : int
+        Pages OCR'd by submitting the PDF as a document.
+    page_bytes : dict
+        Encoded upload size of each page sent as an image, summed over
+        resolutions if the page was re-rendered.
+    page_dpi : dict
+        Final rendering resolution of each page that went through the image
+        pipeline.
+    stage_stats : list of dict
+        Per-stage counters of the image pipeline, see :class:`stages.StageStats`.
+    timings : dict
+        Seconds spent per stage, summed over pages (``render``, ``encode``,
+        ``ocr``, ``extract``, ``text_layer``, ``native``), plus ``total`` wall time.
+    ocr_requests : int
+        OCR requests made by the image pipeline. With batching several pages
+        share one request.
+    blank_pages : int
+        Pages detected as blank before OCR and skipped.
+    duplicate_pages : int
+        Pages that reused the OCR text of an identical earlier page.
+    skipped_pages : dict
+        Page number to skip reason (``blank`` or ``duplicate``) of every
+        page that was not sent to OCR.
+    failed_pages : list of int
+        Pages that still failed after every retry. Their text is an error
+        placeholder and the document is not cached, so a rerun only redoes
+        these pages (the rest are served from the page cache).
+    escalation_failed_pages : list of int
+        Pages whose re-render at a higher resolution failed. They keep their
+        lower-resolution text and the document is not cached.
+    from_cache : bool
+        Whether the result was served from the persistent cache.
+    """
+
+    name: str
+    doc_key: str
+    pages: List[PageRecord] = field(default_factory=list)
+    page_count: int = 0
+    text_layer_pages: int = 0
+    native_pages: int = 0
+    page_bytes: Dict[int, int] = field(default_factory=dict)
+    page_dpi: Dict[int, int] = field(default_factory=dict)
+    stage_stats: List[Dict[str, Any]] = field(default_factory=list)
+    timings: Dict[str, float] = field(default_factory=dict)
+    ocr_requests: int = 0
+    blank_pages: int = 0
+    duplicate_pages: int = 0
+    skipped_pages: Dict[int, str] = field(default_factory=dict)
+    failed_pages: List[int] = field(default_factory=list)
+    escalation_failed_pages: List[int] = field(default_factory=list)
+    from_cache: bool = False
+
+    @property
+    def full_ocr_text(self) -> str:
+        return document_text(self.pages)
+
+    @property
+    def image_pages(self) -> int:
+        return len(self.page_bytes)
+
+    @property
+    def dpi_distribution(self) -> Dict[int, int]:
+        """Number of pages rendered at each resolution."""
+        distribution: Dict[int, int] = {}
+        for dpi in self.page_dpi.values():
+            distribution[dpi] = distribution.get(dpi, 0) + 1
+        return dict(sorted(distribution.items()))
+
+    @property
+    def calls_saved(self) -> int:
+        """OCR requests avoided by skipping blank and duplicate pages."""
+        return self.blank_pages + self.duplicate_pages
+
+    @property
+    def upload_bytes(self) -> int:
+        return sum(self.page_bytes.values())
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DocumentResult":
+        data = dict(data)
+        # JSON turns the integer page keys into strings
+        data["page_bytes"] = {int(k): v for k, v in data.get("page_bytes", {}).items()}
+        data["page_dpi"] = {int(k): v for k, v in data.get("page_dpi", {}).items()}
+        data["skipped_pages"] = {int(k): v for k, v in data.get("skipped_pages", {}).items()}
+        data["pages"] = [PageRecord(**page) for page in data.get("pages", [])]
+        return cls(**data)
+
+
+@dataclass
+class PageWork:
+    """A page moving through the image pipeline; each stage fills in its fields."""
+
+    page_number: int
+    image: Any = None
+    encoded: Optional[bytes] = None
+    document: Optional[Dict[str, Any]] = None
+    payload_bytes: int = 0
+    cache_key: str = ""
+    response: Any = None
+    text: Optional[str] = None
+    error: Optional[str] = None
+    skip_reason: Optional[str] = None
+    hash_entry: Optional[HashEntry] = None
+    duplicate: bool = False
+    timings: Dict[str, float] = field(default_factory=dict)
+
+
+@dataclass
+class ImageOCRResult:
+    """Output of :func:`ocr_page_images`."""
+
+    page_texts: Dict[int, str]
+    page_bytes: Dict[int, int]
+    stage_stats: List[Dict[str, Any]]
+    timings: Dict[str, float]
+    failed_pages: Dict[int, str] = field(default_factory=dict)
+    page_sources: Dict[int, str] = field(default_factory=dict)
+    requests: int = 0
+    # Duplicate page -> (source, page number) of the page whose text it reused
+    duplicate_of: Dict[int, Tuple[str, int]] = field(default_factory=dict)
+
+
+def document_key(pdf_bytes: bytes, settings: Settings, model: str = OCR_MODEL) -> str:
+    """Content hash identifying the OCR result of ``pdf_bytes`` under ``settings``."""
+    return content_key("document-v2", model, settings.render_fingerprint(), pdf_bytes)
+
+
+def retry_policy(settings: Settings) -> RetryPolicy:
+    """Retry policy for OCR requests configured by ``OCR_RETRY_*`` settings."""
+    return RetryPolicy(
+        max_attempts=settings.ocr_max_attempts,
+        base_delay=settings.ocr_backoff_base,
+        max_delay=settings.ocr_backoff_max,
+    )
+
+
+def adaptive_concurrency(settings: Settings) -> Optional[AdaptiveConcurrency]:
+    """AIMD limit on concurrent OCR requests for one API key.
+
+    ``ocr_global_in_flight`` sets the ceiling; without adaptive concurrency
+    it becomes a fixed limit, and no limiter is returned if it is unset.
+    """
+    limit = settings.ocr_global_in_flight or settings.ocr_max_in_flight
+    if not settings.ocr_adaptive_concurrency:
+        if not settings.ocr_global_in_flight:
+            return None
+        return AdaptiveConcurrency(limit, minimum=limit, maximum=limit)
+    return AdaptiveConcurrency(limit, minimum=1, maximum=limit)
+
+
+class KeyedConcurrency:
+    """One :func:`adaptive_concurrency` limiter per API key.
+
+    Throttling is per key on the API side, so a 429 seen by one key only
+    shrinks the limit of the documents using that key. Like
+    :class:`clients.ClientRegistry`, limiters are looked up by an HMAC of
+    the key under a per-process secret and the key itself is not stored.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self._secret = os.urandom(32)
+        self._lock = threading.Lock()
+        self._limiters: Dict[str, Optional[AdaptiveConcurrency]] = {}
+
+    def get(self, api_key: str) -> Optional[AdaptiveConcurrency]:
+        digest = hmac.new(self._secret, api_key.encode("utf-8"), hashlib.sha256).hexdigest()
+        with self._lock:
+            if digest not in self._limiters:
+                self._limiters[digest] = adaptive_concurrency(self.settings)
+            return self._limiters[digest]
+
+
+def _count_retry(attempt: int, error: BaseException, delay: float) -> None:
+    METRICS.inc("ocr_retries_total", reason=type(error).__name__)
+
+
+def open_ocr_cache(settings: Settings) -> Optional[DiskCache]:
+    """Open the persistent OCR cache, or return ``None`` if caching is disabled."""
+    if settings.cache_max_mb <= 0:
+        return None
+    return DiskCache(os.path.join(settings.cache_dir, "ocr"), settings.cache_max_mb * 1024 * 1024)
+
+
+def ocr_pdf(
+    pdf_bytes: bytes,
+    name: str,
+    client: Any,
+    settings: Settings,
+    rate_limiter: Optional[TokenBucket] = None,
+    cache: Optional[DiskCache] = None,
+    on_start: Optional[Callable[[int], None]] = None,
+    on_page: Optional[Callable[[int, str], None]] = None,
+    concurrency: Optional[AdaptiveConcurrency] = None,
+    page_index: Optional[PageHashIndex] = None,
+) -> DocumentResult:
+    """Run text layer extraction, native OCR and image OCR for one PDF.
+
+    Parameters
+    ----------
+    pdf_bytes : bytes
+        Raw PDF content.
+    name : str
+        File name, kept for display and for the combined text header.
+    client : Mistral
+        OCR client exposing ``client.ocr.process``.
+    settings : Settings
+        Rendering, encoding, ingestion and concurrency settings.
+    rate_limiter : TokenBucket, optional
+        Limiter shared by every caller hitting the same API.
+    cache : DiskCache, optional
+        Persistent cache for whole documents and individual pages.
+    on_start : callable, optional
+        Called with the page count once it is known.
+    on_page : callable, optional
+        Called as ``on_page(page_number, text)`` as each page completes.
+        Pages that fail the quality checks are reported only after the DPI
+        ladder has re-rendered them, with their final text.
+    concurrency : AdaptiveConcurrency, optional
+        Shared AIMD limit that shrinks when the API throttles.
+    page_index : PageHashIndex, optional
+        Pixel digests shared across the files of one packet so identical
+        pages are OCR'd once. Defaults to an index for this document only.
+
+    Returns
+    -------
+    DocumentResult
+    """
+    started = time.perf_counter()
+    doc_key = document_key(pdf_bytes, settings)
+    cached = cache.get(doc_key) if cache is not None else None
+    if cached is not None:
+        METRICS.inc("ocr_cache_hits_total", level="document")
+        result = DocumentResult.from_dict(cached)
+        result.name = name
+        result.from_cache = True
+        log_event("document_cached", name=name, doc_key=doc_key, pages=result.page_count)
+        return result
+    if cache is not None:
+        METRICS.inc("ocr_cache_misses_total", level="document")
+
+    timings: Dict[str, float] = {}
+    page_count = count_pages(pdf_bytes)
+    if on_start is not None:
+        on_start(page_count)
+
+    def page_done(page_number: int, text: str) -> None:
+        if on_page is not None:
+            on_page(page_number, text)
+
+    # Born-digital pages already carry text, take it locally without an OCR call
+    stage_started = time.perf_counter()
+    page_texts = text_layer_pages(pdf_bytes, settings.text_layer_min_chars)
+    sources = {page_number: "text_layer" for page_number in page_texts}
+    timings["text_layer"] = time.perf_counter() - stage_started
+    text_layer_count = len(page_texts)
+    METRICS.inc("ocr_pages_total", text_layer_count, source="text_layer")
+    for page_number, text in page_texts.items():
+        page_done(page_number, text)
+    remaining_pages = [n for n in range(1, page_count + 1) if n not in page_texts]
+
+    # Native mode submits the PDF itself, rendering is only a fallback for failed pages
+    native_count = 0
+    if settings.ingest_mode == "native" and remaining_pages:
+        stage_started = time.perf_counter()
+        native_texts, remaining_pages = ocr_pdf_native(
+            client,
+            pdf_bytes,
+            remaining_pages,
+            pages_per_request=settings.native_pages_per_request,
+            max_in_flight=settings.ocr_max_in_flight,
+            rate_limiter=rate_limiter,
+            on_page=page_done,
+            retry_policy=retry_policy(settings),
+            concurrency=concurrency,
+            on_retry=_count_retry,
+        )
+        native_count = len(native_texts)
+        page_texts.update(native_texts)
+        sources.update({page_number: "native" for page_number in native_texts})
+        timings["native"] = time.perf_counter() - stage_started
+        METRICS.observe("ocr_stage_seconds", timings["native"], stage="native")
+        METRICS.inc("ocr_pages_total", native_count, source="native")
+
+    # Remaining pages go through the image pipeline. The first pass covers all of
+    # them, extra passes only the pages whose retries were exhausted
+    if page_index is None:
+        page_index = PageHashIndex(settings.page_dedupe, settings.page_index_max_entries)
+    ladder = settings.dpi_ladder()
+    markers = settings.quality_markers_pattern()
+    held: List[int] = []
+
+    def image_page_done(page_number: int, text: str) -> None:
+        # A page the DPI ladder will re-render is reported once, with its final text,
+        # so live consumers such as the incremental classifier never see the weak version
+        if len(ladder) > 1 and assess_text(
+            text, settings.quality_min_chars, settings.quality_max_garbage_ratio, markers,
+        ) is not None:
+            held.append(page_number)
+            return
+        page_done(page_number, text)
+
+    ocr_requests = 0
+    page_bytes: Dict[int, int] = {}
+    stage_stats: List[Dict[str, Any]] = []
+    failed_pages: Dict[int, str] = {}
+    duplicate_of: Dict[int, Tuple[str, int]] = {}
+    for _ in range(1 + max(0, settings.ocr_failed_page_passes)):
+        if not remaining_pages:
+            break
+        images = ocr_page_images(
+            pdf_bytes, remaining_pages, client, settings,
+            rate_limiter=rate_limiter, cache=cache, on_page=image_page_done, concurrency=concurrency,
+            page_index=page_index, label=name, dpi=ladder[0], source=doc_key,
+        )
+        page_texts.update(images.page_texts)
+        sources.update(images.page_sources)
+        page_bytes.update(images.page_bytes)
+        duplicate_of.update(images.duplicate_of)
+        ocr_requests += images.requests
+        if not stage_stats:
+            stage_stats = images.stage_stats
+        for stage, seconds in images.timings.items():
+            timings[stage] = timings.get(stage, 0.0) + seconds
+        failed_pages = images.failed_pages
+        remaining_pages = sorted(failed_pages)
+        if remaining_pages:
+            logging.warning("%s: OCR failed for pages %s", name, remaining_pages)
+
+    # Adaptive resolution: pages whose text fails the quality checks are
+    # re-rendered at the next step of the DPI ladder, the rest stay as they are.
+    # Duplicates of a page in this document follow their original
+    copies: Dict[int, List[int]] = {}
+    for page_number, (source, original) in duplicate_of.items():
+        if source == doc_key:
+            copies.setdefault(original, []).append(page_number)
+    escalation_failures: Dict[int, str] = {}
+    page_dpi = {page_number: ladder[0] for page_number in page_bytes}
+    page_dpi.update({
+        page_number: ladder[0] for page_number, source in sources.items() if source in ("blank", "duplicate")
+    })
+    candidates = sorted(page_bytes)
+    for dpi in ladder[1:]:
+        weak: Dict[int, str] = {}
+        for page_number in candidates:
+            reason = assess_text(
+                page_texts[page_number],
+                settings.quality_min_chars,
+                settings.quality_max_garbage_ratio,
+                markers,
+            )
+            if reason is not None:
+                weak[page_number] = reason
+                METRICS.inc("ocr_dpi_escalations_total", dpi=dpi, reason=reason)
+        if not weak:
+            break
+        logging.info("%s: re-rendering pages %s at %d dpi", name, sorted(weak), dpi)
+        images = ocr_page_images(
+            pdf_bytes, sorted(weak), client, settings,
+            rate_limiter=rate_limiter, cache=cache, concurrency=concurrency, label=name, dpi=dpi,
+        )
+        # Pages that fail at the higher resolution keep their earlier text, but the
+        # document is not cached so a rerun tries the escalation again
+        for page_number, error in images.failed_pages.items():
+            escalation_failures[page_number] = error
+            METRICS.inc("ocr_dpi_escalation_failures_total", dpi=dpi)
+        if images.failed_pages:
+            logging.warning(
+                "%s: re-rendering pages %s at %d dpi failed, keeping their earlier text",
+                name, sorted(images.failed_pages), dpi,
+            )
+        for page_number, text in images.page_texts.items():
+            escalation_failures.pop(page_number, None)
+            for target in [page_number] + copies.get(page_number, []):
+                page_texts[target] = text
+                page_dpi[target] = dpi
+            if page_number in images.page_sources:
+                sources[page_number] = images.page_sources[page_number]
+            else:
+                sources.pop(page_number, None)
+        for page_number, size in images.page_bytes.items():
+            page_bytes[page_number] = page_bytes.get(page_number, 0) + size
+        ocr_requests += images.requests
+        for stage, seconds in images.timings.items():
+            timings[stage] = timings.get(stage, 0.0) + seconds
+        candidates = sorted(images.page_bytes)
+    for dpi in page_dpi.values():
+        METRICS.inc("ocr_page_dpi_total", dpi=dpi)
+    for page_number in sorted(held):
+        if page_number not in failed_pages:
+            page_done(page_number, page_texts[page_number])
+
+    for page_number, error in failed_pages.items():
+        page_texts[page_number] = f"Error extracting text: {error}"
+        sources[page_number] = "error"
+    timings["total"] = time.perf_counter() - started
+    METRICS.observe("ocr_document_seconds", timings["total"])
+
+    result = DocumentResult(
+        name=name,
+        doc_key=doc_key,
+        pages=build_page_records(
+            page_texts,
+            sources,
+            {
+                page_number: {
+                    **({"upload_bytes": page_bytes[page_number]} if page_number in page_bytes else {}),
+                    "dpi": dpi,
+                    **({"escalation_error": escalation_failures[page_number]}
+                       if page_number in escalation_failures else {}),
+                }
+                for page_number, dpi in page_dpi.items()
+            },
+        ),
+        page_count=page_count,
+        text_layer_pages=text_layer_count,
+        native_pages=native_count,
+        page_bytes=page_bytes,
+        page_dpi=dict(sorted(page_dpi.items())),
+        stage_stats=stage_stats,
+        timings={stage: round(seconds, 4) for stage, seconds in timings.items()},
+        ocr_requests=ocr_requests,
+        blank_pages=sum(1 for source in sources.values() if source == "blank"),
+        duplicate_pages=sum(1 for source in sources.values() if source == "duplicate"),
+        skipped_pages={
+            page_number: source for page_number, source in sorted(sources.items()) if source in ("blank", "duplicate")
+        },
+        failed_pages=sorted(failed_pages),
+        escalation_failed_pages=sorted(escalation_failures),
+    )
+    if cache is not None and not failed_pages and not escalation_failures:
+        cache.set(doc_key, result.as_dict(), saved_bytes=result.upload_bytes)
+    log_event(
+        "document_ocr",
+        name=name,
+        doc_key=doc_key,
+        pages=page_count,
+        text_layer_pages=text_layer_count,
+        native_pages=native_count,
+        image_pages=result.image_pages,
+        ocr_requests=result.ocr_requests,
+        blank_pages=result.blank_pages,
+        duplicate_pages=result.duplicate_pages,
+        skipped_pages=result.skipped_pages,
+        failed_pages=result.failed_pages,
+        escalation_failed_pages=result.escalation_failed_pages,
+        upload_bytes=result.upload_bytes,
+        dpi_distribution=result.dpi_distribution,
+        timings=result.timings,
+    )
+    return result
+
+
+def ocr_page_images(
+    pdf_bytes: bytes,
+    page_numbers: List[int],
+    client: Any,
+    settings: Settings,
+    rate_limiter: Optional[TokenBucket] = None,
+    cache: Optional[DiskCache] = None,
+    on_page: Optional[Callable[[int, str], None]] = None,
+    concurrency: Optional[AdaptiveConcurrency] = None,
+    page_index: Optional[PageHashIndex] = None,
+    label: str = "",
+    dpi: Optional[int] = None,
+    source: str = "",
+) -> ImageOCRResult:
+    """OCR pages as images through overlapped render, filter, encode, OCR and extract stages.
+
+    Each stage has its own workers and a bounded input queue, so rendering
+    page N+1 overlaps with uploading page N while memory stays bounded by
+    the queue sizes. Each OCR request is retried with backoff; pages whose
+    retries are exhausted, or whose payload the API rejects (400, 413,
+    422), are reported in ``failed_pages`` instead of failing the whole
+    document. Other errors (e.g. authentication) still propagate.
+
+    The filter stage skips blank pages and, with a ``page_index``, lets
+    pixel-identical copies of an earlier page reuse its text; ``source``
+    tags this document's entries in the index. Duplicates whose
+    original is still in flight are resolved after the pipeline drains, so
+    no stage worker ever blocks on another page.
+
+    Pages are rendered at ``dpi``, by default ``settings.render_dpi``, with
+    the renderer chosen by ``settings.renderer``.
+
+    With ``settings.ocr_batch_pages`` above one, each render window travels
+    through the stages as a list and the OCR stage packs its pages into
+    multi-page PDFs of up to ``ocr_batch_pages`` pages and
+    ``ocr_batch_max_bytes``, one request each. Returned pages are mapped
+    back by index; pages missing from a batch response are sent on their
+    own.
+
+    Returns
+    -------
+    ImageOCRResult
+        Page texts, upload sizes, per-stage stats, per-stage time summed
+        over pages, the pages that failed and the source of skipped pages.
+    """
+    policy = retry_policy(settings)
+    dpi = dpi or settings.render_dpi
+    claimed: List[HashEntry] = []
+    use_pdftoppm = False
+    if settings.renderer == "pdftoppm":
+        if settings.page_format in PDFTOPPM_FORMATS:
+            use_pdftoppm = True
+        else:
+            logging.warning("pdftoppm cannot write %s pages, rendering with pdf2image", settings.page_format)
+    dedupe = page_index is not None and page_index.enabled
+    batch_pages = settings.ocr_batch_pages
+    sent: List[int] = []
+
+    def render(window: Tuple[int, int]) -> List[PageWork]:
+        first_page, last_page = window
+        started = time.perf_counter()
+        if use_pdftoppm:
+            pages = render_page_bytes(
+                pdf_bytes, first_page, last_page,
+                dpi=dpi,
+                image_format=settings.page_format,
+                quality=settings.page_quality,
+                grayscale=settings.page_grayscale,
+            )
+            works = [PageWork(page_number=page_number, encoded=data) for page_number, data in pages]
+        else:
+            pages = render_page_range(pdf_bytes, first_page, last_page, dpi=dpi)
+            works = [PageWork(page_number=page_number, image=image) for page_number, image in pages]
+        # poppler renders the whole window in one call, attribute the time evenly
+        per_page = (time.perf_counter() - started) / max(1, len(works))
+        for work in works:
+            work.timings["render"] = per_page
+        return works
+
+    def filter_page(work: PageWork) -> PageWork:
+        if settings.page_blank_ink_ratio <= 0 and not dedupe:
+            return work
+        started = time.perf_counter()
+        # One greyscale conversion serves both the ink and the digest checks
+        gray = grayscale(work.image) if work.image is not None else open_thumbnail(work.encoded)
+        if is_blank(gray, settings.page_blank_ink_ratio):
+            work.text = ""
+            work.skip_reason = "blank"
+        elif dedupe:
+            entry, work.duplicate = page_index.claim(
+                pixel_digest(gray), f"{label} page {work.page_number}", source, work.page_number,
+            )
+            work.hash_entry = entry
+            if not work.duplicate:
+                claimed.append(entry)
+            elif entry.resolved:
+                work.text = entry.text
+                work.skip_reason = "duplicate"
+        if work.duplicate or work.skip_reason:
+            work.image = None
+            work.encoded = None
+        work.timings["filter"] = time.perf_counter() - started
+        return work
+
+    def encode(work: PageWork) -> PageWork:
+        if work.image is None and work.encoded is None:
+            return work
+        started = time.perf_counter()
+        if work.encoded is not None:
+            encoded = encode_rendered(
+                work.encoded,
+                image_format=settings.page_format,
+                quality=settings.page_quality,
+                max_bytes=settings.page_max_bytes or None,
+            )
+        else:
+            encoded = encode_page(
+                work.image,
+                image_format=settings.page_format,
+                quality=settings.page_quality,
+                grayscale=settings.page_grayscale,
+                max_bytes=settings.page_max_bytes or None,
+            )
+        work.image = None
+        work.encoded = None
+        work.document = {"type": "image_url", "image_url": encoded.data_url}
+        work.payload_bytes = encoded.num_bytes
+        work.timings["encode"] = time.perf_counter() - started
+        if cache is not None:
+            work.cache_key = page_cache_key(work.document)
+            work.text = cache.get(work.cache_key)
+            METRICS.inc("ocr_cache_hits_total" if work.text is not None else "ocr_cache_misses_total", level="page")
+        return work
+
+    def request(work: PageWork) -> PageWork:
+        # Cache hits already carry their text and skip the API call, so do skipped pages
+        if work.text is None and work.document is not None:
+            sent.append(1)
+            started = time.perf_counter()
+            try:
+                work.response = call_with_retries(
+                    lambda: request_ocr(client, work.document, rate_limiter=rate_limiter),
+                    policy,
+                    concurrency,
+                    on_retry=_count_retry,
+                )
+            except Exception as e:
+                if not (is_retryable(e) or is_rejected(e)):
+                    raise
+                work.error = str(e)
+            work.timings["ocr"] = time.perf_counter() - started
+        work.document = None
+        return work
+
+    def request_batch(works: List[PageWork]) -> List[PageWork]:
+        pending = [work for work in works if work.text is None and work.document is not None]
+        for indices in plan_batches([work.payload_bytes for work in pending], batch_pages, settings.ocr_batch_max_bytes):
+            group = [pending[index] for index in indices]
+            if len(group) == 1:
+                request(group[0])
+                continue
+            sent.append(len(group))
+            started = time.perf_counter()
+            document = pdf_document(images_to_pdf([data_url_bytes(work.document["image_url"]) for work in group], dpi))
+            try:
+                response = call_with_retries(
+                    lambda: request_ocr(client, document, rate_limiter=rate_limiter),
+                    policy,
+                    concurrency,
+                    on_retry=_count_retry,
+                )
+            except Exception as e:
+                if is_rejected(e):
+                    # One bad page must not sink the batch; send each on its own so only it fails
+                    logging.warning("%s: batch of pages %s rejected (%s), sending them alone",
+                                    label, [work.page_number for work in group], e)
+                    for work in group:
+                        request(work)
+                    continue
+                if not is_retryable(e):
+                    raise
+                for work in group:
+                    work.error = str(e)
+                    work.document = None
+                continue
+            texts = response_page_texts(response)
+            per_page = (time.perf_counter() - started) / len(group)
+            for index, work in enumerate(group):
+                if index not in texts:
+                    logging.warning("%s: page %d missing from batched response, sending it alone", label, work.page_number)
+                    request(work)
+                    continue
+                work.text = texts[index]
+                work.document = None
+                work.timings["ocr"] = per_page
+                if cache is not None:
+                    cache.set(work.cache_key, work.text, saved_bytes=work.payload_bytes)
+        for work in works:
+            work.document = None
+        return works
+
+    def extract(work: PageWork) -> PageWork:
+        if work.response is not None:
+            started = time.perf_counter()
+            work.text = extract_page_text(work.response)
+            work.response = None
+            if cache is not None:
+                cache.set(work.cache_key, work.text, saved_bytes=work.payload_bytes)
+            work.timings["extract"] = time.perf_counter() - started
+        if work.hash_entry is not None and not work.duplicate:
+            work.hash_entry.resolve(work.text if work.error is None else None)
+        return work
+
+    queue_size = settings.stage_queue_size
+    window = settings.render_window
+    if batch_pages > 1:
+        # A render window is the unit of batching, so it travels through the stages as a list
+        def each(fn: Callable[[PageWork], PageWork]) -> Callable[[List[PageWork]], List[PageWork]]:
+            return lambda works: [fn(work) for work in works]
+
+        window = max(window, batch_pages)
+        staged = StagedPipeline([
+            Stage("render", render, workers=settings.render_workers, queue_size=queue_size),
+            Stage("filter", each(filter_page), workers=1, queue_size=queue_size),
+            Stage("encode", each(encode), workers=settings.encode_workers, queue_size=queue_size),
+            Stage("ocr", request_batch, workers=settings.ocr_max_in_flight, queue_size=queue_size),
+            Stage("extract", each(extract), workers=1, queue_size=queue_size, expand=True),
+        ], output_size=queue_size)
+    else:
+        staged = StagedPipeline([
+            Stage("render", render, workers=settings.render_workers, queue_size=queue_size, expand=True),
+            Stage("filter", filter_page, workers=1, queue_size=queue_size),
+            Stage("encode", encode, workers=settings.encode_workers, queue_size=queue_size),
+            Stage("ocr", request, workers=settings.ocr_max_in_flight, queue_size=queue_size),
+            Stage("extract", extract, workers=1, queue_size=queue_size),
+        ], output_size=queue_size)
+
+    page_texts: Dict[int, str] = {}
+    page_bytes: Dict[int, int] = {}
+    page_sources: Dict[int, str] = {}
+    timings: Dict[str, float] = {}
+    failed_pages: Dict[int, str] = {}
+    duplicate_of: Dict[int, Tuple[str, int]] = {}
+    deferred: List[PageWork] = []
+
+    def page_finished(work: PageWork) -> None:
+        page_texts[work.page_number] = work.text
+        if work.skip_reason is not None:
+            page_sources[work.page_number] = work.skip_reason
+            if work.skip_reason == "duplicate":
+                duplicate_of[work.page_number] = (work.hash_entry.source, work.hash_entry.page_number)
+            METRICS.inc("ocr_pages_total", source=work.skip_reason)
+            METRICS.inc("ocr_pages_skipped_total", reason=work.skip_reason)
+        else:
+            page_bytes[work.page_number] = work.payload_bytes
+            METRICS.inc("ocr_pages_total", source="image")
+            METRICS.observe("ocr_page_payload_bytes", work.payload_bytes, buckets=SIZE_BUCKETS)
+        for stage, seconds in work.timings.items():
+            timings[stage] = timings.get(stage, 0.0) + seconds
+            METRICS.observe("ocr_stage_seconds", seconds, stage=stage)
+        logging.debug("Page %d timings: %s", work.page_number, work.timings)
+        if on_page is not None:
+            on_page(work.page_number, work.text)
+
+    try:
+        for work in staged.run(page_windows(sorted(page_numbers), window)):
+            if work.error is not None:
+                failed_pages[work.page_number] = work.error
+                METRICS.inc("ocr_failed_pages_total")
+                continue
+            if work.text is None and work.duplicate:
+                deferred.append(work)
+                continue
+            page_finished(work)
+    finally:
+        # Never leave duplicates elsewhere waiting on an original this run did not finish
+        for entry in claimed:
+            if not entry.resolved:
+                entry.resolve(None)
+
+    # Every original of this run is resolved now; originals from other files finish independently
+    fallback_pages = []
+    for work in deferred:
+        work.text = work.hash_entry.wait()
+        if work.text is None:
+            fallback_pages.append(work.page_number)
+            continue
+        work.skip_reason = "duplicate"
+        page_finished(work)
+    if fallback_pages:
+        logging.info("%s: originals of duplicate pages %s failed, OCR'ing them directly", label, fallback_pages)
+        fallback = ocr_page_images(
+            pdf_bytes, fallback_pages, client, settings,
+            rate_limiter=rate_limiter, cache=cache, on_page=on_page, concurrency=concurrency, dpi=dpi,
+        )
+        page_texts.update(fallback.page_texts)
+        page_bytes.update(fallback.page_bytes)
+        page_sources.update(fallback.page_sources)
+        failed_pages.update(fallback.failed_pages)
+        sent.extend([1] * fallback.requests)
+        for stage, seconds in fallback.timings.items():
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+    stage_stats = [stats.as_dict() for stats in staged.stats()]
+    log_event(
+        "image_pipeline",
+        pages=len(page_texts),
+        blank_pages=sum(1 for source in page_sources.values() if source == "blank"),
+        duplicate_pages=sum(1 for source in page_sources.values() if source == "duplicate"),
+        requests=len(sent),
+        batched_pages=sum(sent),
+        stages=stage_stats,
+    )
+    for size in sent:
+        METRICS.inc("ocr_requests_total", kind="batch" if size > 1 else "page")
+    return ImageOCRResult(
+        page_texts=page_texts,
+        page_bytes=page_bytes,
+        stage_stats=stage_stats,
+        timings=timings,
+        failed_pages=failed_pages,
+        page_sources=page_sources,
+        requests=len(sent),
+        duplicate_of=duplicate_of,
+    )
+
+
+def combine_documents(results: Iterable[DocumentResult]) -> str:
+    """Concatenate document texts, in the given order, for classification."""
+    return "".join(file_block(result.name, result.full_ocr_text) for result in results)
+
+
+def classify_text(
+    combined_ocr_text: str,
+    api_key: str,
+    json_schema: str = CLASSIFICATION_JSON_STRUCTURE,
+    classifier: Callable[[str, str, str], Any] = classification.classify_with_o1_model,
+    settings: Optional[Settings] = None,
+    cache: Optional[DiskCache] = None,
+) -> Any:
+    """Classify combined OCR text against the loan application schema.
+
+    ``classifier`` defaults to :func:`classification.classify_with_o1_model`
+    and can be swapped for a local stand-in, e.g. in benchmarks. With
+    ``OCR_CLASSIFY_MODE=chunked`` the packet is classified map-reduce style
+    by :func:`classification.classify_chunked`; with ``incremental`` page
+    by page by :func:`classification.classify_incremental`, stopping once
+    the required fields are filled.
+
+    The text the model sees is first shrunk by :func:`compact_for_classification`.
+    With ``OCR_CLASSIFY_FAST_PATH`` pattern-shaped fields are first filled
+    locally by :func:`fast_path.extract_fields`. Fields named by their label
+    are not sent to the classifier and win over its answer, and no request
+    is made if none remain. Fields that depend on a section heading are
+    only hints: the model is still asked for them and its values win.
+
+    The result is validated and coerced against the compiled schema before
+    it is returned. With a ``cache``, results are keyed on the normalised
+    text, schema fingerprint, classifier version, classification mode with
+    the settings that shape its answer, and the fast-path and compaction
+    settings; chunked runs also cache each partial request.
+    """
+    use_fast_path = settings is not None and settings.classify_fast_path
+    version = classification.CLASSIFIER_VERSION
+    # Single, chunked and incremental runs answer differently, never serve one for another
+    if settings is not None and settings.classify_mode == "chunked":
+        version += f"+chunked:{settings.classify_max_chunk_chars}"
+    elif settings is not None and settings.classify_mode == "incremental":
+        version += (
+            f"+incremental:{','.join(settings.required_fields())}:{settings.classify_min_confidence}"
+            f":{settings.classify_incremental_chars}"
+        )
+    else:
+        version += "+single"
+    if use_fast_path:
+        version += "+" + fast_path.RULES_VERSION
+    if settings is not None and (settings.classify_compact or settings.classify_max_tokens > 0):
+        version += (
+            f"+{compaction.COMPACTION_VERSION}:{int(settings.classify_compact)}:{settings.classify_max_tokens}"
+            f":{settings.classify_boilerplate_min_pages}:{settings.classify_token_model}"
+        )
+    key = classification.classification_cache_key(combined_ocr_text, json_schema, version) if cache is not None else ""
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            METRICS.inc("classification_cache_hits_total")
+            return cached
+        METRICS.inc("classification_cache_misses_total")
+
+    schema = compile_schema(json_schema)
+    found: Dict[str, fast_path.Extraction] = {}
+    prefilled: Dict[str, Any] = {}
+    if use_fast_path:
+        pages = ((chunk.file_name, chunk.page_number, chunk.text, 0) for chunk in classification.split_chunks(combined_ocr_text))
+        found = fast_path.extract_fields(pages, wanted=schema.fields)
+        prefilled = fast_path.as_values(found, hints=False)
+        METRICS.inc("classification_fast_path_fields_total", len(found))
+    remaining = [name for name in schema.fields if name not in prefilled]
+    request_schema = schema.subset(remaining) if prefilled else json_schema
+
+    result: Any = {}
+    if remaining:
+        if settings is not None and (settings.classify_compact or settings.classify_max_tokens > 0):
+            combined_ocr_text = compact_for_classification(combined_ocr_text, settings).text
+        with METRICS.timer("classification_seconds"):
+            if settings is not None and settings.classify_mode == "chunked":
+                result = classification.classify_chunked(
+                    combined_ocr_text,
+                    api_key,
+                    request_schema,
+                    classifier=classifier,
+                    max_chunk_chars=settings.classify_max_chunk_chars,
+                    max_workers=settings.classify_max_workers,
+                    cache=cache,
+                )
+            elif settings is not None and settings.classify_mode == "incremental":
+                result = classification.classify_incremental(
+                    combined_ocr_text,
+                    api_key,
+                    request_schema,
+                    classifier=classifier,
+                    required_fields=settings.required_fields(),
+                    min_confidence=settings.classify_min_confidence,
+                    batch_chars=settings.classify_incremental_chars,
+                    cache=cache,
+                )
+            else:
+                result = classifier(combined_ocr_text, api_key, request_schema)
+    if found:
+        logging.info(
+            "Fast path filled %d of %d fields locally, %d more as hints",
+            len(prefilled), len(schema.fields), len(found) - len(prefilled),
+        )
+        result = fast_path.merge(found, result)
+    if not result:
+        return result
+
+    validation = schema.validate(result)
+    if validation.errors:
+        METRICS.inc("classification_validation_errors_total", len(validation.errors))
+        logging.warning("Classification result failed schema validation: %s", validation.errors)
+    if cache is not None:
+        cache.set(key, validation.value)
+    return validation.value
+
+
+def compact_for_classification(combined_ocr_text: str, settings: Settings) -> "compaction.CompactionResult":
+    """Apply the ``OCR_CLASSIFY_COMPACT`` / ``OCR_CLASSIFY_MAX_TOKENS`` settings to combined OCR text.
+
+    Token counts before and after are recorded in metrics and logged.
+    """
+    result = compaction.compact_text(
+        combined_ocr_text,
+        max_tokens=settings.classify_max_tokens,
+        model=settings.classify_token_model,
+        boilerplate_min_pages=settings.classify_boilerplate_min_pages if settings.classify_compact else 0,
+        collapse=settings.classify_compact,
+    )
+    METRICS.inc("classification_tokens_total", result.tokens_before, stage="before")
+    METRICS.inc("classification_tokens_total", result.tokens_after, stage="after")
+    METRICS.inc("classification_pages_dropped_total", len(result.dropped_pages))
+    log_event("classification_compaction", **result.summary())
+    return result
+
+
+def incremental_classifier(
+    api_key: str,
+    settings: Settings,
+    json_schema: str = CLASSIFICATION_JSON_STRUCTURE,
+    classifier: Callable[[str, str, str], Any] = classification.classify_with_o1_model,
+    cache: Optional[DiskCache] = None,
+) -> classification.IncrementalClassifier:
+    """Start an :class:`classification.IncrementalClassifier` configured by ``settings``."""
+    return classification.IncrementalClassifier(
+        api_key,
+        json_schema,
+        classifier=classifier,
+        required_fields=settings.required_fields(),
+        min_confidence=settings.classify_min_confidence,
+        batch_chars=settings.classify_incremental_chars,
+        cache=cache,
+        use_fast_path=settings.classify_fast_path,
+    ).start()
+
+
+def open_classification_cache(settings: Settings) -> Optional[DiskCache]:
+    """Open the persistent classification cache, or return ``None`` if it is disabled."""
+    if settings.classify_cache_max_mb <= 0:
+        return None
+    return DiskCache(
+        os.path.join(settings.cache_dir, "classification"),
+        settings.classify_cache_max_mb * 1024 * 1024,
+        ttl_seconds=settings.classify_cache_ttl_hours * 3600 if settings.classify_cache_ttl_hours > 0 else None,
+    )
+
+
+def export_metrics(settings: Settings) -> None:
+    """Write the Prometheus text file if ``OCR_METRICS_FILE`` is configured."""
+    if settings.metrics_file:
+        try:
+            METRICS.write_prometheus(settings.metrics_file)
+        except OSError:
+            logging.exception("Failed to write metrics to %s", settings.metrics_file)
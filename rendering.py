@@ -0,0 +1,194 @@
+import logging
+import subprocess
+from typing import Dict, Iterator, List, Tuple
+
+from pdf2image import convert_from_bytes, pdfinfo_from_bytes
+from PIL import Image
+
+
+def count_pages(pdf_bytes: bytes) -> int:
+    """Return the number of pages in a PDF without rendering it."""
+    info = pdfinfo_from_bytes(pdf_bytes)
+    return int(info["Pages"])
+
+
+def page_windows(page_numbers: List[int], window: int) -> Iterator[Tuple[int, int]]:
+    """Group sorted page numbers into contiguous ``(first, last)`` runs of at most ``window`` pages."""
+    start = previous = None
+    for page_number in page_numbers:
+        if start is not None and page_number == previous + 1 and page_number - start < window:
+            previous = page_number
+            continue
+        if start is not None:
+            yield start, previous
+        start = previous = page_number
+    if start is not None:
+        yield start, previous
+
+
+def render_page_range(pdf_bytes: bytes, first_page: int, last_page: int, dpi: int = 200) -> List[Tuple[int, Image.Image]]:
+    """Render the inclusive one-based page range ``first_page``..``last_page`` in one poppler call."""
+    images = convert_from_bytes(pdf_bytes, dpi=dpi, first_page=first_page, last_page=last_page)
+    return list(enumerate(images, start=first_page))
+
+
+# pdftoppm output switch for each page format it can write
+PDFTOPPM_FORMATS = {
+    "JPEG": "-jpeg",
+    "PNG": "-png",
+}
+
+
+def _png_end(data: bytes, start: int) -> int:
+    # Chunks are length, type, payload and CRC; the image ends after IEND
+    position = start + 8
+    while position + 8 <= len(data):
+        length = int.from_bytes(data[position:position + 4], "big")
+        chunk_type = data[position + 4:position + 8]
+        position += 12 + length
+        if chunk_type == b"IEND":
+            return position
+    raise ValueError("truncated PNG")
+
+
+def _jpeg_end(data: bytes, start: int) -> int:
+    # Walk the marker segments; entropy-coded data after SOS only contains
+    # 0xFF followed by a stuffed zero or a restart marker
+    position = start + 2
+    while position + 1 < len(data):
+        if data[position] != 0xFF:
+            raise ValueError(f"bad JPEG marker at byte {position}")
+        marker = data[position + 1]
+        if marker == 0xFF:
+            position += 1
+        elif marker == 0xD9:
+            return position + 2
+        elif 0xD0 <= marker <= 0xD7 or marker == 0x01:
+            position += 2
+        else:
+            position += 2 + int.from_bytes(data[position + 2:position + 4], "big")
+            if marker == 0xDA:
+                while True:
+                    position = data.find(b"\xff", position)
+                    if position < 0 or position + 1 >= len(data):
+                        raise ValueError("truncated JPEG")
+                    following = data[position + 1]
+                    if following != 0x00 and not 0xD0 <= following <= 0xD7:
+                        break
+                    position += 2
+    raise ValueError("truncated JPEG")
+
+
+def split_images(data: bytes, image_format: str) -> List[bytes]:
+    """Split the concatenated JPEG or PNG files ``pdftoppm`` writes to stdout."""
+    find_end = _jpeg_end if image_format.upper() == "JPEG" else _png_end
+    images = []
+    position = 0
+    while position < len(data):
+        end = find_end(data, position)
+        images.append(data[position:end])
+        position = end
+    return images
+
+
+def render_page_bytes(
+    pdf_bytes: bytes,
+    first_page: int,
+    last_page: int,
+    dpi: int = 200,
+    image_format: str = "JPEG",
+    quality: int = 75,
+    grayscale: bool = False,
+    timeout: float = 300,
+) -> List[Tuple[int, bytes]]:
+    """Render a page range straight to encoded image bytes with ``pdftoppm``.
+
+    Unlike :func:`render_page_range` no PIL image is built: poppler writes
+    the final JPEG or PNG and the bytes are read back as they are. The PDF
+    is fed on stdin and the pages are read from stdout, so nothing is
+    written to disk. Each call is its own process, so render workers
+    running in parallel use separate cores.
+
+    Parameters
+    ----------
+    pdf_bytes : bytes
+        Raw PDF content.
+    first_page, last_page : int
+        Inclusive one-based page range.
+    dpi : int
+        Rendering resolution.
+    image_format : str
+        ``JPEG`` or ``PNG``.
+    quality : int
+        JPEG quality.
+    grayscale : bool
+        Render 8-bit grayscale.
+    timeout : float
+        Seconds before the ``pdftoppm`` process is killed.
+
+    Returns
+    -------
+    list of (int, bytes)
+        One-based page number and the encoded page, in page order.
+    """
+    switch = PDFTOPPM_FORMATS[image_format.upper()]
+    args = ["pdftoppm", "-r", str(dpi), "-f", str(first_page), "-l", str(last_page), switch]
+    if switch == "-jpeg":
+        args += ["-jpegopt", f"quality={quality}"]
+    if grayscale:
+        args.append("-gray")
+    try:
+        # "-" reads the PDF from stdin; without an output root every page goes to stdout
+        result = subprocess.run(args + ["-"], input=pdf_bytes, capture_output=True, check=True, timeout=timeout)
+    except FileNotFoundError as e:
+        raise RuntimeError("pdftoppm not found, is poppler installed and on PATH?") from e
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"pdftoppm (poppler) failed: {e.stderr.decode('utf-8', errors='replace').strip()}") from e
+    try:
+        images = split_images(result.stdout, image_format)
+    except ValueError as e:
+        raise RuntimeError(f"Could not split pdftoppm output: {e}") from e
+    if len(images) != last_page - first_page + 1:
+        raise RuntimeError(f"pdftoppm returned {len(images)} pages for pages {first_page}-{last_page}")
+    return list(enumerate(images, start=first_page))
+
+
+def extract_text_layer(pdf_bytes: bytes) -> List[str]:
+    """Return the embedded text of every page using poppler's ``pdftotext``.
+
+    Scanned PDFs come back as empty strings. Any failure (missing binary,
+    malformed PDF) is logged and yields an empty list so callers fall back
+    to OCR.
+    """
+    try:
+        # PDF on stdin, text on stdout; nothing is written to disk
+        result = subprocess.run(
+            ["pdftotext", "-layout", "-enc", "UTF-8", "-", "-"],
+            input=pdf_bytes,
+            capture_output=True,
+            check=True,
+            timeout=120,
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        logging.warning("Text layer extraction failed: %s", e)
+        return []
+    # pdftotext terminates every page with a form feed
+    pages = result.stdout.decode("utf-8", errors="replace").split("\f")
+    return pages[:-1] if pages and not pages[-1].strip() else pages
+
+
+def text_layer_pages(pdf_bytes: bytes, min_chars: int) -> Dict[int, str]:
+    """Pages whose embedded text has at least ``min_chars`` non-whitespace characters.
+
+    Returns
+    -------
+    dict
+        One-based page number to the page's embedded text.
+    """
+    if min_chars <= 0:
+        return {}
+    return {
+        page_number: text.strip()
+        for page_number, text in enumerate(extract_text_layer(pdf_bytes), start=1)
+        if len("".join(text.split())) >= min_chars
+    }
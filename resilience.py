@@ -0,0 +1,195 @@
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional, TypeVar
+
+try:
+    import httpx
+except ImportError:  # httpx ships with the Mistral and OpenAI SDKs
+    httpx = None
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+# Statuses that reject the content of one request, not the caller or the service
+REJECTED_STATUS = {400, 413, 415, 422}
+
+
+def status_code(error: BaseException) -> Optional[int]:
+    """HTTP status carried by an SDK or httpx error, if any."""
+    for source in (error, getattr(error, "raw_response", None), getattr(error, "response", None)):
+        code = getattr(source, "status_code", None)
+        if isinstance(code, int):
+            return code
+    return None
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Parse the ``Retry-After`` header (seconds or HTTP date) of a failed response."""
+    for source in (error, getattr(error, "raw_response", None), getattr(error, "response", None)):
+        headers = getattr(source, "headers", None)
+        if not headers:
+            continue
+        value = headers.get("Retry-After") or headers.get("retry-after")
+        if not value:
+            continue
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+def is_throttled(error: BaseException) -> bool:
+    """Whether the API rejected the request for rate or capacity reasons."""
+    return status_code(error) in (429, 503)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether ``error`` is transient: throttling, 5xx, timeouts or connection failures."""
+    code = status_code(error)
+    if code is not None:
+        return code in RETRYABLE_STATUS
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if httpx is not None and isinstance(error, httpx.TransportError):
+        return True
+    return "timeout" in str(error).lower()
+
+
+def is_rejected(error: BaseException) -> bool:
+    """Whether the API refused this request's payload, e.g. a malformed or oversized page.
+
+    Retrying cannot help, but other requests with different payloads may
+    still succeed, unlike authentication or permission errors.
+    """
+    return status_code(error) in REJECTED_STATUS
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Jittered exponential backoff.
+
+    Attributes
+    ----------
+    max_attempts : int
+        Total attempts per request, including the first.
+    base_delay : float
+        Backoff before the second attempt, in seconds; doubles every attempt.
+    max_delay : float
+        Upper bound on any single backoff, including ``Retry-After``.
+    """
+
+    max_attempts: int = 5
+    base_delay: float = 0.5
+    max_delay: float = 30.0
+
+    def backoff(self, attempt: int, error: Optional[BaseException] = None) -> float:
+        """Delay before retry number ``attempt`` (1-based), honouring ``Retry-After``."""
+        retry_after = retry_after_seconds(error) if error is not None else None
+        if retry_after is not None:
+            return min(self.max_delay, retry_after)
+        # Full jitter keeps concurrent workers from retrying in lockstep
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class AdaptiveConcurrency:
+    """AIMD concurrency limit shared by every request to one API.
+
+    The limit grows by one after each window of ``limit`` consecutive
+    successes and halves whenever the API throttles, so throughput settles
+    near the highest rate the API sustains.
+
+    Parameters
+    ----------
+    initial : int
+        Starting limit.
+    minimum : int
+        Floor the limit never drops below.
+    maximum : int
+        Ceiling the limit never grows past.
+    """
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: Optional[int] = None):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum if maximum is not None else initial)
+        self.limit = float(min(self.maximum, max(self.minimum, initial)))
+        self.in_flight = 0
+        self._successes = 0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        """Block until a request slot is free under the current limit."""
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, throttled: bool = False) -> None:
+        """Return a slot and adjust the limit from the request outcome."""
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit / 2)
+                self._successes = 0
+            else:
+                self._successes += 1
+                if self._successes >= int(self.limit):
+                    self.limit = min(self.maximum, self.limit + 1)
+                    self._successes = 0
+            self._condition.notify_all()
+
+
+def call_with_retries(
+    fn: Callable[[], T],
+    policy: RetryPolicy,
+    concurrency: Optional[AdaptiveConcurrency] = None,
+    on_retry: Optional[Callable[[int, BaseException, float], None]] = None,
+) -> T:
+    """Call ``fn`` until it succeeds, retrying transient failures with backoff.
+
+    Parameters
+    ----------
+    fn : callable
+        The request to make.
+    policy : RetryPolicy
+        Attempt limit and backoff schedule.
+    concurrency : AdaptiveConcurrency, optional
+        Shared limit acquired around every attempt and fed its outcome.
+    on_retry : callable, optional
+        Called as ``on_retry(attempt, error, delay)`` before sleeping.
+
+    Raises
+    ------
+    Exception
+        The last error once attempts are exhausted, or immediately for
+        non-retryable errors.
+    """
+    attempt = 1
+    while True:
+        if concurrency is not None:
+            concurrency.acquire()
+        throttled = False
+        try:
+            return fn()
+        except Exception as e:
+            throttled = is_throttled(e)
+            if attempt >= policy.max_attempts or not is_retryable(e):
+                raise
+            delay = policy.backoff(attempt, e)
+            logging.warning("Request failed (attempt %d/%d), retrying in %.1fs: %s", attempt, policy.max_attempts, delay, e)
+            if on_retry is not None:
+                on_retry(attempt, e, delay)
+        finally:
+            if concurrency is not None:
+                concurrency.release(throttled=throttled)
+        time.sleep(delay)
+        attempt += 1
@@ -0,0 +1,832 @@
+import hashlib
+import json
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# JSON structure the classifier fills in for every loan application
+CLASSIFICATION_JSON_STRUCTURE = r'''
+{
+  "111": {
+    "type": "string",
+    "description": "Unknown purpose, single character string."
+  },
+  "ACTIVIDAD_PRESTAMO": {
+    "type": "string",
+    "description": "Purpose of the loan, e.g., 'Uso personal' (Personal use)."
+  },
+  "ANO_VEHICULO": {
+    "type": "integer",
+    "description": "Year of the vehicle being acquired with the loan."
+  },
+  "AÑO_VEHICULO_PROPIO": {
+    "type": "string",
+    "description": "Year of a vehicle already owned by the applicant."
+  },
+  "BANCO1": {
+    "type": "string",
+    "description": "Name of the first bank."
+  },
+  "BANCO2": {
+    "type": "string",
+    "description": "Name of the second bank."
+  },
+  "BANCO3": {
+    "type": "string",
+    "description": "Name of the third bank."
+  },
+  "BIENES_INMUEBLES_APARTAMENTO": {
+    "type": "string",
+    "description": "Indicates if the applicant owns an apartment."
+  },
+  "BIENES_INMUEBLES_CASAS": {
+    "type": "string",
+    "description": "Indicates if the applicant owns a house."
+  },
+  "BIENES_INMUEBLES_SOLARES": {
+    "type": "string",
+    "description": "Indicates if the applicant owns land plots."
+  },
+  "BURO_CLIENTE_CONFIRMA": {
+    "type": "string",
+    "description": "Confirmation from the credit bureau, e.g., 'SI'."
+  },
+  "CALLE": {
+    "type": "string",
+    "description": "Street name of the applicant's address."
+  },
+  "CANTIDAD_EMPLEADOS": {
+    "type": "string",
+    "description": "Number of employees if applicable (e.g., for self-employment)."
+  },
+  "CARGO_OCUPA": {
+    "type": "string",
+    "description": "Job title or position held by the applicant."
+  },
+  "CATEGORIA_OCUPACIONAL": {
+    "type": "object",
+    "description": "Categorization of the applicant's occupation.",
+    "properties": {
+      "codigo": {
+        "type": "string",
+        "description": "Code for the occupational category, e.g., 'Cuenta propia profesional'."
+      },
+      "descripcion": {
+        "type": "string",
+        "description": "Description of the occupational category, e.g., 'Cuenta propia profesional'."
+      }
+    }
+  },
+  "CEDULA": {
+    "type": "string",
+    "description": "Applicant's national identification number (Cedula)."
+  },
+  "CEDULA_CONYUGE": {
+    "type": "string",
+    "description": "Spouse's national identification number (Cedula)."
+  },
+  "CIUDAD": {
+    "type": "integer",
+    "description": "Code representing the applicant's city."
+  },
+  "CIUDADANIA_CONYUGE": {
+    "type": "string",
+    "description": "Spouse's citizenship."
+  },
+  "CONCEPTO_COBRAR": {
+    "type": "string",
+    "description": "Description of accounts receivable."
+  },
+  "CONCEPTO_INVERSIONES": {
+    "type": "string",
+    "description": "Description of investments."
+  },
+  "CONCEPTO_MOBILIARIO": {
+    "type": "string",
+    "description": "Description of furniture and fixtures."
+  },
+  "CONCEPTO_OTROS_COMPROMISOS_PAGOS": {
+    "type": "string",
+    "description": "Description of other financial commitments or payments."
+  },
+  "CORREO_ELECTRONICO": {
+    "type": "string",
+    "description": "Applicant's email address."
+  },
+  "CUANTO_PAGA_ALQUILER": {
+    "type": "string",
+    "description": "Monthly rent payment amount."
+  },
+  "CUENTA_COBRAR": {
+    "type": "string",
+    "description": "Amount of accounts receivable."
+  },
+  "CUENTABANCO1": {
+    "type": "string",
+    "description": "Account number for the first bank."
+  },
+  "CUENTABANCO2": {
+    "type": "string",
+    "description": "Account number for the second bank."
+  },
+  "CUENTABANCO3": {
+    "type": "string",
+    "description": "Account number for the third bank."
+  },
+  "DEPENDIENTES": {
+    "type": "string",
+    "description": "Number of dependents for the applicant."
+  },
+  "DEPENDIENTES_CONYUGE": {
+    "type": "string",
+    "description": "Number of dependents for the spouse."
+  },
+  "DESCRIPCION_OTROS_INGRESOS": {
+    "type": "string",
+    "description": "Description of other income sources."
+  },
+  "DIRECCION DE LA MADRE": {
+    "type": "string",
+    "description": "Mother's address."
+  },
+  "DIRECCION_PADRE": {
+    "type": "string",
+    "description": "Father's address."
+  },
+  "DIRECCION_REFERENCIA_PERSONAL": {
+    "type": "string",
+    "description": "Address of a personal reference."
+  },
+  "DIRRECCION_EMPLEO": {
+    "type": "string",
+    "description": "Applicant's employment address."
+  },
+  "DONDE_OTROS_COMPROMISO_PAGOS": {
+    "type": "string",
+    "description": "Institution or entity for other financial commitments/payments."
+  },
+  "EDIFICIO": {
+    "type": "string",
+    "description": "Building name or number of the applicant's address."
+  },
+  "EMAIL_CONYUGE": {
+    "type": "string",
+    "description": "Spouse's email address."
+  },
+  "ESTADO_CIVIL": {
+    "type": "string",
+    "description": "Applicant's marital status, e.g., 'S' (Soltero/Single)."
+  },
+  "FECHA_NACIMIENTO": {
+    "type": "string",
+    "format": "date-time",
+    "description": "Applicant's date of birth in ISO 8601 format."
+  },
+  "FECHA_NACIMIENTO_CONYUGE": {
+    "type": ["string", "null"],
+    "format": "date-time",
+    "description": "Spouse's date of birth in ISO 8601 format, or null if not applicable."
+  },
+  "GASTOS": {
+    "type": "string",
+    "description": "Applicant's monthly expenses."
+  },
+  "INDICICIO_ESTADUNIDENSE": {
+    "type": "string",
+    "description": "Indication of U.S. connections or status."
+  },
+  "INGRESOS": {
+    "type": "string",
+    "description": "Applicant's total monthly income."
+  },
+  "INGRESOS_EXTRAS": {
+    "type": "string",
+    "description": "Indicates if the applicant has extra income, e.g., 'No'."
+  },
+  "INTITUCION_PEP": {
+    "type": "string",
+    "description": "Institution related to Politically Exposed Person (PEP) status."
+  },
+  "LUGAR_NACIMIENTO": {
+    "type": "string",
+    "description": "Applicant's place of birth."
+  },
+  "LUGAR_NACIMIENTO_CONYUGE": {
+    "type": "string",
+    "description": "Spouse's place of birth."
+  },
+  "LUGAR_TRABAJO": {
+    "type": "string",
+    "description": "Applicant's place of work."
+  },
+  "LUGAR_TRABAJO_CONYUGE": {
+    "type": "string",
+    "description": "Spouse's place of work."
+  },
+  "MARCA_VEHICULO": {
+    "type": "integer",
+    "description": "Code representing the brand of the vehicle being acquired with the loan."
+  },
+  "MARCA_VEHICULO_PROPIO": {
+    "type": "string",
+    "description": "Brand of a vehicle already owned by the applicant."
+  },
+  "MESES": {
+    "type": "string",
+    "description": "Duration in months, likely for loan term or time in current residence/job."
+  },
+  "MODELO_VEHICULO": {
+    "type": "integer",
+    "description": "Code representing the model of the vehicle being acquired with the loan."
+  },
+  "MODELO_VEHICULO_PROPIO": {
+    "type": "string",
+    "description": "Model of a vehicle already owned by the applicant."
+  },
+  "MONTO_INICIAL": {
+    "type": "string",
+    "description": "Initial amount or down payment for the loan."
+  },
+  "MONTO_PRESTAMO": {
+    "type": "string",
+    "description": "Total loan amount."
+  },
+  "NACIONALIDAD": {
+    "type": "integer",
+    "description": "Code representing the applicant's nationality."
+  },
+  "NEGOCIO_PROPIO": {
+    "type": "string",
+    "description": "Indicates if the applicant has their own business, e.g., 'No'."
+  },
+  "NIVEL_EDUCATIVO": {
+    "type": "string",
+    "description": "Applicant's educational level."
+  },
+  "NIVEL_EDUCATIVO_CONYUGE": {
+    "type": "string",
+    "description": "Spouse's educational level."
+  },
+  "NOMBRE_BANCO1": {
+    "type": "string",
+    "description": "Full name of the first bank."
+  },
+  "NOMBRE_BANCO2": {
+    "type": "string",
+    "description": "Full name of the second bank."
+  },
+  "NOMBRE_BANCO3": {
+    "type": "string",
+    "description": "Full name of the third bank."
+  },
+  "NOMBRE_COMPLETO": {
+    "type": "string",
+    "description": "Applicant's full name."
+  },
+  "NOMBRE_DEL_CONYUGE": {
+    "type": "string",
+    "description": "Spouse's full name."
+  },
+  "NOMBRE_MADRE": {
+    "type": "string",
+    "description": "Mother's full name."
+  },
+  "NOMBRE_PADRE": {
+    "type": "string",
+    "description": "Father's full name."
+  },
+  "NOMBRE_PEP": {
+    "type": "string",
+    "description": "Name of the Politically Exposed Person (PEP)."
+  },
+  "NOMBRE_REFERENCIA_COMERCIAL_1": {
+    "type": "string",
+    "description": "Name of the first commercial reference."
+  },
+  "NOMBRE_REFERENCIA_COMERCIAL_2": {
+    "type": "string",
+    "description": "Name of the second commercial reference."
+  },
+  "NOMBRE_REFERENCIA_PERSONAL": {
+    "type": "string",
+    "description": "Name of a personal reference."
+  },
+  "NUMERO_CASA_APATAMENTO": {
+    "type": "string",
+    "description": "House or apartment number of the applicant's address."
+  },
+  "OCUPACION": {
+    "type": "integer",
+    "description": "Code representing the applicant's occupation."
+  },
+  "OCUPACION_CONYUGE": {
+    "type": "string",
+    "description": "Spouse's occupation."
+  },
+  "OTRA_CIUDADANIA_DOCUMENTO": {
+    "type": "string",
+    "description": "Document number for another citizenship."
+  },
+  "OTRA_CIUDADANIA_FECHA_EMISIÓN": {
+    "type": ["string", "null"],
+    "format": "date-time",
+    "description": "Issue date of the other citizenship document, or null if not applicable."
+  },
+  "OTRA_CIUDADANIA_FECHA_VENCIMIENTO": {
+    "type": ["string", "null"],
+    "format": "date-time",
+    "description": "Expiration date of the other citizenship document, or null if not applicable."
+  },
+  "OTRA_CIUDADANIA_STATUS": {
+    "type": "string",
+    "description": "Status of other citizenship."
+  },
+  "OTRA_CIUDADANIA_TIPO_DOCUMENTO": {
+    "type": "string",
+    "description": "Type of document for another citizenship."
+  },
+  "OTROS INGRESOS": {
+    "type": "string",
+    "description": "General field for other income."
+  },
+  "OTROS_INGRESOS": {
+    "type": ["string", "null"],
+    "description": "Other income sources, or null if not applicable."
+  },
+  "PAIS_DE_REESIDENCIA": {
+    "type": "integer",
+    "description": "Code representing the applicant's country of residence."
+  },
+  "PAIS_OTRA_CIUDADANIA": {
+    "type": "string",
+    "description": "Country of other citizenship."
+  },
+  "PAISBANCO1": {
+    "type": "string",
+    "description": "Country of the first bank."
+  },
+  "PAISBANCO2": {
+    "type": "string",
+    "description": "Country of the second bank."
+  },
+  "PAISBANCO3": {
+    "type": "string",
+    "description": "Country of the third bank."
+  },
+  "PARENTEZO_PEP": {
+    "type": "string",
+    "description": "Relationship to the Politically Exposed Person (PEP)."
+  },
+  "PASSAPORTE_CONYUGE": {
+    "type": "string",
+    "description": "Spouse's passport number."
+  },
+  "PEP_CARGO": {
+    "type": "string",
+    "description": "Position held by the Politically Exposed Person (PEP)."
+  },
+  "PRECIO_VEHICULO": {
+    "type": "string",
+    "description": "Price of the vehicle being acquired with the loan."
+  },
+  "PROVINCIA": {
+    "type": "integer",
+    "description": "Code representing the applicant's province."
+  },
+  "REF_POR_DEALER": {
+    "type": "string",
+    "description": "Indicates if the applicant was referred by a dealer, e.g., 'No'."
+  },
+  "REFENCIAS_BANCARIAS": {
+    "type": "string",
+    "description": "General field for bank references."
+  },
+  "REFERENCIA_FINANCIERA": {
+    "type": "string",
+    "description": "General field for financial references."
+  },
+  "RELACION_REFERENCIA": {
+    "type": "string",
+    "description": "Relationship to the personal reference."
+  },
+  "SECTOR": {
+    "type": "string",
+    "description": "Neighborhood or sector of the applicant's address."
+  },
+  "SELECCION_VEHICULO": {
+    "type": "string",
+    "description": "Indicates if a vehicle has been selected, e.g., 'Si'."
+  },
+  "SEXO": {
+    "type": "string",
+    "description": "Applicant's gender, e.g., 'M' (Male)."
+  },
+  "SEXO_CONYUGE": {
+    "type": "string",
+    "description": "Spouse's gender."
+  },
+  "TASA_INTERES": {
+    "type": "string",
+    "description": "Interest rate for the loan."
+  },
+  "TELEFONO_CASA": {
+    "type": "string",
+    "description": "Applicant's home phone number."
+  },
+  "TELEFONO_CELULAR": {
+    "type": "string",
+    "description": "Applicant's cell phone number."
+  },
+  "TELEFONO_CONYUGE": {
+    "type": "string",
+    "description": "Spouse's phone number."
+  },
+  "TELEFONO_MADRE": {
+    "type": "string",
+    "description": "Mother's phone number."
+  },
+  "TELEFONO_PADRE": {
+    "type": "string",
+    "description": "Father's phone number."
+  },
+  "TELEFONO_REFERENCIA_COMERCIAL_1": {
+    "type": "string",
+    "description": "Phone number of the first commercial reference."
+  },
+  "TELEFONO_REFERENCIA_COMERCIAL_2": {
+    "type": "string",
+    "description": "Phone number of the second commercial reference."
+  },
+  "TELEFONO_REFERENCIA_PERSONAL": {
+    "type": "string",
+    "description": "Phone number of a personal reference."
+  },
+  "TELEFONO_TRABAJO": {
+    "type": "string",
+    "description": "Applicant's work phone number."
+  },
+  "TIEMPO_LABORANDO": {
+    "type": "integer",
+    "description": "Time (likely in years or months) working at current job."
+  },
+  "TIEMPO_NEGOCIO_PROPIO": {
+    "type": "string",
+    "description": "Time (likely in years or months) operating own business."
+  },
+  "TIEMPO_VIVIENDA": {
+    "type": "string",
+    "description": "Time (likely in years or months) at current residence."
+  },
+  "TIENE_CONYUGE": {
+    "type": "string",
+    "description": "Indicates if the applicant has a spouse."
+  },
+  "TIENE_INMUEBLES": {
+    "type": "string",
+    "description": "Indicates if the applicant owns real estate."
+  },
+  "TIENE_INVERSIONES": {
+    "type": "string",
+    "description": "Indicates if the applicant has investments."
+  },
+  "TIENE_MOBILIARIO": {
+    "type": "string",
+    "description": "Indicates if the applicant owns furniture/fixtures."
+  },
+  "TIENE_OTROS_COMPROMISOS_PAGO": {
+    "type": "string",
+    "description": "Indicates if the applicant has other financial commitments/payments."
+  },
+  "TIENE_REFERECIA_COMERCIAL": {
+    "type": "string",
+    "description": "Indicates if the applicant has commercial references."
+  },
+  "TIENE_REFERENCIA_PERSONALES": {
+    "type": "string",
+    "description": "Indicates if the applicant has personal references."
+  },
+  "TIENE_VEHICULO": {
+    "type": "string",
+    "description": "Indicates if the applicant owns a vehicle."
+  },
+  "TIPO_CUENTA_BANCO1": {
+    "type": "string",
+    "description": "Type of account for the first bank."
+  },
+  "TIPO_CUENTA_BANCO2": {
+    "type": "string",
+    "description": "Type of account for the second bank."
+  },
+  "TIPO_CUENTA_BANCO3": {
+    "type": "string",
+    "description": "Type of account for the third bank."
+  },
+  "TIPO_EMPLEO": {
+    "type": "integer",
+    "description": "Code representing the type of employment."
+  },
+  "TIPO_PERSONA": {
+    "type": "string",
+    "description": "Type of person, e.g., 'PF' (Persona Física/Individual)."
+  },
+  "TIPO_VEHICULO_CAMIONETAS": {
+    "type": "string",
+    "description": "Indicates if the vehicle is a pickup truck."
+  },
+  "TIPO_VEHICULO_CARROS": {
+    "type": "string",
+    "description": "Indicates if the vehicle is a car."
+  },
+  "TIPO_VEHICULO_JEEPETAS": {
+    "type": "string",
+    "description": "Indicates if the vehicle is an SUV."
+  },
+  "TRABAJA_ACTUALMENTE": {
+    "type": "string",
+    "description": "Indicates if the applicant is currently working, e.g., 'No'."
+  },
+  "TRABAJA_CONYUGE": {
+    "type": "string",
+    "description": "Indicates if the spouse is currently working."
+  },
+  "VALOR_COBRAR": {
+    "type": ["string", "null"],
+    "description": "Value of accounts receivable, or null if not applicable."
+  },
+  "VALOR_INMUBLES": {
+    "type": ["string", "null"],
+    "description": "Value of real estate owned, or null if not applicable."
+  },
+  "VALOR_INVERSIONES": {
+    "type": ["string", "null"],
+    "description": "Value of investments, or null if not applicable."
+  },
+  "VALOR_MOBILIARIO": {
+    "type": ["string", "null"],
+    "description": "Value of furniture and fixtures, or null if not applicable."
+  },
+  "VALOR_OTROS_COMPROMISOS_DE_PAGO": {
+    "type": ["string", "null"],
+    "description": "Value of other financial commitments/payments, or null if not applicable."
+  },
+  "VALOR_VEHICULO_PROPIO": {
+    "type": ["string", "null"],
+    "description": "Value of a vehicle already owned by the applicant, or null if not applicable."
+  },
+  "VEHICULO_NUEVO_USADO": {
+    "type": "string",
+    "description": "Condition of the vehicle (new or used), e.g., 'Usado' (Used)."
+  },
+  "VENTAS_MENSUALES": {
+    "type": "string",
+    "description": "Monthly sales, likely for self-employed individuals."
+  }
+}
+'''
+
+
+# Date layouts seen in Dominican application forms and model output, tried in order
+DATE_FORMATS = (
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%dT%H:%M:%SZ",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d",
+    "%d/%m/%Y",
+    "%d-%m-%Y",
+    "%d.%m.%Y",
+    "%d/%m/%y",
+    "%Y/%m/%d",
+)
+
+# Dominican forms group thousands with "," and write decimals with ".", so
+# "1,500" and "1,500.00" are 1500 while "1.500" is one and a half
+_INTEGER = re.compile(r"^([+-]?(?:\d{1,3}(?:,\d{3})+|\d+))(?:\.(\d+))?$")
+
+Coercer = Callable[[Any, str, List[str]], Any]
+
+
+class _Invalid(Exception):
+    pass
+
+
+def _coerce_string(value: Any) -> Any:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float, bool)):
+        return str(value)
+    raise _Invalid
+
+
+def _coerce_integer(value: Any) -> Any:
+    if isinstance(value, bool):
+        raise _Invalid
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    match = _INTEGER.match(value.strip()) if isinstance(value, str) else None
+    # A decimal part is only accepted when it is zero; "1.5" is not an integer
+    if match and not (match.group(2) or "0").strip("0"):
+        return int(match.group(1).replace(",", ""))
+    raise _Invalid
+
+
+def _coerce_number(value: Any) -> Any:
+    if isinstance(value, bool):
+        raise _Invalid
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        try:
+            return float(value.strip().replace(",", ""))
+        except ValueError:
+            pass
+    raise _Invalid
+
+
+def _coerce_boolean(value: Any) -> Any:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in ("si", "sí", "true", "yes"):
+        return True
+    if isinstance(value, str) and value.strip().lower() in ("no", "false"):
+        return False
+    raise _Invalid
+
+
+def _coerce_datetime(value: Any) -> Any:
+    if not isinstance(value, str):
+        raise _Invalid
+    text = value.strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).strftime("%Y-%m-%dT%H:%M:%S")
+        except ValueError:
+            continue
+    raise _Invalid
+
+
+_SCALAR_COERCERS = {
+    "string": _coerce_string,
+    "integer": _coerce_integer,
+    "number": _coerce_number,
+    "boolean": _coerce_boolean,
+}
+
+
+@dataclass(frozen=True)
+class FieldSpec:
+    """A compiled schema field.
+
+    Attributes
+    ----------
+    name : str
+        Field name.
+    types : tuple of str
+        Allowed JSON types, e.g. ``("string", "null")``.
+    format : str, optional
+        String format such as ``date-time``.
+    description : str
+        Human-readable description from the schema.
+    properties : dict
+        Nested fields of ``object`` types.
+    """
+
+    name: str
+    types: Tuple[str, ...]
+    format: Optional[str] = None
+    description: str = ""
+    properties: Dict[str, "FieldSpec"] = field(default_factory=dict)
+
+    @property
+    def nullable(self) -> bool:
+        return "null" in self.types
+
+
+def _compile_field(name: str, spec: Dict[str, Any]) -> Tuple[FieldSpec, Coercer]:
+    raw_type = spec.get("type", "string")
+    types = tuple(raw_type) if isinstance(raw_type, list) else (raw_type,)
+    field_spec = FieldSpec(
+        name=name,
+        types=types,
+        format=spec.get("format"),
+        description=spec.get("description", ""),
+        properties={key: _compile_field(key, value)[0] for key, value in spec.get("properties", {}).items()},
+    )
+
+    # Pick the converters once, at compile time, so validation is a plain function call per field
+    converters: List[Callable[[Any], Any]] = []
+    nested: Dict[str, Coercer] = {}
+    for json_type in types:
+        if json_type == "string" and field_spec.format == "date-time":
+            converters.append(_coerce_datetime)
+        elif json_type in _SCALAR_COERCERS:
+            converters.append(_SCALAR_COERCERS[json_type])
+        elif json_type == "object":
+            nested = {key: _compile_field(key, value)[1] for key, value in spec.get("properties", {}).items()}
+
+    def coerce(value: Any, path: str, errors: List[str]) -> Any:
+        if value is None:
+            return None
+        if nested and isinstance(value, dict):
+            return {key: nested[key](item, f"{path}.{key}", errors) if key in nested else item
+                    for key, item in value.items()}
+        for converter in converters:
+            try:
+                return converter(value)
+            except _Invalid:
+                continue
+        # Keep what the model said; the error records that it does not fit the schema
+        errors.append(f"{path}: cannot coerce {value!r} to {'/'.join(types)}")
+        return value
+
+    return field_spec, coerce
+
+
+@dataclass
+class ValidationResult:
+    """Outcome of validating one classification result.
+
+    Attributes
+    ----------
+    value : dict
+        The result with every schema field coerced to its declared type.
+        Values that could not be coerced are kept as returned and reported
+        in ``errors``; keys that are not in the schema are passed through
+        unchanged.
+    errors : list of str
+        One message per value that could not be coerced, naming the field
+        and the raw value.
+    missing : list of str
+        Schema fields absent from the result.
+    extra : list of str
+        Result keys that are not in the schema.
+    """
+
+    value: Dict[str, Any]
+    errors: List[str] = field(default_factory=list)
+    missing: List[str] = field(default_factory=list)
+    extra: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+class CompiledSchema:
+    """Classification schema parsed once into per-field coercers.
+
+    Parameters
+    ----------
+    json_schema : str
+        Schema in the ``CLASSIFICATION_JSON_STRUCTURE`` layout: a JSON object
+        mapping field names to ``{"type", "description", ...}``.
+    """
+
+    def __init__(self, json_schema: str):
+        self.raw: Dict[str, Any] = json.loads(json_schema)
+        self.fingerprint = hashlib.sha256(
+            json.dumps(self.raw, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+        self.fields: Dict[str, FieldSpec] = {}
+        self._coercers: Dict[str, Coercer] = {}
+        for name, spec in self.raw.items():
+            self.fields[name], self._coercers[name] = _compile_field(name, spec)
+
+    def subset(self, names: Iterable[str]) -> str:
+        """JSON text of the schema restricted to ``names``."""
+        return json.dumps({name: self.raw[name] for name in names if name in self.raw}, ensure_ascii=False, indent=2)
+
+    def validate(self, result: Dict[str, Any]) -> ValidationResult:
+        """Coerce ``result`` to the schema and report problems."""
+        if not isinstance(result, dict):
+            return ValidationResult(value={}, errors=[f"expected an object, got {type(result).__name__}"])
+        errors: List[str] = []
+        value: Dict[str, Any] = {}
+        extra: List[str] = []
+        coercers = self._coercers
+        for key, item in result.items():
+            coerce = coercers.get(key)
+            if coerce is None:
+                extra.append(key)
+                value[key] = item
+            else:
+                value[key] = coerce(item, key, errors)
+        missing = [name for name in self.fields if name not in result]
+        return ValidationResult(value=value, errors=errors, missing=missing, extra=extra)
+
+    def validate_many(self, results: Iterable[Dict[str, Any]]) -> List[ValidationResult]:
+        """Validate many results against the already-compiled schema."""
+        validate = self.validate
+        return [validate(result) for result in results]
+
+
+@lru_cache(maxsize=8)
+def compile_schema(json_schema: str) -> CompiledSchema:
+    """Compile ``json_schema``, reusing the compiled form for repeated calls with the same text."""
+    return CompiledSchema(json_schema)
+
+
+COMPILED_SCHEMA = compile_schema(CLASSIFICATION_JSON_STRUCTURE)
@@ -0,0 +1,346 @@
+import os
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Pattern, Tuple
+
+
+def _env_int(name: str, default: int) -> int:
+    """Read an integer setting from the environment, falling back to ``default``."""
+    value = os.environ.get(name, "").strip()
+    return int(value) if value else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    """Read a boolean setting (``1``/``true``/``yes``) from the environment."""
+    value = os.environ.get(name, "").strip().lower()
+    return value in ("1", "true", "yes", "on") if value else default
+
+
+def _env_str(name: str, default: str) -> str:
+    """Read a string setting from the environment, falling back to ``default``."""
+    return os.environ.get(name, "").strip() or default
+
+
+def _env_float(name: str, default: float) -> float:
+    """Read a float setting from the environment, falling back to ``default``."""
+    value = os.environ.get(name, "").strip()
+    return float(value) if value else default
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Per-deployment tuning knobs for the OCR pipeline.
+
+    Attributes
+    ----------
+    render_dpi : int
+        Resolution used when rasterizing PDF pages.
+    render_dpi_ladder : str
+        Comma-separated resolutions for adaptive rendering, e.g. ``100,200``.
+        Pages are rendered at the first and re-rendered at the next only if
+        their OCR text fails the quality checks. Empty renders every page at
+        ``render_dpi``.
+    quality_min_chars : int
+        OCR text with fewer non-whitespace characters fails the quality check.
+    quality_max_garbage_ratio : float
+        Largest tolerated share of unexpected symbols in OCR text.
+    quality_markers : str
+        Regular expression (case-insensitive) a usable page must match. Empty
+        disables the check.
+    renderer : str
+        ``pdf2image`` renders PIL images that are then encoded; ``pdftoppm``
+        has poppler write the final JPEG/PNG bytes directly, with render
+        workers running separate processes in parallel and the PDF and
+        pages passed over pipes, never through disk. WEBP pages always
+        use ``pdf2image``.
+    render_window : int
+        Number of pages poppler renders per call. At most this many page
+        images are held in memory at once.
+    render_workers : int
+        Threads running poppler in parallel, each on its own page window.
+    encode_workers : int
+        Threads encoding rendered pages.
+    stage_queue_size : int
+        Capacity of the queue in front of every pipeline stage.
+    ocr_max_in_flight : int
+        Maximum number of concurrent OCR requests per document.
+    ocr_global_in_flight : int
+        Concurrent OCR requests across every document in the process that
+        uses the same API key. ``0`` uses ``ocr_max_in_flight`` with
+        adaptive concurrency and no global cap without it.
+    ocr_rate_limit : float
+        OCR requests per second allowed across the whole process. ``0``
+        disables rate limiting.
+    ocr_burst : float
+        Token bucket capacity, i.e. how many requests may be sent back to back.
+    ocr_max_attempts : int
+        Attempts per OCR request, including the first.
+    ocr_backoff_base : float
+        Initial retry backoff in seconds, doubled on every attempt.
+    ocr_backoff_max : float
+        Longest single backoff, including server ``Retry-After`` values.
+    ocr_adaptive_concurrency : bool
+        Shrink the number of in-flight OCR requests when the API throttles
+        and grow it back on success (AIMD), up to ``ocr_max_in_flight``.
+    ocr_failed_page_passes : int
+        Extra passes over pages that still failed after their retries.
+    ocr_batch_pages : int
+        Rendered pages combined into one multi-page PDF per OCR request.
+        ``1`` sends every page on its own.
+    ocr_batch_max_bytes : int
+        Upper bound on the image bytes of one batched request; batches are
+        cut short before exceeding it.
+    page_format : str
+        Image format pages are encoded with (``JPEG``, ``PNG`` or ``WEBP``).
+    page_quality : int
+        Starting encoder quality for lossy formats.
+    page_grayscale : bool
+        Convert pages to grayscale before encoding.
+    page_max_bytes : int
+        Per-page payload target in bytes. ``0`` disables the budget.
+    page_blank_ink_ratio : float
+        Rendered pages with at most this fraction of ink pixels (clearly
+        darker than the paper) are treated as blank and skipped. Two lines
+        of text measure several times the default. ``0`` disables blank
+        detection.
+    page_dedupe : bool
+        Let a page with pixels identical to an earlier page's reuse its OCR
+        text instead of making a request. Off by default.
+    page_index_max_entries : int
+        Pages remembered by a session's deduplication index. ``0`` keeps
+        every page.
+    ingest_mode : str
+        ``image`` renders and uploads every page as an image; ``native``
+        submits the PDF itself and only renders pages the endpoint fails on.
+    native_pages_per_request : int
+        Page-range slice size in native mode. ``0`` sends one request.
+    text_layer_min_chars : int
+        Pages whose embedded text layer has at least this many characters
+        are taken locally without OCR. ``0`` disables the check.
+    classify_mode : str
+        ``single`` sends the whole packet in one request; ``chunked`` splits
+        it by field group and page (map-reduce); ``incremental`` classifies
+        pages as OCR emits them and stops once the required fields are
+        filled.
+    classify_max_chunk_chars : int
+        Character budget of one chunked classification request.
+    classify_max_workers : int
+        Concurrent chunked classification requests.
+    classify_required_fields : str
+        Comma-separated fields that end incremental classification early
+        once filled. Empty classifies every page.
+    classify_min_confidence : float
+        Confidence a required field needs to count as filled.
+    classify_incremental_chars : int
+        Character budget of one incremental classification request.
+    classify_fast_path : bool
+        Fill pattern-shaped fields (cédula, phones, e-mails, dates, amounts,
+        bank accounts) locally with :mod:`fast_path` and ask the model only
+        for the rest.
+    classify_compact : bool
+        Strip repeated headers and footers, table formatting and whitespace
+        runs from the text before it is classified.
+    classify_max_tokens : int
+        Token budget of the classification input; the least informative
+        pages are dropped to fit. ``0`` disables the budget.
+    classify_token_model : str
+        Model whose tokenizer counts tokens (``tiktoken``, if installed).
+    classify_boilerplate_min_pages : int
+        Pages a line must repeat on to be stripped as boilerplate.
+    classify_cache_max_mb : int
+        Size bound of the classification cache in megabytes. ``0`` disables it.
+    classify_cache_ttl_hours : float
+        Age after which cached classifications expire. ``0`` keeps them
+        until evicted.
+    cache_dir : str
+        Directory of the persistent OCR cache.
+    cache_max_mb : int
+        Size bound of the OCR cache in megabytes. ``0`` disables caching.
+    metrics_file : str
+        Path of a Prometheus text file refreshed after every document.
+        Empty disables the export.
+    job_workers : int
+        Documents processed concurrently by the background job manager,
+        shared by every session. Page requests of documents with the
+        same API key share the ``ocr_global_in_flight`` budget.
+    job_retention_minutes : float
+        How long finished jobs stay available for collection.
+    job_poll_seconds : float
+        Interval between UI refreshes while jobs are running.
+    session_memory_mb : int
+        Resident OCR text allowed per session before documents are spilled
+        to disk. ``0`` disables the per-session cap.
+    memory_budget_mb : int
+        Resident OCR text allowed across all sessions. ``0`` disables it.
+    spill_dir : str
+        Root of the per-session spill directories.
+    spill_ttl_hours : float
+        Age after which spill directories left by dead sessions are swept.
+    http_max_connections : int
+        Connection pool size of each pooled API client. ``0`` sizes it to
+        the OCR concurrency: ``ocr_global_in_flight``, or else
+        ``ocr_max_in_flight`` for every job worker.
+    http_timeout_seconds : float
+        Read/write timeout of API requests.
+    http_connect_timeout_seconds : float
+        Timeout of opening a connection.
+    http_keepalive_seconds : float
+        How long idle connections are kept open for reuse.
+    client_idle_minutes : float
+        Pooled clients without a request for this long are closed. ``0``
+        keeps them for the life of the process.
+    """
+
+    render_dpi: int = 200
+    render_dpi_ladder: str = ""
+    quality_min_chars: int = 30
+    quality_max_garbage_ratio: float = 0.3
+    quality_markers: str = ""
+    renderer: str = "pdf2image"
+    render_window: int = 4
+    render_workers: int = 1
+    encode_workers: int = 2
+    stage_queue_size: int = 4
+    ocr_max_in_flight: int = 4
+    ocr_global_in_flight: int = 0
+    ocr_rate_limit: float = 0.0
+    ocr_burst: float = 4.0
+    ocr_max_attempts: int = 5
+    ocr_backoff_base: float = 0.5
+    ocr_backoff_max: float = 30.0
+    ocr_adaptive_concurrency: bool = True
+    ocr_failed_page_passes: int = 1
+    ocr_batch_pages: int = 1
+    ocr_batch_max_bytes: int = 10_000_000
+    page_format: str = "JPEG"
+    page_quality: int = 75
+    page_grayscale: bool = False
+    page_max_bytes: int = 0
+    page_blank_ink_ratio: float = 0.0003
+    page_dedupe: bool = False
+    page_index_max_entries: int = 256
+    ingest_mode: str = "image"
+    native_pages_per_request: int = 0
+    text_layer_min_chars: int = 200
+    classify_mode: str = "single"
+    classify_max_chunk_chars: int = 40_000
+    classify_max_workers: int = 6
+    classify_required_fields: str = (
+        "NOMBRE_COMPLETO,CEDULA,FECHA_NACIMIENTO,TELEFONO_CELULAR,INGRESOS,MONTO_PRESTAMO,PRECIO_VEHICULO"
+    )
+    classify_min_confidence: float = 0.8
+    classify_incremental_chars: int = 8_000
+    classify_fast_path: bool = True
+    classify_compact: bool = True
+    classify_max_tokens: int = 0
+    classify_token_model: str = "o1"
+    classify_boilerplate_min_pages: int = 3
+    classify_cache_max_mb: int = 256
+    classify_cache_ttl_hours: float = 168.0
+    cache_dir: str = os.path.join(os.path.expanduser("~"), ".cache", "ocr-fihogar")
+    cache_max_mb: int = 1024
+    metrics_file: str = ""
+    job_workers: int = 4
+    job_retention_minutes: float = 60.0
+    job_poll_seconds: float = 1.0
+    session_memory_mb: int = 32
+    memory_budget_mb: int = 256
+    spill_dir: str = os.path.join(os.path.expanduser("~"), ".cache", "ocr-fihogar", "sessions")
+    spill_ttl_hours: float = 24.0
+    http_max_connections: int = 0
+    http_timeout_seconds: float = 120.0
+    http_connect_timeout_seconds: float = 10.0
+    http_keepalive_seconds: float = 60.0
+    client_idle_minutes: float = 30.0
+
+    def dpi_ladder(self) -> Tuple[int, ...]:
+        """Resolutions to try, lowest first."""
+        ladder = sorted({int(dpi) for dpi in self.render_dpi_ladder.split(",") if dpi.strip()})
+        return tuple(ladder) or (self.render_dpi,)
+
+    def quality_markers_pattern(self) -> Optional[Pattern[str]]:
+        return re.compile(self.quality_markers, re.IGNORECASE) if self.quality_markers else None
+
+    def http_pool_size(self) -> int:
+        """Connections each pooled API client may hold."""
+        return self.http_max_connections or self.ocr_global_in_flight or self.ocr_max_in_flight * self.job_workers
+
+    def required_fields(self) -> List[str]:
+        """Fields that end incremental classification once filled."""
+        return [name.strip() for name in self.classify_required_fields.split(",") if name.strip()]
+
+    def render_fingerprint(self) -> str:
+        """Stable description of every setting that changes what is sent to OCR."""
+        return (
+            f"dpi={','.join(map(str, self.dpi_ladder()))};"
+            f"checks={self.quality_min_chars},{self.quality_max_garbage_ratio},{self.quality_markers};"
+            f"renderer={self.renderer};format={self.page_format};quality={self.page_quality};"
+            f"grayscale={self.page_grayscale};max_bytes={self.page_max_bytes};"
+            f"blank={self.page_blank_ink_ratio};dedupe={self.page_dedupe};"
+            f"mode={self.ingest_mode};text_layer={self.text_layer_min_chars}"
+        )
+
+
+def load_settings() -> Settings:
+    """Build :class:`Settings` from ``OCR_*`` environment variables."""
+    return Settings(
+        render_dpi=_env_int("OCR_RENDER_DPI", Settings.render_dpi),
+        render_dpi_ladder=_env_str("OCR_RENDER_DPI_LADDER", Settings.render_dpi_ladder),
+        quality_min_chars=_env_int("OCR_QUALITY_MIN_CHARS", Settings.quality_min_chars),
+        quality_max_garbage_ratio=_env_float("OCR_QUALITY_MAX_GARBAGE_RATIO", Settings.quality_max_garbage_ratio),
+        quality_markers=_env_str("OCR_QUALITY_MARKERS", Settings.quality_markers),
+        renderer=_env_str("OCR_RENDERER", Settings.renderer).lower(),
+        render_window=max(1, _env_int("OCR_RENDER_WINDOW", Settings.render_window)),
+        render_workers=max(1, _env_int("OCR_RENDER_WORKERS", Settings.render_workers)),
+        encode_workers=max(1, _env_int("OCR_ENCODE_WORKERS", Settings.encode_workers)),
+        stage_queue_size=max(1, _env_int("OCR_STAGE_QUEUE_SIZE", Settings.stage_queue_size)),
+        ocr_max_in_flight=max(1, _env_int("OCR_MAX_IN_FLIGHT", Settings.ocr_max_in_flight)),
+        ocr_global_in_flight=max(0, _env_int("OCR_GLOBAL_IN_FLIGHT", Settings.ocr_global_in_flight)),
+        ocr_rate_limit=_env_float("OCR_RATE_LIMIT", Settings.ocr_rate_limit),
+        ocr_burst=_env_float("OCR_BURST", Settings.ocr_burst),
+        ocr_max_attempts=max(1, _env_int("OCR_RETRY_MAX_ATTEMPTS", Settings.ocr_max_attempts)),
+        ocr_backoff_base=_env_float("OCR_RETRY_BACKOFF_BASE", Settings.ocr_backoff_base),
+        ocr_backoff_max=_env_float("OCR_RETRY_BACKOFF_MAX", Settings.ocr_backoff_max),
+        ocr_adaptive_concurrency=_env_bool("OCR_ADAPTIVE_CONCURRENCY", Settings.ocr_adaptive_concurrency),
+        ocr_failed_page_passes=_env_int("OCR_FAILED_PAGE_PASSES", Settings.ocr_failed_page_passes),
+        ocr_batch_pages=max(1, _env_int("OCR_BATCH_PAGES", Settings.ocr_batch_pages)),
+        ocr_batch_max_bytes=_env_int("OCR_BATCH_MAX_BYTES", Settings.ocr_batch_max_bytes),
+        page_format=_env_str("OCR_PAGE_FORMAT", Settings.page_format).upper(),
+        page_quality=_env_int("OCR_PAGE_QUALITY", Settings.page_quality),
+        page_grayscale=_env_bool("OCR_PAGE_GRAYSCALE", Settings.page_grayscale),
+        page_max_bytes=_env_int("OCR_PAGE_MAX_BYTES", Settings.page_max_bytes),
+        page_blank_ink_ratio=_env_float("OCR_PAGE_BLANK_INK_RATIO", Settings.page_blank_ink_ratio),
+        page_dedupe=_env_bool("OCR_PAGE_DEDUPE", Settings.page_dedupe),
+        page_index_max_entries=max(0, _env_int("OCR_PAGE_INDEX_MAX_ENTRIES", Settings.page_index_max_entries)),
+        ingest_mode=_env_str("OCR_INGEST_MODE", Settings.ingest_mode).lower(),
+        native_pages_per_request=_env_int("OCR_NATIVE_PAGES_PER_REQUEST", Settings.native_pages_per_request),
+        text_layer_min_chars=_env_int("OCR_TEXT_LAYER_MIN_CHARS", Settings.text_layer_min_chars),
+        classify_mode=_env_str("OCR_CLASSIFY_MODE", Settings.classify_mode).lower(),
+        classify_max_chunk_chars=_env_int("OCR_CLASSIFY_MAX_CHUNK_CHARS", Settings.classify_max_chunk_chars),
+        classify_max_workers=max(1, _env_int("OCR_CLASSIFY_MAX_WORKERS", Settings.classify_max_workers)),
+        classify_required_fields=_env_str("OCR_CLASSIFY_REQUIRED_FIELDS", Settings.classify_required_fields),
+        classify_min_confidence=_env_float("OCR_CLASSIFY_MIN_CONFIDENCE", Settings.classify_min_confidence),
+        classify_incremental_chars=_env_int("OCR_CLASSIFY_INCREMENTAL_CHARS", Settings.classify_incremental_chars),
+        classify_fast_path=_env_bool("OCR_CLASSIFY_FAST_PATH", Settings.classify_fast_path),
+        classify_compact=_env_bool("OCR_CLASSIFY_COMPACT", Settings.classify_compact),
+        classify_max_tokens=_env_int("OCR_CLASSIFY_MAX_TOKENS", Settings.classify_max_tokens),
+        classify_token_model=_env_str("OCR_CLASSIFY_TOKEN_MODEL", Settings.classify_token_model),
+        classify_boilerplate_min_pages=_env_int("OCR_CLASSIFY_BOILERPLATE_MIN_PAGES", Settings.classify_boilerplate_min_pages),
+        classify_cache_max_mb=_env_int("OCR_CLASSIFY_CACHE_MAX_MB", Settings.classify_cache_max_mb),
+        classify_cache_ttl_hours=_env_float("OCR_CLASSIFY_CACHE_TTL_HOURS", Settings.classify_cache_ttl_hours),
+        cache_dir=_env_str("OCR_CACHE_DIR", Settings.cache_dir),
+        cache_max_mb=_env_int("OCR_CACHE_MAX_MB", Settings.cache_max_mb),
+        metrics_file=_env_str("OCR_METRICS_FILE", Settings.metrics_file),
+        job_workers=max(1, _env_int("OCR_JOB_WORKERS", Settings.job_workers)),
+        job_retention_minutes=_env_float("OCR_JOB_RETENTION_MINUTES", Settings.job_retention_minutes),
+        job_poll_seconds=max(0.1, _env_float("OCR_JOB_POLL_SECONDS", Settings.job_poll_seconds)),
+        session_memory_mb=_env_int("OCR_SESSION_MEMORY_MB", Settings.session_memory_mb),
+        memory_budget_mb=_env_int("OCR_MEMORY_BUDGET_MB", Settings.memory_budget_mb),
+        spill_dir=_env_str("OCR_SPILL_DIR", Settings.spill_dir),
+        spill_ttl_hours=_env_float("OCR_SPILL_TTL_HOURS", Settings.spill_ttl_hours),
+        http_max_connections=_env_int("OCR_HTTP_MAX_CONNECTIONS", Settings.http_max_connections),
+        http_timeout_seconds=_env_float("OCR_HTTP_TIMEOUT_SECONDS", Settings.http_timeout_seconds),
+        http_connect_timeout_seconds=_env_float("OCR_HTTP_CONNECT_TIMEOUT_SECONDS", Settings.http_connect_timeout_seconds),
+        http_keepalive_seconds=_env_float("OCR_HTTP_KEEPALIVE_SECONDS", Settings.http_keepalive_seconds),
+        client_idle_minutes=_env_float("OCR_CLIENT_IDLE_MINUTES", Settings.client_idle_minutes),
+    )
@@ -0,0 +1,219 @@
+import queue
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+# Marks the end of a stream on a stage queue
+_DONE = object()
+
+
+@dataclass
+class StageStats:
+    """Throughput and backpressure counters of one :class:`Stage`.
+
+    Attributes
+    ----------
+    name : str
+        Stage name.
+    workers : int
+        Number of worker threads.
+    processed : int
+        Items taken from the input queue.
+    busy_seconds : float
+        Total time workers spent inside the stage function.
+    elapsed_seconds : float
+        Wall time between the pipeline starting and this stage finishing.
+    queue_size : int
+        Capacity of the stage's input queue.
+    max_queue_depth : int
+        Highest input queue depth observed.
+    """
+
+    name: str
+    workers: int
+    processed: int = 0
+    busy_seconds: float = 0.0
+    elapsed_seconds: float = 0.0
+    queue_size: int = 0
+    max_queue_depth: int = 0
+
+    @property
+    def utilisation(self) -> float:
+        """Fraction of available worker time spent busy."""
+        if self.elapsed_seconds <= 0:
+            return 0.0
+        return min(1.0, self.busy_seconds / (self.elapsed_seconds * self.workers))
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["utilisation"] = round(self.utilisation, 3)
+        return data
+
+
+class Stage:
+    """One step of a :class:`StagedPipeline`.
+
+    Parameters
+    ----------
+    name : str
+        Stage name, used in stats and thread names.
+    fn : callable
+        Applied to every item. With ``expand=True`` it returns an iterable and
+        each element is passed downstream separately.
+    workers : int
+        Number of threads running ``fn``.
+    queue_size : int
+        Capacity of the input queue. A full queue blocks the upstream stage,
+        which is what bounds memory.
+    expand : bool
+        Whether ``fn`` returns several outputs per input.
+    """
+
+    def __init__(self, name: str, fn: Callable[[Any], Any], workers: int = 1, queue_size: int = 4, expand: bool = False):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.expand = expand
+        self.input: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, queue_size))
+        self.stats = StageStats(name=name, workers=self.workers, queue_size=max(1, queue_size))
+        self._lock = threading.Lock()
+        self._running = self.workers
+
+    def depth(self) -> int:
+        """Current number of items waiting in the input queue."""
+        return self.input.qsize()
+
+
+class StagedPipeline:
+    """Stages connected by bounded queues, each with its own worker threads.
+
+    Items flow from ``source`` through every stage; results are yielded in
+    completion order from :meth:`run` on the calling thread, so callers can
+    update UI state directly. Rendering page N+1 therefore overlaps with
+    encoding page N and waiting on the OCR request for page N-1.
+
+    Parameters
+    ----------
+    stages : list of Stage
+        Stages in processing order.
+    output_size : int
+        Capacity of the queue between the last stage and the consumer.
+    """
+
+    def __init__(self, stages: List[Stage], output_size: int = 16):
+        self.stages = stages
+        self.output: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, output_size))
+        self._error: Optional[BaseException] = None
+        self._cancelled = threading.Event()
+        self._started = 0.0
+
+    def _put(self, target: "queue.Queue[Any]", item: Any) -> bool:
+        # Poll so workers notice cancellation instead of blocking forever on a full queue
+        while not self._cancelled.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _feed(self, source: Iterable[Any]) -> None:
+        first = self.stages[0]
+        try:
+            for item in source:
+                if not self._put(first.input, item):
+                    return
+                first.stats.max_queue_depth = max(first.stats.max_queue_depth, first.depth())
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            for _ in range(first.workers):
+                self._put(first.input, _DONE)
+
+    def _work(self, index: int) -> None:
+        stage = self.stages[index]
+        is_last = index == len(self.stages) - 1
+        downstream = self.output if is_last else self.stages[index + 1].input
+        try:
+            while not self._cancelled.is_set():
+                try:
+                    item = stage.input.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    break
+                started = time.perf_counter()
+                try:
+                    result = stage.fn(item)
+                    outputs = list(result) if stage.expand else [result]
+                except BaseException as e:
+                    self._fail(e)
+                    break
+                with stage._lock:
+                    stage.stats.processed += 1
+                    stage.stats.busy_seconds += time.perf_counter() - started
+                for output in outputs:
+                    if not self._put(downstream, output):
+                        return
+                    if not is_last:
+                        nxt = self.stages[index + 1]
+                        nxt.stats.max_queue_depth = max(nxt.stats.max_queue_depth, nxt.depth())
+        finally:
+            with stage._lock:
+                stage._running -= 1
+                last_worker = stage._running == 0
+            if last_worker:
+                stage.stats.elapsed_seconds = time.perf_counter() - self._started
+                # The last worker out forwards the end marker to every downstream worker
+                count = 1 if is_last else self.stages[index + 1].workers
+                for _ in range(count):
+                    self._put(downstream, _DONE)
+
+    def _fail(self, error: BaseException) -> None:
+        if self._error is None:
+            self._error = error
+        self._cancelled.set()
+
+    def run(self, source: Iterable[Any]) -> Iterator[Any]:
+        """Process ``source`` and yield results from the last stage as they complete.
+
+        The first exception raised by any stage cancels the pipeline and is
+        re-raised here.
+        """
+        self._started = time.perf_counter()
+        threads = [threading.Thread(target=self._feed, args=(source,), name="stage-source", daemon=True)]
+        for index, stage in enumerate(self.stages):
+            for worker in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._work, args=(index,), name=f"stage-{stage.name}-{worker}", daemon=True,
+                ))
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                try:
+                    item = self.output.get(timeout=0.1)
+                except queue.Empty:
+                    if self._cancelled.is_set():
+                        break
+                    continue
+                if item is _DONE:
+                    break
+                yield item
+        finally:
+            # Stops idle workers, and every worker if the consumer stopped early
+            self._cancelled.set()
+            for thread in threads:
+                thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def stats(self) -> List[StageStats]:
+        """Per-stage counters, safe to read while the pipeline is running."""
+        return [stage.stats for stage in self.stages]
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Current input queue depth of every stage."""
+        return {stage.name: stage.depth() for stage in self.stages}
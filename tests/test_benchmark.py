@@ -0,0 +1,32 @@
+import shutil
+from dataclasses import replace
+
+import pytest
+
+import benchmark
+from fakes import FakeLatency
+from settings import load_settings
+
+
+def test_percentile_is_nearest_rank():
+    values = [5.0, 1.0, 3.0, 2.0, 4.0]
+    assert benchmark.percentile(values, 50) == 3.0
+    assert benchmark.percentile(values, 99) == 5.0
+    assert benchmark.percentile([], 50) == 0.0
+
+
+def test_compare_reports_relative_change():
+    lines = benchmark.compare({"pages_per_second": 15.0, "ocr_requests": 4}, {"pages_per_second": 10.0})
+    assert lines == ["  pages_per_second: 10.0 -> 15.0 (+50.0%)"]
+
+
+@pytest.mark.skipif(shutil.which("pdfinfo") is None, reason="poppler is not installed")
+def test_benchmark_runs_against_fake_mistral(tmp_path):
+    settings = replace(
+        load_settings(), cache_max_mb=0, cache_dir=str(tmp_path), metrics_file="",
+        page_blank_ink_ratio=0.0, page_dedupe=False,
+    )
+    results = benchmark.run_benchmark(settings, 3, [2, 3], [150], FakeLatency(base_seconds=0.01), FakeLatency(base_seconds=0.01))
+    assert results["failures"] == 0
+    assert results["pages"] == results["ocr_pages"] == 7
+    assert results["ocr_requests"] > 0
@@ -0,0 +1,41 @@
+from dataclasses import replace
+
+import pipeline
+from schema import CLASSIFICATION_JSON_STRUCTURE
+from settings import Settings
+
+TEXT = "\n\n=== FILE: a.pdf ===\n\n--- PAGE 1 ---\n\nNombre: Juan Pérez\n"
+
+
+def test_cache_is_not_shared_between_modes(tmp_path):
+    settings = Settings(cache_dir=str(tmp_path), classify_fast_path=False, classify_compact=False)
+    cache = pipeline.open_classification_cache(settings)
+    calls = []
+
+    def classifier(text, api_key, json_schema):
+        calls.append(text)
+        return {"NOMBRE_COMPLETO": "Juan Pérez"}
+
+    def classify(**changes):
+        return pipeline.classify_text(
+            TEXT, "key", CLASSIFICATION_JSON_STRUCTURE, classifier=classifier,
+            settings=replace(settings, **changes), cache=cache,
+        )
+
+    classify(classify_mode="single")
+    assert len(calls) == 1
+    for changes in (
+        {"classify_mode": "chunked"},
+        {"classify_mode": "incremental", "classify_required_fields": "NOMBRE_COMPLETO"},
+        {"classify_mode": "incremental", "classify_required_fields": "NOMBRE_COMPLETO", "classify_min_confidence": 0.9},
+        {"classify_mode": "incremental", "classify_required_fields": "CEDULA"},
+    ):
+        hits = cache.stats.hits
+        entries = cache.stats.entries
+        classify(**changes)
+        # A result of another mode or setting is never served; partial requests may still hit
+        assert cache.stats.entries > entries, changes
+        assert cache.stats.hits - hits <= len(calls), changes
+        hits = cache.stats.hits
+        classify(**changes)
+        assert cache.stats.hits == hits + 1, changes
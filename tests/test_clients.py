@@ -0,0 +1,53 @@
+import time
+from dataclasses import replace
+
+from clients import ClientRegistry
+from settings import Settings
+
+
+def registry(**changes):
+    created = []
+
+    def factory(api_key, http, settings):
+        created.append(api_key)
+        return object()
+
+    return ClientRegistry(replace(Settings(), **changes), {"openai": factory}), created
+
+
+def test_clients_are_pooled_per_key():
+    clients, created = registry()
+    with clients.lease("openai", "a") as first:
+        pass
+    with clients.lease("openai", "a") as again:
+        assert again is first
+    with clients.lease("openai", "b") as other:
+        assert other is not first
+    assert created == ["a", "b"]
+
+
+def test_idle_eviction_skips_leased_clients():
+    clients, _ = registry(client_idle_minutes=1e-6)
+    clients.acquire("openai", "a")
+    time.sleep(0.01)
+    assert clients.evict_idle() == 0
+    clients.release("openai", "a")
+    time.sleep(0.01)
+    assert clients.evict_idle() == 1
+    assert len(clients) == 0
+
+
+def test_with_client_passes_the_pooled_client():
+    clients, created = registry()
+    seen = []
+
+    def classify(text, api_key, json_schema, client=None):
+        seen.append(client)
+        assert clients.stats()[0]["leases"] == 1
+        return {"text": text}
+
+    classifier = clients.with_client(classify, "openai")
+    assert classifier("t", "key", "{}") == {"text": "t"}
+    classifier("u", "key", "{}")
+    assert created == ["key"] and seen[0] is seen[1]
+    assert clients.stats()[0]["leases"] == 0
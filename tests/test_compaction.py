@@ -0,0 +1,68 @@
+import compaction
+from page_store import file_block
+from ocr import format_page_block
+
+HEADER = "BANCO EJEMPLO S.A. - Solicitud de crédito"
+FOOTER = "Formulario F-102 rev. 2024 — página {n} de 4"
+
+
+def packet(bodies, name="solicitud.pdf"):
+    blocks = "".join(
+        format_page_block(n, f"{HEADER}\n\n{body}\n\n{FOOTER.format(n=n)}") for n, body in enumerate(bodies, start=1)
+    )
+    return file_block(name, blocks)
+
+
+def test_headers_and_footers_are_kept_once():
+    text = packet([f"Nombre: Cliente {n}\nCédula: 001-000000{n}-1" for n in range(1, 5)])
+    result = compaction.compact_text(text, boilerplate_min_pages=3, collapse=False)
+    assert result.text.count(HEADER) == 1
+    assert result.text.count("Formulario F-102") == 1
+    assert result.boilerplate_removed == 6
+    for n in range(1, 5):
+        assert f"Cliente {n}" in result.text
+
+
+def test_short_value_lines_repeated_across_pages_are_kept():
+    bodies = ["¿Posee vehículo?\nSí\nN/A\n| Sí | No |"] * 4
+    result = compaction.compact_text(packet(bodies), boilerplate_min_pages=3, collapse=False)
+    assert result.text.count("\nSí\n") == 4
+    assert result.text.count("N/A") == 4
+    assert result.text.count("| Sí | No |") == 4
+
+
+def test_body_lines_repeated_across_pages_are_kept():
+    body = "Ingresos mensuales declarados por el cliente\nRD$ 50,000.00\nOtros ingresos\nRD$ 50,000.00"
+    result = compaction.compact_text(packet([body] * 4), boilerplate_min_pages=3, collapse=False)
+    assert result.text.count("Ingresos mensuales declarados por el cliente") == 4
+    assert result.text.count("RD$ 50,000.00") == 8
+
+
+def test_repeat_on_the_page_of_first_occurrence_is_kept():
+    first = f"Cédula: 001-0000001-1\n\n{HEADER}"
+    text = packet([first, "a", "b", "c"])
+    result = compaction.compact_text(text, boilerplate_min_pages=3, collapse=False)
+    first_page = compaction.split_chunks(result.text)[0].text
+    assert first_page.count(HEADER) == 2
+    assert result.text.count(HEADER) == 2
+
+
+def test_distinct_phone_lines_are_not_boilerplate():
+    bodies = [f"{HEADER}-x\nTeléfono de referencia comercial: 809-555-000{n}" for n in range(1, 5)]
+    result = compaction.compact_text(packet(bodies), boilerplate_min_pages=3, collapse=False)
+    for n in range(1, 5):
+        assert f"809-555-000{n}" in result.text
+
+
+def test_budget_drops_low_value_pages_first():
+    bodies = ["Cédula: 001-1234567-8\nTeléfono celular: 809-555-1234", "lorem ipsum " * 200, "dolor sit " * 200]
+    text = packet(bodies)
+    result = compaction.compact_text(text, max_tokens=200, boilerplate_min_pages=0)
+    assert result.tokens_after <= 200 or len(result.dropped_pages) == 2
+    assert "001-1234567-8" in result.text
+    assert ("solicitud.pdf", 1) not in result.dropped_pages
+
+
+def test_collapse_markdown_strips_layout_only():
+    text = "# Título\n\n| a | b |\n|---|---|\n| **1** | 2 |\n\n![img](x.png)\n---\n"
+    assert compaction.collapse_markdown(text) == "Título\n\na | b\n1 | 2"
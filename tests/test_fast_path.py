@@ -0,0 +1,94 @@
+import fast_path
+import pipeline
+from schema import CLASSIFICATION_JSON_STRUCTURE
+from settings import Settings
+
+SINGLE_APPLICANT = """# Solicitud de préstamo
+
+Nombre: Juan Pérez
+Estado civil: Soltero Cónyuge: N/A
+Cédula: 001-1234567-8
+Celular: 809-555-1234
+Fecha de nacimiento: 12/03/1985
+Correo electrónico: juan@example.com
+Monto del préstamo: RD$ 450,000.00
+"""
+
+MARRIED_APPLICANT = """## Datos personales
+Cédula: 001-1234567-8
+Celular: (809) 555-1234
+
+## Datos del Cónyuge
+Cédula: 002-7654321-9
+Teléfono: 829 555 0000
+
+| **Datos de la madre** |
+Teléfono: 849-555-1111
+"""
+
+
+def extract(text):
+    return fast_path.extract_fields([("solicitud.pdf", 1, text, 0)])
+
+
+def test_single_applicant_inline_spouse_label_keeps_applicant_section():
+    found = extract(SINGLE_APPLICANT)
+    assert found["CEDULA"].value == "001-1234567-8"
+    assert found["TELEFONO_CELULAR"].value == "(809) 555-1234"
+    assert found["FECHA_NACIMIENTO"].value == "1985-03-12T00:00:00"
+    assert not {"CEDULA_CONYUGE", "TELEFONO_CONYUGE", "FECHA_NACIMIENTO_CONYUGE"} & set(found)
+
+
+def test_headings_on_their_own_line_switch_section():
+    found = extract(MARRIED_APPLICANT)
+    assert found["CEDULA"].value == "001-1234567-8"
+    assert found["CEDULA_CONYUGE"].value == "002-7654321-9"
+    assert found["TELEFONO_CONYUGE"].value == "(829) 555-0000"
+    assert found["TELEFONO_MADRE"].value == "(849) 555-1111"
+
+
+def test_section_resets_at_new_file():
+    pages = [
+        ("a.pdf", 1, "Datos del cónyuge\nCédula: 002-7654321-9\n", 0),
+        ("b.pdf", 1, "Cédula: 001-1234567-8\n", 0),
+    ]
+    found = fast_path.extract_fields(pages)
+    assert found["CEDULA_CONYUGE"].value == "002-7654321-9"
+    assert found["CEDULA"].value == "001-1234567-8"
+
+
+def test_section_dependent_fields_are_hints():
+    found = extract(SINGLE_APPLICANT)
+    assert found["CEDULA"].hint
+    assert not found["MONTO_PRESTAMO"].hint
+    assert fast_path.as_values(found, hints=False) == {"MONTO_PRESTAMO": "RD$ 450,000.00"}
+
+
+def test_merge_prefers_model_over_hints_and_labels_over_model():
+    found = extract(SINGLE_APPLICANT)
+    merged = fast_path.merge(found, {"CEDULA": "001-9999999-9", "TELEFONO_CELULAR": "", "MONTO_PRESTAMO": "1"})
+    assert merged["CEDULA"] == "001-9999999-9"
+    assert merged["TELEFONO_CELULAR"] == "(809) 555-1234"
+    assert merged["MONTO_PRESTAMO"] == "RD$ 450,000.00"
+
+
+def test_classify_text_does_not_fill_spouse_fields_of_single_applicant():
+    requested = []
+
+    def classifier(text, api_key, json_schema):
+        requested.append(json_schema)
+        return {"CEDULA": "001-1234567-8", "NOMBRE_COMPLETO": "Juan Pérez"}
+
+    text = "\n\n=== FILE: solicitud.pdf ===\n\n--- PAGE 1 ---\n\n" + SINGLE_APPLICANT
+    result = pipeline.classify_text(text, "key", CLASSIFICATION_JSON_STRUCTURE, classifier=classifier, settings=Settings())
+    assert result["CEDULA"] == "001-1234567-8"
+    assert result.get("CEDULA_CONYUGE") in (None, "")
+    assert result.get("TELEFONO_CONYUGE") in (None, "")
+    # Hints are still asked of the model, label-named fields are not
+    assert '"CEDULA"' in requested[0]
+    assert '"MONTO_PRESTAMO"' not in requested[0]
+
+
+def test_dates_are_day_first_with_spanish_months():
+    assert fast_path.normalize("date", "5 de julio de 1990") == "1990-07-05T00:00:00"
+    assert fast_path.normalize("date", "31/02/1990") == ""
@@ -0,0 +1,74 @@
+from dataclasses import dataclass
+from typing import List, Optional
+
+import pytest
+
+import ocr
+from fakes import FakeLatency, FakeMistral
+
+
+@dataclass
+class Page:
+    markdown: str
+    index: Optional[int] = None
+
+
+@dataclass
+class Response:
+    pages: List[Page]
+
+
+def test_plan_batches_respects_page_and_byte_limits():
+    assert ocr.plan_batches([10] * 5, 2, 0) == [[0, 1], [2, 3], [4]]
+    assert ocr.plan_batches([10, 10, 25, 5], 4, 30) == [[0, 1], [2, 3]]
+    # An item over the byte budget travels alone
+    assert ocr.plan_batches([5, 100, 5], 4, 50) == [[0], [1], [2]]
+    assert ocr.plan_batches([], 4, 50) == []
+
+
+def test_response_page_texts_uses_page_index():
+    response = Response([Page("b", 7), Page("a", 3)])
+    assert ocr.response_page_texts(response) == {7: "b", 3: "a"}
+    assert ocr.response_page_texts(response, requested=[3, 7]) == {7: "b", 3: "a"}
+
+
+def test_response_page_texts_maps_unindexed_pages_to_requested_pages():
+    response = Response([Page("x"), Page("y")])
+    assert ocr.response_page_texts(response) == {0: "x", 1: "y"}
+    assert ocr.response_page_texts(response, requested=[4, 5]) == {4: "x", 5: "y"}
+    with pytest.raises(ValueError):
+        ocr.response_page_texts(response, requested=[4, 5, 6])
+
+
+class UnindexedMistral:
+    """Returns pages without ``index``, optionally dropping the last one."""
+
+    def __init__(self, drop_last=False):
+        self.drop_last = drop_last
+        self.ocr = self
+
+    def process(self, model, document, pages=None):
+        pages = pages[:-1] if self.drop_last else pages
+        return Response([Page(f"page {index + 1}") for index in pages])
+
+
+def test_native_slices_keep_page_numbers_without_index():
+    texts, failed = ocr.ocr_pdf_native(UnindexedMistral(), b"%PDF", list(range(1, 8)), pages_per_request=3)
+    assert failed == []
+    assert texts == {n: f"page {n}" for n in range(1, 8)}
+
+
+def test_native_slice_with_short_unindexed_response_fails():
+    texts, failed = ocr.ocr_pdf_native(UnindexedMistral(drop_last=True), b"%PDF", list(range(1, 7)), pages_per_request=3)
+    assert texts == {}
+    assert failed == list(range(1, 7))
+
+
+def test_native_slices_upload_the_pdf_once():
+    pdf = b"%PDF-1.4" + b" /Type /Page " * 9 + b" " * 10_000
+    client = FakeMistral(FakeLatency(base_seconds=0, jitter_seconds=0))
+    texts, failed = ocr.ocr_pdf_native(client, pdf, list(range(1, 10)), pages_per_request=3)
+    assert sorted(texts) == list(range(1, 10)) and failed == []
+    # Three slices reference one upload instead of carrying the PDF three times
+    assert len(pdf) <= client.upload_bytes < 1.1 * len(pdf)
+    assert client.uploads == {}
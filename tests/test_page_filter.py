@@ -0,0 +1,72 @@
+from PIL import Image, ImageDraw, ImageFont
+
+from page_filter import PageHashIndex, grayscale, ink_ratio, is_blank, pixel_digest
+
+
+def page(text=None, size=(1700, 2200), paper=245):
+    image = Image.new("RGB", size, (paper, paper, paper - 10))
+    if text:
+        # 10 pt body text at 200 dpi
+        draw, font = ImageDraw.Draw(image), ImageFont.load_default(size=28)
+        for line, value in enumerate(text):
+            draw.text((150, 200 + 40 * line), value, fill=(30, 30, 30), font=font)
+    return image
+
+
+def test_blank_paper_is_blank_and_two_lines_of_text_are_not():
+    assert is_blank(grayscale(page()), 0.0003)
+    assert not is_blank(grayscale(page(["Nombre: Juan Pérez", "Cédula: 001-1234567-8"])), 0.0003)
+    assert ink_ratio(page()) == 0.0
+
+
+def test_grayscale_reduces_once_without_touching_the_page():
+    original = page()
+    gray = grayscale(original)
+    assert original.mode == "RGB" and original.size == (1700, 2200)
+    assert gray.mode == "L" and max(gray.size) <= 1024
+    assert grayscale(gray) is gray
+
+
+def test_digest_tells_filled_copies_of_a_form_apart():
+    first = pixel_digest(grayscale(page(["Cédula: 001-1234567-8"])))
+    assert first == pixel_digest(grayscale(page(["Cédula: 001-1234567-8"])))
+    assert first != pixel_digest(grayscale(page(["Cédula: 001-1234567-9"])))
+
+
+def test_index_matches_identical_digests_only():
+    index = PageHashIndex(True)
+    original, duplicate = index.claim("a", "a.pdf page 1", "doc-a", 1)
+    assert not duplicate
+    assert index.claim("a", "b.pdf page 3", "doc-b", 3) == (original, True)
+    assert not index.claim("b", "b.pdf page 4", "doc-b", 4)[1]
+    original.resolve("text")
+    assert index.claim("a", "c.pdf page 1")[0].wait() == "text"
+
+
+def test_failed_original_is_replaced():
+    index = PageHashIndex(True)
+    failed, _ = index.claim("a", "a.pdf page 1")
+    failed.resolve(None)
+    retry, duplicate = index.claim("a", "a.pdf page 2")
+    assert not duplicate and retry is not failed
+
+
+def test_disabled_index_never_matches():
+    index = PageHashIndex(False)
+    index.claim("a", "a.pdf page 1")
+    assert not index.claim("a", "a.pdf page 2")[1]
+    assert len(index) == 0
+
+
+def test_retain_and_eviction_bound_the_index():
+    index = PageHashIndex(True, max_entries=2)
+    for digest, source in (("a", "doc-a"), ("b", "doc-b"), ("c", "doc-b")):
+        index.claim(digest, digest, source)[0].resolve(digest)
+    assert len(index) == 2
+    index.retain(["doc-a"])
+    assert len(index) == 0
+    pending, _ = index.claim("d", "d", "doc-d")
+    index.claim("e", "e", "doc-d")[0].resolve("e")
+    index.claim("f", "f", "doc-d")[0].resolve("f")
+    # Unresolved entries may have duplicates waiting on them and are never evicted
+    assert index.claim("d", "again", "doc-d") == (pending, True)
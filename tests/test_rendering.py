@@ -0,0 +1,40 @@
+import io
+
+import pytest
+from PIL import Image
+
+from rendering import split_images
+
+
+def _encode(image_format, color, **options):
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), color).save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("image_format, options", [
+    ("PNG", {}),
+    ("JPEG", {"quality": 75}),
+    ("JPEG", {"quality": 75, "progressive": True}),
+    ("JPEG", {"quality": 75, "restart_marker_blocks": 1}),
+])
+def test_split_returns_each_image(image_format, options):
+    images = [_encode(image_format, color, **options) for color in ("white", "black", (120, 30, 200))]
+    assert split_images(b"".join(images), image_format) == images
+
+
+def test_split_images_decode():
+    pages = [_encode("JPEG", "white"), _encode("JPEG", "black")]
+    for data in split_images(b"".join(pages), "jpeg"):
+        assert Image.open(io.BytesIO(data)).size == (64, 48)
+
+
+def test_empty_output_has_no_images():
+    assert split_images(b"", "PNG") == []
+
+
+@pytest.mark.parametrize("image_format", ["PNG", "JPEG"])
+def test_truncated_output_raises(image_format):
+    data = _encode(image_format, "white") + _encode(image_format, "black")
+    with pytest.raises(ValueError):
+        split_images(data[:-5], image_format)
@@ -0,0 +1,30 @@
+import pytest
+
+from schema import CLASSIFICATION_JSON_STRUCTURE, _coerce_integer, _Invalid, compile_schema
+
+SCHEMA = compile_schema(CLASSIFICATION_JSON_STRUCTURE)
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("1500", 1500), ("1,500", 1500), ("1,500.00", 1500), ("-2,000,000", -2000000), (" 42 ", 42), (3.0, 3), (7, 7),
+])
+def test_integer_coercion(raw, expected):
+    assert _coerce_integer(raw) == expected
+
+
+@pytest.mark.parametrize("raw", ["1.5", "1.500", "12,34", "Toyota", True, 2.5])
+def test_non_integers_are_rejected(raw):
+    with pytest.raises(_Invalid):
+        _coerce_integer(raw)
+
+
+def test_uncoercible_values_are_kept_and_reported():
+    result = SCHEMA.validate({"MARCA_VEHICULO": "Toyota", "CEDULA": "001-1234567-8"})
+    assert result.value["MARCA_VEHICULO"] == "Toyota"
+    assert result.value["CEDULA"] == "001-1234567-8"
+    assert result.errors == ["MARCA_VEHICULO: cannot coerce 'Toyota' to integer"]
+
+
+def test_subset_keeps_only_named_fields():
+    subset = compile_schema(SCHEMA.subset(["CEDULA", "MARCA_VEHICULO"]))
+    assert set(subset.fields) == {"CEDULA", "MARCA_VEHICULO"}